@@ -0,0 +1,184 @@
+"""
+Admission control of expensive requests, such that heavy exports cannot starve interactive traffic.
+
+The cost of a request is estimated up front. Cheap requests are always admitted, requests that are too expensive are
+rejected, and the remaining heavy requests must obtain one of a limited number of heavy slots, within the concurrency
+and cost budget of the requesting client. Heavy requests queue for a free slot, and are rejected with
+"429 Too Many Requests" and a "Retry-After" header if none becomes available in time.
+
+The budgets are enforced per worker process, so the limits of the whole deployment are these times the worker count.
+"""
+import datetime
+import threading
+from contextlib import contextmanager
+
+from fastapi import HTTPException
+
+from app.routers.v1.heatmap.periods import get_periods
+from app.schemas.spatial_resolution import SpatialResolution
+from app.schemas.temporal_resolution import TemporalResolution
+
+# Requests costing at most this are interactive, and are admitted without taking a heavy slot.
+INTERACTIVE_MAX_COST = 50
+# Requests costing more than this are rejected outright.
+MAX_REQUEST_COST = 20000
+# The number of heavy requests that may run concurrently.
+HEAVY_SLOTS = 1
+# The number of heavy requests a single client may have running or queued.
+MAX_CLIENT_REQUESTS = 2
+# The total cost of heavy requests a single client may have running or queued.
+MAX_CLIENT_COST = 30000
+# How long a heavy request may wait for a heavy slot, before it is rejected.
+QUEUE_TIMEOUT_SEC = 30
+# The number of seconds clients are asked to wait before retrying a rejected request.
+RETRY_AFTER_SEC = 60
+
+# The relative cost of aggregating a pixel at each spatial resolution, as finer resolutions union more rasters.
+resolution_weights = {
+    int(SpatialResolution.five_kilometers): 1,
+    int(SpatialResolution.kilometer): 2,
+    int(SpatialResolution.two_hundred_meters): 4,
+    int(SpatialResolution.fifty_meters): 8,
+}
+
+
+def estimate_heatmap_cost(width: int, height: int, spatial_resolution: int,
+                          start_timestamp: datetime.datetime, end_timestamp: datetime.datetime,
+                          temporal_resolution: TemporalResolution = None) -> float:
+    """
+    Estimate the cost of a heatmap, in weighted megapixel days.
+
+    Every day of the temporal bound is aggregated over all pixels, and every frame is rendered over all pixels.
+
+    Keyword arguments:
+        width: the width of the heatmap in pixels
+        height: the height of the heatmap in pixels
+        spatial_resolution: the spatial resolution of the heatmap in meters
+        start_timestamp: the inclusive start of the temporal bound
+        end_timestamp: the exclusive end of the temporal bound
+        temporal_resolution: the temporal resolution of the frames, or None for a single heatmap
+    """
+    megapixels = width * height / 1000000
+    days = max((end_timestamp - start_timestamp).total_seconds() / 86400, 1)
+    frames = 1 if temporal_resolution is None else len(get_periods(start_timestamp, end_timestamp, temporal_resolution))
+    return megapixels * resolution_weights[int(spatial_resolution)] * (days + frames)
+
+
+def check_cost(cost: float) -> None:
+    """Reject a request of the given cost if it is too expensive to be admitted at all."""
+    if cost > MAX_REQUEST_COST:
+        raise HTTPException(400, "The request is too expensive. Please reduce the bounds or the resolution.")
+
+
+def is_heavy(cost: float) -> bool:
+    """Whether a request of the given cost is heavy, such that it must run in a heavy slot."""
+    return cost > INTERACTIVE_MAX_COST
+
+
+def too_many_requests(detail: str) -> HTTPException:
+    """Create a "429 Too Many Requests" exception asking the client to retry later."""
+    return HTTPException(429, detail, headers={"Retry-After": str(RETRY_AFTER_SEC)})
+
+
+class AdmissionController:
+    """Admits requests within the heavy slots and the concurrency and cost budgets of each client."""
+
+    def __init__(self, heavy_slots: int = HEAVY_SLOTS, max_client_requests: int = MAX_CLIENT_REQUESTS,
+                 max_client_cost: float = MAX_CLIENT_COST, queue_timeout_sec: float = QUEUE_TIMEOUT_SEC):
+        """
+        Create an admission controller.
+
+        Keyword arguments:
+            heavy_slots: the number of heavy requests that may run concurrently
+            max_client_requests: the number of heavy requests a single client may have running or queued
+            max_client_cost: the total cost of heavy requests a single client may have running or queued
+            queue_timeout_sec: how long a heavy request may wait for a heavy slot
+        """
+        self.heavy_slots = heavy_slots
+        self.max_client_requests = max_client_requests
+        self.max_client_cost = max_client_cost
+        self.queue_timeout_sec = queue_timeout_sec
+        self._condition = threading.Condition()
+        self._running = 0
+        self._client_requests: dict[str, int] = {}
+        self._client_costs: dict[str, float] = {}
+
+    @contextmanager
+    def admit(self, client_id: str, cost: float):
+        """
+        Run the body of the with statement within the budgets of the client.
+
+        Raises an HTTPException if the request is too expensive, or if the budgets of the client are exhausted.
+        Admitted requests do not hold a heavy slot, which must be taken with heavy_slot before doing the work,
+        such that requests waiting on an identical request, or answered from its result, never queue for one.
+
+        Keyword arguments:
+            client_id: identifies the client making the request
+            cost: the estimated cost of the request
+        """
+        check_cost(cost)
+        if not is_heavy(cost):
+            yield
+            return
+
+        self._reserve(client_id, cost)
+        try:
+            yield
+        finally:
+            self._release(client_id, cost)
+
+    @contextmanager
+    def heavy_slot(self, cost: float, background: bool = False):
+        """
+        Run the body of the with statement in a heavy slot, if a request of the given cost is heavy.
+
+        Raises a "429 Too Many Requests" HTTPException if no heavy slot becomes free in time.
+
+        Keyword arguments:
+            cost: the estimated cost of the request
+            background: whether the work runs in the background, such that it waits for a heavy slot without timeout
+        """
+        if not is_heavy(cost):
+            yield
+            return
+
+        self._acquire_slot(None if background else self.queue_timeout_sec)
+        try:
+            yield
+        finally:
+            self._release_slot()
+
+    def _reserve(self, client_id: str, cost: float):
+        """Reserve part of the budgets of the client, or reject the request if they are exhausted."""
+        with self._condition:
+            requests = self._client_requests.get(client_id, 0) + 1
+            total_cost = self._client_costs.get(client_id, 0) + cost
+            if requests > self.max_client_requests or total_cost > self.max_client_cost:
+                raise too_many_requests("Too many expensive requests are in progress for this client.")
+            self._client_requests[client_id] = requests
+            self._client_costs[client_id] = total_cost
+
+    def _acquire_slot(self, timeout_sec: float | None):
+        """Wait for a free heavy slot, or reject the request if none becomes free in time."""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._running < self.heavy_slots, timeout_sec):
+                raise too_many_requests("The server is busy with other expensive requests.")
+            self._running += 1
+
+    def _release(self, client_id: str, cost: float):
+        """Return the reserved budgets of the client."""
+        with self._condition:
+            self._client_requests[client_id] -= 1
+            self._client_costs[client_id] -= cost
+            if self._client_requests[client_id] == 0:
+                del self._client_requests[client_id]
+                del self._client_costs[client_id]
+
+    def _release_slot(self):
+        """Return a heavy slot, and wake the requests waiting for one."""
+        with self._condition:
+            self._running -= 1
+            self._condition.notify_all()
+
+
+admission_controller = AdmissionController()
@@ -3,8 +3,19 @@ Main API file for QPI. This file contains the FastAPI app and the routers for th
 
 Note: Does not get called as main when called with uvicorn.
 """
+import logging
+from typing import Callable
+
 from fastapi import FastAPI
+from sqlalchemy.orm import Session
+from app.datawarehouse import SessionLocal
+from app.jobs import start_job_workers, stop_job_workers
 from app.routers import router_main
+from app.routers.v1.heatmap.heatmap_catalogue import load_heatmap_catalogue
+from app.reference_geometries import load_reference_geometries
+from app.ship_names import load_ship_names
+from app.ship_presence import start_ship_presence_indexer, stop_ship_presence_indexer
+from app.table_metadata import load_table_metadata
 from fastapi.openapi.utils import get_openapi
 from fastapi.responses import RedirectResponse
 
@@ -14,6 +25,46 @@ app = FastAPI()
 app.include_router(router_main.router_main)
 
 
+@app.on_event("startup")
+def warm_up_caches():
+    """Load the caches of the API on startup, such that the first requests can be answered from memory."""
+    warm_up_cache("table metadata", load_table_metadata)
+    warm_up_cache("heatmap catalogue", load_heatmap_catalogue)
+    warm_up_cache("reference geometries", load_reference_geometries)
+    warm_up_cache("ship names", load_ship_names)
+
+
+@app.on_event("startup")
+def start_background_jobs():
+    """Start the background threads running asynchronous jobs, and indexing the ship presence of new imports."""
+    start_job_workers()
+    start_ship_presence_indexer()
+
+
+@app.on_event("shutdown")
+def stop_background_jobs():
+    """Stop the background threads running asynchronous jobs and indexing, once their current work is finished."""
+    stop_job_workers()
+    stop_ship_presence_indexer()
+
+
+def warm_up_cache(name: str, load: Callable[[Session], object]) -> None:
+    """
+    Load a cache using a new data warehouse session.
+
+    Failing to load a cache does not prevent the API from starting, the cache is then loaded on first use instead.
+
+    Keyword arguments:
+        name: name of the cache, used in the log
+        load: function loading the cache from the data warehouse
+    """
+    with SessionLocal() as dw:
+        try:
+            load(dw)
+        except Exception:
+            logging.getLogger(__name__).warning(f"Could not load the {name} cache on startup.", exc_info=True)
+
+
 @app.get("/", include_in_schema=False)
 def root():
     """Root endpoint. Redirects to the documentation."""
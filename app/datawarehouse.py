@@ -1,4 +1,8 @@
 """Connect to the data warehouse connection and declare a sessionmaker."""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Iterable, Iterator, TypeVar
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
@@ -16,8 +20,62 @@ if os.getenv("IS_TESTING", False):
 else:
     SQLALCHEMY_DATABASE_URL = f"postgresql://{user}:{password}@{server}/{database}"
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# The number of queries run concurrently in the background by each worker process, e.g. the operands of raster
+# algebra or the periods of multi heatmaps, shared by all requests such that they cannot exhaust the connection pool.
+PARALLEL_QUERIES = 4
+# The connections pooled by each worker process, and the connections opened beyond the pool when it is exhausted.
+# The pool has room for the background queries on top of the default pool size for the sessions of requests.
+POOL_SIZE = 5 + PARALLEL_QUERIES
+MAX_OVERFLOW = 10
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Runs the background queries, each in a session of its own.
+query_executor = ThreadPoolExecutor(max_workers=PARALLEL_QUERIES, thread_name_prefix="dw-query")
+
+# Type variable for the results of background queries.
+T = TypeVar('T')
+
+
+class BackgroundQueries(Iterator[T]):
+    """
+    Runs queries in the background, iterating over their results in order.
+
+    At most PARALLEL_QUERIES queries are submitted to the query executor ahead of the results consumed, and further
+    queries are submitted as results are consumed, such that the queries of a single request never queue ahead of all
+    queries of other requests.
+    """
+
+    def __init__(self, queries: Iterable[Callable[[], T]]):
+        """
+        Start running the first queries.
+
+        Args:
+            queries: The zero argument functions running the queries, each in a session of its own.
+        """
+        self._queries = iter(queries)
+        self._futures = deque()
+        self._submit(PARALLEL_QUERIES)
+
+    def __next__(self) -> T:
+        """Wait for the result of the next query, and submit another query in its place."""
+        if not self._futures:
+            raise StopIteration
+        result = self._futures.popleft().result()
+        self._submit(1)
+        return result
+
+    def close(self) -> None:
+        """Cancel the submitted queries which have not started, and stop submitting queries."""
+        for future in self._futures:
+            future.cancel()
+        self._futures.clear()
+        self._queries = iter(())
+
+    def _submit(self, count: int) -> None:
+        self._futures.extend(query_executor.submit(query) for query in islice(self._queries, count))
+
+
 Base = declarative_base()
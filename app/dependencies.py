@@ -1,4 +1,6 @@
 """FastAPI dependencies for dependency injection into routers or the main app."""
+from fastapi import Request
+
 from app.datawarehouse import SessionLocal
 
 
@@ -9,3 +11,11 @@ def get_dw():
         yield dw
     finally:
         dw.close()
+
+
+def get_client_id(request: Request) -> str:
+    """Identify the client of the request, by its Cloudflare Access service token or else its IP address."""
+    client_id = request.headers.get("CF-Access-Client-Id") or request.headers.get("CF-Connecting-IP")
+    if client_id is None and request.client is not None:
+        client_id = request.client.host
+    return client_id or "unknown"
@@ -0,0 +1,93 @@
+"""
+A cache of picklable values on local disk, shared by all worker processes of the API on the same machine.
+
+Values are written atomically, so concurrent readers never see a partially written value. When the cache grows beyond
+its maximum size, the least recently used values are evicted.
+"""
+import os
+import pickle
+import tempfile
+from typing import Any
+
+from helper_functions import get_cache_directory
+
+
+class DiskCache:
+    """A least recently used cache of values on local disk."""
+
+    def __init__(self, name: str, max_size_bytes: int):
+        """
+        Create a cache, or open the existing cache with the same name.
+
+        Keyword arguments:
+            name: the name of the cache, used as the name of its directory in the configured cache directory
+            max_size_bytes: the size the values in the cache may take up on disk before the oldest are evicted
+        """
+        self.name = name
+        self.max_size_bytes = max_size_bytes
+
+    def get(self, key: str) -> Any:
+        """
+        Get the value stored for a key, marking it as recently used.
+
+        Raises a KeyError if no value is stored for the key.
+
+        Keyword arguments:
+            key: the key of the value, which must be usable as a file name, e.g. a key created by request_key
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            raise KeyError(key)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        """
+        Store a value for a key, evicting the least recently used values if the cache has become too large.
+
+        Keyword arguments:
+            key: the key of the value, which must be usable as a file name, e.g. a key created by request_key
+            value: the picklable value to store
+        """
+        with tempfile.NamedTemporaryFile(dir=self._directory(), suffix=".tmp", delete=False) as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f.name, self._path(key))
+        self._evict()
+
+    def _evict(self) -> None:
+        """Remove the least recently used values until the cache is within its maximum size."""
+        entries = self._entries()
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size_bytes:
+                break
+            _remove(path)
+            size -= entry_size
+
+    def _entries(self) -> list[tuple[float, int, str]]:
+        """Get the last time of use, size and path of each value in the cache."""
+        entries = []
+        for entry in os.scandir(self._directory()):
+            try:
+                if entry.name.endswith(".value"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            except FileNotFoundError:
+                continue
+        return entries
+
+    def _directory(self) -> str:
+        return get_cache_directory(self.name)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._directory(), f"{key}.value")
+
+
+def _remove(path: str) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,69 @@
+"""
+Tracking of ETL imports into the data warehouse.
+
+Every import performed by the ETL is registered in the audit log, so the highest audit id identifies the current
+state of the data warehouse. Caches in the API use it to decide when cached results have to be recomputed.
+"""
+from time import monotonic
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.schemas.audit_log import AuditLog
+
+# The minimum number of seconds between two lookups of the latest import in the audit log.
+IMPORT_CHECK_INTERVAL_SEC = 60
+
+_latest_import_id = None
+_checked_at = None
+
+
+def get_latest_import_id(dw: Session) -> int:
+    """
+    Get the id of the latest ETL import, i.e. the highest audit id in the audit log.
+
+    The audit log is queried at most once every IMPORT_CHECK_INTERVAL_SEC seconds,
+    in between the previously found id is returned.
+
+    Args:
+        dw: The data warehouse session.
+    """
+    global _latest_import_id, _checked_at
+
+    now = monotonic()
+    if _checked_at is None or now - _checked_at >= IMPORT_CHECK_INTERVAL_SEC:
+        _latest_import_id = dw.query(func.max(AuditLog.audit_id)).scalar() or 0
+        _checked_at = now
+
+    return _latest_import_id
+
+
+def get_imported_date_ids(dw: Session, after_import_id: int, up_to_import_id: int) -> list[int]:
+    """
+    Get the date ids of the data imported by the ETL between two imports.
+
+    Args:
+        dw: The data warehouse session.
+        after_import_id: The exclusive id of the import to get the imported date ids after.
+        up_to_import_id: The inclusive id of the last import to get the imported date ids of.
+    """
+    rows = dw.query(AuditLog.date_id).distinct() \
+        .filter(AuditLog.audit_id > after_import_id, AuditLog.audit_id <= up_to_import_id) \
+        .all()
+    return [row.date_id for row in rows]
+
+
+def get_import_ids_by_date(dw: Session, start_date_id: int, end_date_id: int) -> dict[int, int]:
+    """
+    Get the id of the latest ETL import of each date, such that results derived from a date can be versioned by it.
+
+    Args:
+        dw: The data warehouse session.
+        start_date_id: The inclusive first date id to get the latest import id of.
+        end_date_id: The inclusive last date id to get the latest import id of.
+    """
+    rows = dw.query(AuditLog.date_id, func.max(AuditLog.audit_id)) \
+        .filter(AuditLog.date_id.between(start_date_id, end_date_id)) \
+        .group_by(AuditLog.date_id) \
+        .all()
+    return {date_id: import_id for date_id, import_id in rows}
@@ -0,0 +1,348 @@
+"""
+Asynchronous jobs, for work that takes too long to be done while an HTTP connection is held open.
+
+Jobs are queued in an SQLite database on local disk, shared by all worker processes of the API on the same machine.
+Every process runs a small pool of background threads, which claim queued jobs, run them with the handler registered
+for their kind, and store the resulting artefact next to the database, such that it can be downloaded later.
+"""
+import logging
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterator
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from app.admission import too_many_requests
+from app.datawarehouse import SessionLocal
+from app.schemas.job import Job, JobStatus
+from helper_functions import get_cache_directory
+
+# The number of background threads running jobs in each worker process.
+JOB_WORKERS = 1
+# The number of seconds an idle background thread waits before looking for queued jobs again.
+POLL_INTERVAL_SEC = 2
+# The number of seconds a finished job and its artefact are kept.
+JOB_TTL_SEC = 7 * 24 * 60 * 60
+# The number of seconds between the heartbeats of the running jobs of a process.
+HEARTBEAT_INTERVAL_SEC = 10
+# The number of seconds without a heartbeat after which a running job is abandoned, e.g. by a restart of the API.
+ABANDONED_AFTER_SEC = 60
+# The number of times a job is run before it fails, if the processes running it keep abandoning it.
+MAX_JOB_ATTEMPTS = 3
+# The number of jobs a single client may have queued or running.
+MAX_CLIENT_JOBS = 5
+
+logger = logging.getLogger(__name__)
+
+# Handlers running the jobs of each kind, returning the content and media type of the artefact.
+job_handlers: dict[str, Callable[[Session, Any, 'JobProgress'], tuple[bytes, str]]] = {}
+
+# Events stopping the background threads of this process.
+_stop_events: list[threading.Event] = []
+# Identifies the running jobs of this process, unlike its process id, which is reused after a restart of a container.
+_worker_id = uuid.uuid4().hex
+# The paths of the job databases initialised by this process.
+_initialised_databases: set[str] = set()
+_initialise_lock = threading.Lock()
+
+
+class JobProgress:
+    """Records the progress of a running job, such that it can be queried while the job runs."""
+
+    def __init__(self, job_id: str):
+        """
+        Create a progress recorder.
+
+        Keyword arguments:
+            job_id: the id of the running job
+        """
+        self.job_id = job_id
+
+    def total(self, frames: int) -> None:
+        """Record the number of frames the job produces."""
+        self._update("frames_total", frames)
+
+    def fetched(self, frames: int) -> None:
+        """Record the number of frames fetched from the data warehouse so far."""
+        self._update("frames_fetched", frames)
+
+    def rendered(self, frames: int) -> None:
+        """Record the number of frames rendered so far."""
+        self._update("frames_rendered", frames)
+
+    def _update(self, column: str, value: int) -> None:
+        with _database() as connection:
+            connection.execute(f"UPDATE job SET {column} = ? WHERE id = ?", (value, self.job_id))
+
+
+def register_job_handler(kind: str, handler: Callable[[Session, Any, JobProgress], tuple[bytes, str]]) -> None:
+    """
+    Register the handler running the jobs of a kind.
+
+    Keyword arguments:
+        kind: the kind of jobs the handler runs
+        handler: function taking a data warehouse session, the parameters of the job and its progress recorder,
+            and returning the content and media type of the artefact
+    """
+    job_handlers[kind] = handler
+
+
+def create_job(kind: str, key: str, params: Any, client_id: str) -> str:
+    """
+    Queue a job, unless an identical job is already queued, running or succeeded, and return the id of the job.
+
+    Raises a "429 Too Many Requests" HTTPException if the client already has too many jobs queued or running.
+
+    Keyword arguments:
+        kind: the kind of the job, which must have a registered handler
+        key: identifies identical jobs, see request_key
+        params: the picklable parameters passed to the handler
+        client_id: identifies the client creating the job
+    """
+    with _database() as connection:
+        existing = connection.execute(
+            "SELECT id FROM job WHERE key = ? AND status != ? ORDER BY created_at DESC LIMIT 1",
+            (key, JobStatus.failed.value)
+        ).fetchone()
+        if existing is not None:
+            return existing["id"]
+
+        client_jobs = connection.execute(
+            "SELECT COUNT(*) FROM job WHERE client_id = ? AND status IN (?, ?)",
+            (client_id, JobStatus.queued.value, JobStatus.running.value)
+        ).fetchone()[0]
+        if client_jobs >= MAX_CLIENT_JOBS:
+            raise too_many_requests("Too many jobs are queued or running for this client.")
+
+        job_id = uuid.uuid4().hex
+        connection.execute(
+            "INSERT INTO job (id, kind, key, params, client_id, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, key, pickle.dumps(params), client_id, JobStatus.queued.value, time.time())
+        )
+        return job_id
+
+
+def get_job(job_id: str) -> Job:
+    """
+    Get the state and progress of a job.
+
+    Raises an HTTPException if the job does not exist.
+
+    Keyword arguments:
+        job_id: the id of the job
+    """
+    row = _get_job_row(job_id)
+    return Job(
+        id=row["id"],
+        kind=row["kind"],
+        status=JobStatus(row["status"]),
+        frames_total=row["frames_total"],
+        frames_fetched=row["frames_fetched"],
+        frames_rendered=row["frames_rendered"],
+        error=row["error"],
+        created_at=_to_datetime(row["created_at"]),
+        started_at=_to_datetime(row["started_at"]),
+        finished_at=_to_datetime(row["finished_at"]),
+        result_url=None,
+    )
+
+
+def get_job_artefact(job_id: str) -> tuple[str, str]:
+    """
+    Get the path and media type of the artefact of a job.
+
+    Raises an HTTPException if the job does not exist or has not succeeded.
+
+    Keyword arguments:
+        job_id: the id of the job
+    """
+    row = _get_job_row(job_id)
+    if row["status"] != JobStatus.succeeded:
+        raise HTTPException(409, f"The job is {row['status']}, the result is only available once it succeeded.")
+    return _artefact_path(job_id), row["media_type"]
+
+
+def start_job_workers() -> None:
+    """Start the background threads running jobs in this process, and sending the heartbeats of its running jobs."""
+    global _worker_id
+    # A new id, as processes forked from another process inherit its id
+    _worker_id = uuid.uuid4().hex
+    _requeue_abandoned_jobs()
+    _remove_expired_jobs()
+    for target, name in [(_work, "job-worker")] * JOB_WORKERS + [(_heartbeat, "job-heartbeat")]:
+        stop = threading.Event()
+        _stop_events.append(stop)
+        threading.Thread(target=target, args=(stop,), name=name, daemon=True).start()
+
+
+def stop_job_workers() -> None:
+    """Stop the background threads of this process, once they have finished their current job."""
+    for stop in _stop_events:
+        stop.set()
+    _stop_events.clear()
+
+
+def run_next_job() -> bool:
+    """Claim and run the oldest queued job, returning whether there was a job to run."""
+    job = _claim_job()
+    if job is None:
+        return False
+
+    try:
+        with SessionLocal() as dw:
+            content, media_type = job_handlers[job["kind"]](dw, pickle.loads(job["params"]), JobProgress(job["id"]))
+        _store_artefact(job["id"], content)
+        _finish_job(job["id"], JobStatus.succeeded, media_type=media_type)
+    except HTTPException as e:
+        _finish_job(job["id"], JobStatus.failed, error=str(e.detail))
+    except Exception as e:
+        logger.exception(f"Job {job['id']} failed.")
+        _finish_job(job["id"], JobStatus.failed, error=repr(e))
+    _remove_expired_jobs()
+    return True
+
+
+def _work(stop: threading.Event) -> None:
+    """Run queued jobs until stopped, requeueing abandoned jobs while idle."""
+    while not stop.is_set():
+        if not run_next_job():
+            _requeue_abandoned_jobs()
+            stop.wait(POLL_INTERVAL_SEC)
+
+
+def _heartbeat(stop: threading.Event) -> None:
+    """Record that the running jobs of this process are alive, until stopped."""
+    while not stop.wait(HEARTBEAT_INTERVAL_SEC):
+        with _database() as connection:
+            connection.execute("UPDATE job SET heartbeat_at = ? WHERE status = ? AND worker_id = ?",
+                               (time.time(), JobStatus.running.value, _worker_id))
+
+
+def _claim_job() -> sqlite3.Row | None:
+    """Atomically mark the oldest queued job as running in this process, and return it."""
+    with _database() as connection:
+        return connection.execute(
+            "UPDATE job SET status = ?, worker_id = ?, started_at = ?, heartbeat_at = ?, attempts = attempts + 1 "
+            "WHERE id = ("
+            "  SELECT id FROM job WHERE status = ? ORDER BY created_at LIMIT 1"
+            ") RETURNING id, kind, params",
+            (JobStatus.running.value, _worker_id, time.time(), time.time(), JobStatus.queued.value)
+        ).fetchone()
+
+
+def _finish_job(job_id: str, status: JobStatus, error: str = None, media_type: str = None) -> None:
+    with _database() as connection:
+        connection.execute(
+            "UPDATE job SET status = ?, error = ?, media_type = ?, finished_at = ? WHERE id = ?",
+            (status.value, error, media_type, time.time(), job_id)
+        )
+
+
+def _requeue_abandoned_jobs() -> None:
+    """
+    Queue the running jobs without a recent heartbeat again, as the process running them no longer exists.
+
+    Jobs which have been abandoned as many times as they may be run fail instead, as they may be crashing the processes
+    running them.
+    """
+    abandoned_before = time.time() - ABANDONED_AFTER_SEC
+    with _database() as connection:
+        connection.execute(
+            "UPDATE job SET status = ?, error = ?, finished_at = ? "
+            "WHERE status = ? AND heartbeat_at < ? AND attempts >= ?",
+            (JobStatus.failed.value, f"The job was abandoned {MAX_JOB_ATTEMPTS} times by the processes running it.",
+             time.time(), JobStatus.running.value, abandoned_before, MAX_JOB_ATTEMPTS)
+        )
+        connection.execute(
+            "UPDATE job SET status = ?, worker_id = NULL, heartbeat_at = NULL WHERE status = ? AND heartbeat_at < ?",
+            (JobStatus.queued.value, JobStatus.running.value, abandoned_before)
+        )
+
+
+def _remove_expired_jobs() -> None:
+    """Remove the jobs, and their artefacts, which finished longer ago than the time to live of jobs."""
+    with _database() as connection:
+        expired = connection.execute("SELECT id FROM job WHERE finished_at < ?",
+                                     (time.time() - JOB_TTL_SEC,)).fetchall()
+        for job in expired:
+            if os.path.exists(_artefact_path(job["id"])):
+                os.unlink(_artefact_path(job["id"]))
+            connection.execute("DELETE FROM job WHERE id = ?", (job["id"],))
+
+
+def _store_artefact(job_id: str, content: bytes) -> None:
+    """Store the artefact atomically, such that a partially written artefact is never downloaded."""
+    with tempfile.NamedTemporaryFile(dir=get_cache_directory("jobs"), suffix=".tmp", delete=False) as f:
+        f.write(content)
+    os.replace(f.name, _artefact_path(job_id))
+
+
+def _artefact_path(job_id: str) -> str:
+    return os.path.join(get_cache_directory("jobs"), f"{job_id}.artefact")
+
+
+def _get_job_row(job_id: str) -> sqlite3.Row:
+    with _database() as connection:
+        row = connection.execute("SELECT * FROM job WHERE id = ?", (job_id,)).fetchone()
+    if row is None:
+        raise HTTPException(404, "Job not found.")
+    return row
+
+
+def _to_datetime(timestamp: float | None) -> datetime | None:
+    return None if timestamp is None else datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+@contextmanager
+def _database() -> Iterator[sqlite3.Connection]:
+    """Connect to the job database within a transaction, creating the database if it does not exist."""
+    path = os.path.join(get_cache_directory("jobs"), "jobs.sqlite")
+    connection = sqlite3.connect(path, timeout=30)
+    connection.row_factory = sqlite3.Row
+    try:
+        _initialise(connection, path)
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+
+def _initialise(connection: sqlite3.Connection, path: str) -> None:
+    """Create the job database at the path, once per process."""
+    with _initialise_lock:
+        if path in _initialised_databases:
+            return
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS job (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                params BLOB NOT NULL,
+                client_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                worker_id TEXT,
+                heartbeat_at REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                frames_total INTEGER,
+                frames_fetched INTEGER NOT NULL DEFAULT 0,
+                frames_rendered INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                media_type TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )
+        """)
+        connection.execute("CREATE INDEX IF NOT EXISTS job_status_idx ON job (status, created_at)")
+        connection.execute("CREATE INDEX IF NOT EXISTS job_key_idx ON job (key)")
+        connection.execute("CREATE INDEX IF NOT EXISTS job_client_idx ON job (client_id, status)")
+        _initialised_databases.add(path)
@@ -0,0 +1,77 @@
+"""Responses serving files from local disk with support for HTTP range requests, e.g. to resume downloads."""
+import os
+import re
+from typing import Iterator
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+# The number of bytes read from the file at a time.
+CHUNK_SIZE = 1024 * 1024
+
+# Matches a single byte range, e.g. "bytes=0-499", "bytes=500-" or the suffix range "bytes=-500".
+byte_range_pattern = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def ranged_file_response(path: str, media_type: str, range_header: str | None) -> StreamingResponse:
+    """
+    Serve a file, or the single byte range of it requested by the Range header.
+
+    Multiple ranges are not supported, in which case the whole file is served, as permitted by RFC 9110.
+
+    Keyword arguments:
+        path: the path of the file to serve
+        media_type: the media type of the file
+        range_header: the value of the Range header of the request, if any
+    """
+    size = os.path.getsize(path)
+    headers = {"Accept-Ranges": "bytes"}
+    byte_range = parse_byte_range(range_header, size)
+
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(read_file(path, 0, size), media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    headers["Content-Length"] = str(end - start + 1)
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return StreamingResponse(read_file(path, start, end + 1), status_code=206, media_type=media_type, headers=headers)
+
+
+def parse_byte_range(range_header: str | None, size: int) -> tuple[int, int] | None:
+    """
+    Parse a Range header into the inclusive first and last byte of the range, or None if the whole file is requested.
+
+    Raises an HTTPException if the range cannot be satisfied for a file of the given size.
+
+    Keyword arguments:
+        range_header: the value of the Range header, if any
+        size: the size of the file in bytes
+    """
+    match = byte_range_pattern.match(range_header.strip()) if range_header else None
+    if match is None or match.groups() == ("", ""):
+        return None
+
+    first, last = match.groups()
+    if first == "":
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start, end = int(first), min(int(last or size - 1), size - 1)
+
+    if start > end or start >= size:
+        raise HTTPException(416, "The requested range cannot be satisfied.",
+                            headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+def read_file(path: str, start: int, stop: int) -> Iterator[bytes]:
+    """Read the bytes of a file from the start up until the stop offset, in chunks."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = stop - start
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
@@ -0,0 +1,82 @@
+"""
+In-process index of the reference geometries, i.e. the ENC cells, in the data warehouse.
+
+The reference geometries are static, so their bounds and simplified geometries are loaded once, instead of
+querying the coordinator every time a request is limited to an ENC cell.
+"""
+import json
+import os
+import threading
+from typing import NamedTuple
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from app.querybuilder import QueryBuilder
+from app.schemas.enc_enum import EncCell
+
+SQL_PATH = os.path.join(os.path.dirname(__file__), "sql")
+
+# The tolerance in meters used to simplify the geometries, smaller than the finest spatial resolution of the DW.
+SIMPLIFY_TOLERANCE = 10
+
+
+class ReferenceGeometry(NamedTuple):
+    """The bounds and simplified geometry of a reference geometry, in EPSG:3034."""
+
+    name: str
+    min_x: float
+    min_y: float
+    max_x: float
+    max_y: float
+    geometry: dict
+
+
+_reference_geometries: dict[str, ReferenceGeometry] | None = None
+_lock = threading.Lock()
+
+
+def load_reference_geometries(dw: Session) -> dict[str, ReferenceGeometry]:
+    """
+    Load the bounds and simplified geometries of all reference geometries, replacing the index.
+
+    Args:
+        dw: The data warehouse session.
+    """
+    global _reference_geometries
+
+    query = QueryBuilder(SQL_PATH).add_sql("reference_geometries.sql").get_query_text()
+    rows = dw.execute(query, {"simplify_tolerance": SIMPLIFY_TOLERANCE}).mappings().all()
+    # commit the transaction, as citus will tend to not create new connections to workers if not committed.
+    dw.commit()
+
+    _reference_geometries = {
+        row['name']: ReferenceGeometry(**{**row, 'geometry': json.loads(row['geometry'])}) for row in rows
+    }
+    return _reference_geometries
+
+
+def _get_reference_geometries(dw: Session) -> dict[str, ReferenceGeometry]:
+    """Get the index of reference geometries, loading it if it has not been loaded yet."""
+    if _reference_geometries is None:
+        with _lock:
+            if _reference_geometries is None:
+                load_reference_geometries(dw)
+    return _reference_geometries
+
+
+def get_reference_geometry(dw: Session, enc_cell: EncCell) -> ReferenceGeometry:
+    """
+    Get the bounds and simplified geometry of an ENC cell.
+
+    Args:
+        dw: The data warehouse session, only used if the reference geometries have not been loaded yet.
+        enc_cell: The ENC cell to get the reference geometry of.
+
+    Raises:
+        HTTPException: If the ENC cell does not exist in the data warehouse.
+    """
+    try:
+        return _get_reference_geometries(dw)[enc_cell.value]
+    except KeyError:
+        raise HTTPException(404, f"The ENC cell '{enc_cell.value}' was not found.")
@@ -1,16 +1,26 @@
 """FastAPI router for basic SQL queries."""
+import os
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 from app.dependencies import get_dw
+from app.etl_imports import get_latest_import_id
+from app.querybuilder import QueryBuilder
 from app.schemas.relations import DWRELATION
 from app.schemas.count_rows import CountRows
 from app.schemas.column_names import ColumnNames
+from app.schemas.table_metadata import TableMetadata
+from app.table_metadata import get_table_metadata
 
 router = APIRouter()
 
+SQL_PATH = os.path.join(os.path.dirname(__file__), "sql")
+
+# Exact row counts per relation, together with the id of the latest ETL import when they were counted.
+exact_row_counts: dict[DWRELATION, tuple[int, int]] = {}
+
 
 @router.get("/", response_model=list[str])
 def table():
@@ -19,16 +29,58 @@ def table():
 
 
 @router.get("/{table}/count", response_model=CountRows)
-def count_rows(table: DWRELATION, db: Session = Depends(get_dw)):
+def count_rows(
+        table: DWRELATION,
+        exact: bool = Query(default=False,
+                            description="Whether to count the rows exactly. Exact counts are cached until the next "
+                                        "ETL import, otherwise the count is estimated from the planner statistics."),
+        db: Session = Depends(get_dw)):
     """Get the number of rows in the given table."""
-    return {
-        "count": db.execute(text(f"SELECT COUNT(*) FROM {table.name}")).fetchone()[0]
-    }
+    if not exact:
+        return {"count": get_estimated_row_count(db, table), "exact": False}
+
+    return {"count": get_exact_row_count(db, table), "exact": True}
+
+
+def get_estimated_row_count(db: Session, table: DWRELATION) -> int:
+    """
+    Estimate the number of rows in a table from the planner statistics of its partitions and shards.
+
+    Args:
+        db: The data warehouse session.
+        table: The table to estimate the number of rows of.
+    """
+    query = QueryBuilder(SQL_PATH).add_sql("estimated_row_count.sql").get_query_text()
+    return db.execute(query, {"table": table.value}).fetchone()[0]
+
+
+def get_exact_row_count(db: Session, table: DWRELATION) -> int:
+    """
+    Count the rows in a table, reusing the previous count if no ETL import has happened since.
+
+    Args:
+        db: The data warehouse session.
+        table: The table to count the rows of.
+    """
+    import_id = get_latest_import_id(db)
+    cached = exact_row_counts.get(table)
+    if cached is not None and cached[0] == import_id:
+        return cached[1]
+
+    count = db.execute(text(f"SELECT COUNT(*) FROM {table.name}")).fetchone()[0]
+    exact_row_counts[table] = (import_id, count)
+    return count
 
 
 @router.get("/{table}/columns", response_model=ColumnNames)
 def column_names(table: DWRELATION, db=Depends(get_dw)):
     """Get the column names of a given table."""
     return {
-        "columns": [column for column in db.execute(text(f"SELECT * FROM {table.name} LIMIT 0")).keys()]
+        "columns": [column.name for column in get_table_metadata(db, table).columns]
     }
+
+
+@router.get("/{table}/metadata", response_model=TableMetadata)
+def table_metadata(table: DWRELATION, db=Depends(get_dw)):
+    """Get the columns, indexes and partitioning of a given table."""
+    return get_table_metadata(db, table)
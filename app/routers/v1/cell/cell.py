@@ -1,18 +1,22 @@
 """Cell endpoint controller for the DIPAAL api."""
+import json
 import os
 import pandas as pd
 import numpy as np
 
 from app.dependencies import get_dw
+from app.reference_geometries import get_reference_geometry
+from app.schemas.enc_enum import EncCell
 from app.schemas.fact_cell import FactCell
 from app.schemas.spatial_resolution import SpatialResolution
 from datetime import datetime
-from fastapi import APIRouter, Depends, Query, Path
+from fastapi import APIRouter, Depends, Query, Path, HTTPException
 from fastapi.responses import JSONResponse
 from fastapi.encoders import jsonable_encoder
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 from typing import List
+from helper_functions import temporal_bound_ids
 
 router = APIRouter()
 current_file_path = os.path.dirname(os.path.abspath(__file__))
@@ -20,22 +24,33 @@ current_file_path = os.path.dirname(os.path.abspath(__file__))
 
 @router.get('/{cell_size}', response_model=List[FactCell])
 def cell_facts(
-        x_min: int = Query(example='3600000',
-                           description='Defines the "left side" of the bounding rectangle,'
-                           ' coordinates must match the provided "srid".'),
-        y_min: int = Query(example='3030000',
-                           description='Defines the "bottom side" of the bounding rectangle,'
-                           ' coordinates must match the provided "srid".'),
-        x_max: int = Query(example='4395000',
-                           description='Defines the "right side" of the bounding rectangle,'
-                           ' coordinates must match the provided "srid".'),
-        y_max: int = Query(example='3485000',
-                           description='Defines the "top side" of the bounding rectangle,'
-                           ' coordinates must match the provided "srid".'),
+        x_min: int | None = Query(default=None,
+                                  example='3600000',
+                                  description='Defines the "left side" of the bounding rectangle,'
+                                  ' coordinates must match the provided "srid". '
+                                  'Required unless an ENC cell is provided.'),
+        y_min: int | None = Query(default=None,
+                                  example='3030000',
+                                  description='Defines the "bottom side" of the bounding rectangle,'
+                                  ' coordinates must match the provided "srid". '
+                                  'Required unless an ENC cell is provided.'),
+        x_max: int | None = Query(default=None,
+                                  example='4395000',
+                                  description='Defines the "right side" of the bounding rectangle,'
+                                  ' coordinates must match the provided "srid". '
+                                  'Required unless an ENC cell is provided.'),
+        y_max: int | None = Query(default=None,
+                                  example='3485000',
+                                  description='Defines the "top side" of the bounding rectangle,'
+                                  ' coordinates must match the provided "srid". '
+                                  'Required unless an ENC cell is provided.'),
         cell_size: SpatialResolution = Path(example=SpatialResolution.five_kilometers,
                                             description='Defines the spatial resolution of the resulting cell facts.'),
         srid: int = Query(default=3034,
                           description='The srid projection used for the defined bounding rectangle.'),
+        enc_cell: EncCell = Query(default=None,
+                                  description='Limits the cell facts to cells intersecting the provided ENC cell. '
+                                              'If provided, this parameter overrides the bounding rectangle.'),
         start_timestamp: datetime = Query(default=datetime.min,
                                           example='2022-01-01T00:00:00Z',
                                           description='The inclusive timestamp that defines'
@@ -49,6 +64,14 @@ def cell_facts(
         offset: int = Query(default=0, ge=0, description='Specifies the offset of the first result to return.'),
         dw: Session = Depends(get_dw)):
     """Get cell facts based on the given parameters."""
+    enc_geometry = None
+    if enc_cell is not None:
+        enc_geometry = get_reference_geometry(dw, enc_cell)
+        x_min, y_min, x_max, y_max, srid = \
+            enc_geometry.min_x, enc_geometry.min_y, enc_geometry.max_x, enc_geometry.max_y, 3034
+    elif None in (x_min, y_min, x_max, y_max):
+        raise HTTPException(status_code=400, detail="Spatial bounds not complete")
+
     with open(os.path.join(current_file_path, 'sql/fact_cell_extract.sql')) as file:
         query = file.read().format(CELL_SIZE=int(cell_size))
 
@@ -58,9 +81,9 @@ def cell_facts(
         'xmax': x_max,
         'ymax': y_max,
         'srid': srid,
+        'enc_geometry': json.dumps(enc_geometry.geometry) if enc_geometry else None,
         'stopped': stopped,
-        'start_date_id': int(start_timestamp.strftime("%Y%m%d")),
-        'end_date_id': int(end_timestamp.strftime("%Y%m%d")),
+        **temporal_bound_ids(start_timestamp, end_timestamp, end_inclusive=True),
         'end_timestamp': end_timestamp,
         'start_timestamp': start_timestamp,
         'limit': limit,
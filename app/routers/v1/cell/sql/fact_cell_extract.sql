@@ -22,10 +22,14 @@ INNER JOIN dim_direction dd ON fc.direction_id = dd.direction_id
 INNER JOIN dim_ship_type dst ON ds.ship_type_id = dst.ship_type_id
 INNER JOIN dim_nav_status dns ON fc.nav_status_id = dns.nav_status_id
 WHERE ST_Intersects(dc.geom, ST_Transform(st_makeenvelope(:xmin, :ymin, :xmax, :ymax, :srid), 3034))
+  AND (
+    CAST(:enc_geometry AS text) IS NULL
+    OR ST_Intersects(dc.geom, ST_SetSRID(ST_GeomFromGeoJSON(CAST(:enc_geometry AS text)), 3034))
+  )
   AND fc.infer_stopped = ANY(:stopped)
   AND fc.entry_date_id BETWEEN :start_date_id AND :end_date_id
-  AND timestamp_from_date_time_id(fc.entry_date_id, fc.entry_time_id) <= :end_timestamp
-  AND timestamp_from_date_time_id(fc.entry_date_id, fc.entry_time_id) >= :start_timestamp
+  AND (fc.entry_date_id, fc.entry_time_id) <= (:end_date_id, :end_time_id)
+  AND (fc.entry_date_id, fc.entry_time_id) >= (:start_date_id, :start_time_id)
 LIMIT :limit
 OFFSET :offset
 ;
\ No newline at end of file
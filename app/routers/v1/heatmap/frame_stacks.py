@@ -0,0 +1,83 @@
+"""
+Output of the frames of multi heatmaps as a single stack of rasters, for consumers of the values rather than a video.
+
+The frames are stacked without being rendered, either as a compressed NumPy archive or as a multi-band GeoTIFF,
+with the title of the period of each frame as metadata.
+"""
+import io
+from typing import Callable
+
+import numpy as np
+from rasterio import MemoryFile
+
+from app.routers.v1.heatmap.heatmap_frames import Frame
+from app.schemas.multi_output_format import MultiOutputFormat
+
+
+def read_frames(frames: list[Frame]) -> tuple[np.ndarray, dict]:
+    """
+    Read the rasters of frames into a single array of shape (frames, height, width).
+
+    All frames of a multi heatmap share the extent of the heatmap, so the profile of the first frame applies to all.
+
+    Keyword arguments:
+        frames: the frames to read
+    """
+    bands = []
+    profile = None
+    for frame in frames:
+        with MemoryFile(frame.raster) as memfile:
+            with memfile.open() as raster:
+                bands.append(raster.read(1))
+                profile = profile or raster.profile
+    return np.stack(bands), profile
+
+
+def frames_to_npz(frames: list[Frame]) -> bytes:
+    """
+    Stack frames into a compressed NumPy archive.
+
+    The archive contains the "rasters" array of shape (frames, height, width), the "titles" of the frames,
+    the affine "transform" of the rasters as its first six coefficients, their "crs" as WKT, and their "nodata" value.
+
+    Keyword arguments:
+        frames: the frames to stack
+    """
+    rasters, profile = read_frames(frames)
+    transform = profile['transform']
+    buffer = io.BytesIO()
+    np.savez_compressed(
+        buffer,
+        rasters=rasters,
+        titles=np.array([frame.title for frame in frames]),
+        transform=np.array([transform.a, transform.b, transform.c, transform.d, transform.e, transform.f]),
+        crs=np.array(profile['crs'].to_wkt()),
+        nodata=np.array(np.nan if profile['nodata'] is None else profile['nodata']),
+    )
+    return buffer.getvalue()
+
+
+def frames_to_geotiff(frames: list[Frame]) -> bytes:
+    """
+    Stack frames into a multi-band GeoTIFF, with one band per frame described by the title of the frame.
+
+    Keyword arguments:
+        frames: the frames to stack
+    """
+    rasters, profile = read_frames(frames)
+    profile.update(count=len(frames), compress='deflate', predictor=2, tiled=True, blockxsize=256, blockysize=256,
+                   interleave='band')
+    with MemoryFile() as memfile:
+        with memfile.open(**profile) as stack:
+            stack.write(rasters)
+            for band, frame in enumerate(frames, start=1):
+                stack.set_band_description(band, frame.title)
+                stack.update_tags(band, title=frame.title)
+        return memfile.read()
+
+
+# The function stacking the frames of each output format which is a frame stack rather than a video.
+frame_stack_writers: dict[MultiOutputFormat, Callable[[list[Frame]], bytes]] = {
+    MultiOutputFormat.npz: frames_to_npz,
+    MultiOutputFormat.tiff: frames_to_geotiff,
+}
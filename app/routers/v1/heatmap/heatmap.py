@@ -1,19 +1,31 @@
 """Router for all endpoints related to heatmaps."""
-import io
 
 import datetime
+import json
 import os
+from typing import Callable, NamedTuple, TypeVar
 
-from fastapi import APIRouter, Depends, Query, HTTPException, Path
-from fastapi.responses import PlainTextResponse
-from sqlalchemy import text
-import pandas as pd
+from fastapi import APIRouter, Depends, Query, HTTPException, Path, Header, Request
+from fastapi.responses import PlainTextResponse, JSONResponse, Response
 from sqlalchemy.orm import Session
 
-from app.dependencies import get_dw
-from pydash.objects import merge
-
-from app.routers.v1.heatmap.heatmap_renders import geo_tiff_to_png, geo_tiffs_to_video
+from app.admission import admission_controller, check_cost, estimate_heatmap_cost
+from app.dependencies import get_dw, get_client_id
+from app.etl_imports import get_latest_import_id
+from app.jobs import JobProgress, create_job, register_job_handler
+from app.single_flight import single_flight, request_key
+from app.reference_geometries import get_reference_geometry
+from app.routers.v1.heatmap.heatmap_catalogue import catalogue, etag_matches
+from app.routers.v1.heatmap.frame_stacks import frame_stack_writers
+from app.routers.v1.heatmap.heatmap_frames import fetch_frames, iter_frames, render_frames
+from app.routers.v1.heatmap.heatmap_renders import geo_tiff_to_png, max_height, max_width
+from app.routers.v1.heatmap.map_algebra import compile_map_algebra, map_algebra_rasters, raster_algebra_rasters
+from app.routers.v1.heatmap.periods import get_periods
+from app.routers.v1.heatmap.single_rasters import fetch_single_raster, fetch_single_rasters
+from app.routers.v1.heatmap.zonal_statistics import bbox_zone, raster_zonal_statistics, reference_geometry_zone, \
+    zones_bounds
+from app.routers.v1.heatmap.video_encoders import EncoderSettings, encode_video
+from app.routers.v1.jobs.jobs import job_with_result_url
 from app.schemas.heatmap_type import HeatmapType
 from app.schemas.mobile_type import MobileType
 from app.schemas.ship_type import ShipType
@@ -21,60 +33,75 @@ from app.schemas.single_output_formats import SingleOutputFormat
 from app.schemas.spatial_resolution import SpatialResolution
 from app.schemas.temporal_resolution import TemporalResolution
 from app.schemas.enc_enum import EncCell
+from app.schemas.encoder_preset import EncoderPreset
 from app.schemas.multi_output_format import MultiOutputFormat
 from app.schemas.heatmapmeta import HeatmapMetadata
-from helper_functions import measure_time
+from app.schemas.job import Job
+from app.schemas.raster_algebra import RasterAlgebra
+from app.schemas.zonal_statistics import ZoneStatistics
+from helper_functions import measure_time, temporal_bound_ids
 
 
 router = APIRouter()
 current_file_path = os.path.dirname(os.path.abspath(__file__))
 
-temporal_resolution_names = {
-    86400: "daily",
-    3600: "hourly",
+# The media type of each output format of multi heatmaps.
+multi_media_types = {
+    MultiOutputFormat.mp4: "video/mp4",
+    MultiOutputFormat.webm: "video/webm",
+    MultiOutputFormat.gif: "image/gif",
+    MultiOutputFormat.webp: "image/webp",
+    MultiOutputFormat.npz: "application/octet-stream",
+    MultiOutputFormat.tiff: "image/tiff",
 }
 
-
-@router.get("", response_model=dict[str, HeatmapMetadata])
-def metadata(db: Session = Depends(get_dw)):
+# Type variable for the result of requests executed with admitted_single_flight.
+T = TypeVar('T')
+
+# The kind of the jobs rendering multi heatmaps in the background.
+MULTI_HEATMAP_JOB = "multi_heatmap"
+
+
+class MultiHeatmapRequest(NamedTuple):
+    """The parsed parameters of a multi heatmap request."""
+
+    query: str
+    params: dict
+    heatmap_type: HeatmapType
+    temporal_resolution: TemporalResolution
+    output_format: MultiOutputFormat
+    fps: int
+    max_value: float | None
+    encoder: EncoderSettings
+    cost: float
+
+    @property
+    def key(self) -> str:
+        """Identify identical multi heatmap requests, see request_key."""
+        return request_key("multi_heatmap", {
+            **self.params,
+            'temporal_resolution': self.temporal_resolution,
+            'output_format': self.output_format,
+            'fps': self.fps,
+            'max_value': self.max_value,
+            'encoder': self.encoder._asdict()
+        })
+
+
+@router.get("", response_model=dict[str, HeatmapMetadata],
+            responses={
+                304: {"description": "The heatmap metadata has not changed since the provided ETag."}
+            })
+def metadata(if_none_match: str | None = Header(default=None), db: Session = Depends(get_dw)):
     """Return all heatmaps that are available in the DW."""
-    with open(os.path.join(current_file_path, "sql/available_heatmaps.sql"), "r") as f:
-        query = f.read()
+    catalogue.refresh(db)
+    heatmap_types, etag = catalogue.snapshot
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
 
-    df = pd.read_sql(text(query), db.bind.connect())
-
-    heatmap_types = {}
-
-    for row in df.to_dict(orient="records"):
-        row_object = {
-            row['slug']: {
-                "name": row['name'],
-                "description": row['description'],
-                "spatial_resolutions": {
-                    f"{row['spatial_resolution']}m": {
-                        "resolution": row['spatial_resolution'],
-                        "units": "meters",
-                        "temporal_resolutions": {
-                            temporal_resolution_names.get(
-                                row['temporal_resolution_sec'],
-                                f"{row['temporal_resolution_sec']}s"
-                            ): {
-                                "resolution": row['temporal_resolution_sec'],
-                                "units": "seconds",
-                                "temporal_domain": {
-                                    "start": row['min_date'],
-                                    "end": row['max_date']
-                                }
-                            }
-                        }
-                    }
-                }
-            }
-        }
-        # merge the object into the heatmap_types dict using pydash
-        heatmap_types = merge(heatmap_types, row_object)
-
-    return heatmap_types
+    return JSONResponse(heatmap_types, headers=headers)
 
 
 @router.get("/single/{heatmap_type}/{spatial_resolution}", response_class=PlainTextResponse)
@@ -90,7 +117,9 @@ def single_heatmap(
         ship_types: list[ShipType] = Query(default=[ship_type for ship_type in ShipType],
                                            description="Limits what ship type the ships must belong to."),
         output_format: SingleOutputFormat = Query(default=SingleOutputFormat.tiff,
-                                                  description="The output format of the heatmap."),
+                                                  description="The output format of the heatmap. PNGs are rendered "
+                                                              "at a coarser spatial resolution if the bounds do not "
+                                                              "fit in 2000x2000 pixels at the requested resolution."),
         x_min: int = Query(default=3600000, description='Defines the "left side" of the bounding rectangle, '
                                                         'coordinates must match the provided "srid" parameter.'),
         y_min: int = Query(default=3030000, description='Defines the "bottom side" of the bounding rectangle, '
@@ -104,13 +133,17 @@ def single_heatmap(
         enc_cell: EncCell = Query(default=None,
                                   description='Limits the heatmaps spatial extent to the provided ENC cell. '
                                               'If provided, this parameter overrides any other spatial constraints.'),
+        clip_to_enc_cell: bool = Query(default=False,
+                                       description='Whether to clip the heatmap to the geometry of the provided ENC '
+                                                   'cell, instead of its bounding rectangle.'),
         start_timestamp: datetime.datetime = Query(default="2022-01-01T00:00:00Z",
                                                    description='The inclusive timestamp that defines '
                                                                'the start of the temporal bound.'),
         end_timestamp: datetime.datetime = Query(default="2022-02-01T00:00:00Z",
                                                  description='The exclusive timestamp that defines '
                                                              'the end of the temporal bound.'),
-        dw=Depends(get_dw)):
+        dw=Depends(get_dw),
+        client_id: str = Depends(get_client_id)):
     """Return a single heatmap, based on the parameters provided."""
     if srid != 3034:
         raise HTTPException(501, "Only SRID 3034 is supported.")
@@ -119,10 +152,8 @@ def single_heatmap(
         query = f.read()
 
     spatial_resolution, x_min, y_min, x_max, y_max, width, height = \
-        get_spatial_resolution_and_bounds(dw, spatial_resolution, x_min, y_min, x_max, y_max, enc_cell)
-
-    start_date_id = int(start_timestamp.strftime("%Y%m%d"))
-    end_date_id = int(end_timestamp.strftime("%Y%m%d"))
+        get_spatial_resolution_and_bounds(dw, spatial_resolution, x_min, y_min, x_max, y_max, enc_cell,
+                                          single_display_size(output_format))
 
     params = {
         'width': width,
@@ -137,37 +168,103 @@ def single_heatmap(
         'max_cell_y': int(y_max / 5000),
         'spatial_resolution': int(spatial_resolution),
         'heatmap_type_slug': heatmap_type,
+        'clip_geometry': get_clip_geometry(dw, enc_cell, clip_to_enc_cell),
         'mobile_types': mobile_types,
         'ship_types': ship_types,
-        'start_date_id': start_date_id,
-        'end_date_id': end_date_id,
+        **temporal_bound_ids(start_timestamp, end_timestamp),
         'start_timestamp': start_timestamp,
         'end_timestamp': end_timestamp,
     }
 
-    result, query_time_taken_sec = measure_time(lambda: dw.execute(text(query), params).fetchone())
+    title = f"{heatmap_type.value} {start_timestamp.strftime('%Y-%m-%d')} - {end_timestamp.strftime('%Y-%m-%d')}"
+    cost = estimate_heatmap_cost(width, height, spatial_resolution, start_timestamp, end_timestamp)
+
+    return admitted_single_flight(
+        client_id, cost,
+        request_key("single_heatmap", {**params, 'output_format': output_format}),
+        lambda: single_raster_response(dw, query, params, output_format, title)
+    )
+
+
+def admitted_single_flight(client_id: str, cost: float, key: str, func: Callable[[], T]) -> T:
+    """
+    Admit a request within the budgets of the client, and execute it unless an identical execution is in flight.
+
+    Only the execution leading the flight takes a heavy slot, such that identical requests wait for its result
+    instead of queueing for a slot, and requests answered from a fresh result never queue for one.
+
+    Keyword arguments:
+        client_id: identifies the client making the request
+        cost: the estimated cost of the request
+        key: the key identifying the execution, see request_key
+        func: the zero argument function to execute
+    """
+    with admission_controller.admit(client_id, cost):
+        return single_flight(key, lambda: _in_heavy_slot(cost, func))
+
 
-    if result is None or result[0] is None:
+def _in_heavy_slot(cost: float, func: Callable[[], T]) -> T:
+    """Execute the function in a heavy slot, if a request of the given cost is heavy."""
+    with admission_controller.heavy_slot(cost):
+        return func()
+
+
+def single_display_size(output_format: SingleOutputFormat) -> tuple[int, int] | None:
+    """Get the maximum width and height a single heatmap is displayed at, or None if it is not rendered."""
+    if output_format != SingleOutputFormat.png:
+        return None
+    return max_width, max_height
+
+
+def single_raster_response(dw: Session, query: str, params: dict, output_format: SingleOutputFormat, title: str,
+                           can_be_negative: bool = False) -> PlainTextResponse:
+    """
+    Query a single raster, and return it as a response in the requested output format.
+
+    Keyword arguments:
+        dw: database connection
+        query: the query returning the raster as a GeoTIFF
+        params: the parameters of the query
+        output_format: the output format of the response
+        title: title of the heatmap, shown if rendered as an image
+        can_be_negative: whether the raster can be negative, i.e. whether a colormap should support negative values.
+    """
+    raster, query_time_taken_sec = measure_time(lambda: fetch_single_raster(dw, query, params))
+
+    if raster is None:
         raise HTTPException(404, "No heatmap data found given the parameters.")
 
+    return raster_response(raster, output_format, title, params['spatial_resolution'], can_be_negative=can_be_negative,
+                           headers={'Query-Time': str(query_time_taken_sec)})
+
+
+def raster_response(raster: bytes, output_format: SingleOutputFormat, title: str, spatial_resolution: int,
+                    headers: dict[str, str], can_be_negative: bool = False) -> PlainTextResponse:
+    """
+    Return a raster as a response in the requested output format.
+
+    Keyword arguments:
+        raster: the raster as a GeoTIFF
+        output_format: the output format of the response
+        title: title of the heatmap, shown if rendered as an image
+        spatial_resolution: the spatial resolution of the raster in meters
+        headers: the headers of the response, e.g. the time taken to query the raster
+        can_be_negative: whether the raster can be negative, i.e. whether a colormap should support negative values.
+    """
     if output_format == SingleOutputFormat.png:
-        png, image_time_taken_sec = try_get_png_from_geotiff(
-            result[0].tobytes(),
-            title=f"{heatmap_type.value} {start_timestamp.strftime('%Y-%m-%d')} - {end_timestamp.strftime('%Y-%m-%d')}"
-        )
+        png, image_time_taken_sec = try_get_png_from_geotiff(raster, can_be_negative=can_be_negative, title=title)
         return PlainTextResponse(png, media_type="image/png",
                                  headers={
-                                     'Query-Time': str(query_time_taken_sec),
-                                     'Image-Time': str(image_time_taken_sec)
+                                     **headers,
+                                     'Image-Time': str(image_time_taken_sec),
+                                     'Spatial-Resolution': f"{spatial_resolution}m"
                                  })
 
-    return PlainTextResponse(result[0].tobytes(), media_type="image/tiff",
-                             headers={'Query-Time': str(query_time_taken_sec)}
-                             )
+    return PlainTextResponse(raster, media_type="image/tiff", headers=headers)
 
 
-def try_get_png_from_geotiff(geo_tiff_bytes: io.BytesIO, can_be_negative: bool = False, title: str = None)\
-        -> (io.BytesIO, float):
+def try_get_png_from_geotiff(geo_tiff_bytes: bytes, can_be_negative: bool = False, title: str = None)\
+        -> (bytes, float):
     """
     Measure time of converting geotiff to png, and reraise the ValueError as HTTPException.
 
@@ -191,22 +288,20 @@ def get_enc_cell_min_max(db: Session, enc_cell: EncCell, min_x, min_y, max_x, ma
     if enc_cell is None:
         return min_x, min_y, max_x, max_y
     # replace min_x, min_y, max_x, max_y with the values from the enc_cell
-    enc_cell_result = db.execute(text("""
-            SELECT
-                ST_XMin(geom) AS min_x,
-                ST_YMin(geom) AS min_y,
-                ST_XMax(geom) AS max_x,
-                ST_YMax(geom) AS max_y
-            FROM reference_geometries WHERE name = :name;
-        """), {"name": enc_cell.value}).fetchone()
+    enc_cell_geometry = get_reference_geometry(db, enc_cell)
 
-    # commit the transaction, as citus will tend to not create new connections to workers if not committed.
-    db.commit()
+    return enc_cell_geometry.min_x, enc_cell_geometry.min_y, enc_cell_geometry.max_x, enc_cell_geometry.max_y
 
-    return enc_cell_result.min_x, enc_cell_result.min_y, enc_cell_result.max_x, enc_cell_result.max_y
 
+def get_clip_geometry(db: Session, enc_cell: EncCell, clip_to_enc_cell: bool) -> str | None:
+    """Get the simplified geometry of the ENC cell as GeoJSON, if the heatmap should be clipped to it."""
+    if enc_cell is None or not clip_to_enc_cell:
+        return None
+    return json.dumps(get_reference_geometry(db, enc_cell).geometry)
 
-def get_spatial_resolution_and_bounds(dw, spatial_resolution, min_x, min_y, max_x, max_y, enc_cell)\
+
+def get_spatial_resolution_and_bounds(dw, spatial_resolution, min_x, min_y, max_x, max_y, enc_cell,
+                                      display_size: tuple[int, int] = None) \
         -> tuple[int, int, int, int, int, int, int]:
     """
     Based on query inputs, find bounds and spatial resolution of the output raster.
@@ -219,11 +314,15 @@ def get_spatial_resolution_and_bounds(dw, spatial_resolution, min_x, min_y, max_
         max_x: maximum x coordinate of the output raster
         max_y: maximum y coordinate of the output raster
         enc_cell: ENC cell name (optional)
+        display_size: the maximum width and height in pixels the raster is displayed at, if it is rendered,
+            in which case the spatial resolution is coarsened to fit it, see display_spatial_resolution
     """
-    spatial_resolution = int(spatial_resolution)
-
     min_x, min_y, max_x, max_y = get_enc_cell_min_max(dw, enc_cell, min_x, min_y, max_x, max_y)
 
+    if display_size is not None:
+        spatial_resolution = display_spatial_resolution(spatial_resolution, min_x, min_y, max_x, max_y, *display_size)
+    spatial_resolution = int(spatial_resolution)
+
     # extend spatial bounds to fit the spatial resolution
     min_x = int(min_x - (min_x % spatial_resolution))
     min_y = int(min_y - (min_y % spatial_resolution))
@@ -242,6 +341,33 @@ def get_spatial_resolution_and_bounds(dw, spatial_resolution, min_x, min_y, max_
     return spatial_resolution, min_x, min_y, max_x, max_y, width, height
 
 
+def display_spatial_resolution(spatial_resolution: SpatialResolution, min_x: int, min_y: int, max_x: int, max_y: int,
+                               display_width: int, display_height: int) -> SpatialResolution:
+    """
+    Get the finest spatial resolution, no finer than the requested, at which the bounds fit in the display size.
+
+    A rendered heatmap cannot show more pixels than it is displayed at, so a finer raster would only be built,
+    transferred and rendered to be downsampled afterwards. The data warehouse aggregates the heatmaps of every spatial
+    resolution with the union type of the heatmap type, so the coarser raster holds aggregated values, not a sample.
+    If no spatial resolution fits, the coarsest is used, and the raster is downsampled when rendered.
+
+    Keyword arguments:
+        spatial_resolution: the requested spatial resolution
+        min_x: minimum x coordinate of the bounds
+        min_y: minimum y coordinate of the bounds
+        max_x: maximum x coordinate of the bounds
+        max_y: maximum y coordinate of the bounds
+        display_width: the maximum width in pixels the raster is displayed at
+        display_height: the maximum height in pixels the raster is displayed at
+    """
+    candidates = sorted([resolution for resolution in SpatialResolution
+                         if int(resolution) >= int(spatial_resolution)], key=int)
+    for candidate in candidates:
+        if (max_x - min_x) / int(candidate) <= display_width and (max_y - min_y) / int(candidate) <= display_height:
+            return candidate
+    return candidates[-1]
+
+
 @router.get("/mapalgebra/{heatmap_type}/{spatial_resolution}", response_class=PlainTextResponse)
 def mapalgebra_heatmap(
         # Path parameters
@@ -251,17 +377,21 @@ def mapalgebra_heatmap(
                                                      example=SpatialResolution.five_kilometers),
         # Query parameters
         output_format: SingleOutputFormat = Query(default=SingleOutputFormat.tiff,
-                                                  description='Output format of the heatmap.'),
+                                                  description='Output format of the heatmap. PNGs are rendered '
+                                                              'at a coarser spatial resolution if the bounds do not '
+                                                              'fit in 2000x2000 pixels at the requested resolution.'),
         map_algebra_expr: str = Query(default="[rast2.val]-[rast1.val]",
-                                      description='A PostgreSQL algebraic expression involving two rasters and '
+                                      description='A map algebra expression involving two rasters and '
                                                   'functions/operators that defines the pixel value when pixels '
-                                                  'intersect.'),
+                                                  'intersect. The grammar is that of the expressions of '
+                                                  'ST_MapAlgebra, e.g. "([rast2.val] - [rast1.val]) / '
+                                                  'greatest([rast1.val], 1)".'),
         map_algebra_no_data_1_expr: str = Query(default="[rast2.val]",
-                                                description='A PostgreSQL algebraic expression only involving the '
+                                                description='A map algebra expression only involving the '
                                                             'second raster, that defines what to return when the first '
                                                             'raster has no data.'),
         map_algebra_no_data_2_expr: str = Query(default="-[rast1.val]",
-                                                description='A PostgreSQL algebraic expression only involving the '
+                                                description='A map algebra expression only involving the '
                                                             'first raster, that defines what to return when the second '
                                                             'raster has no data.'),
         x_min: int = Query(default=3600000,
@@ -282,6 +412,9 @@ def mapalgebra_heatmap(
         enc_cell: EncCell = Query(default=None,
                                   description='Limits the heatmaps spatial extent to the provided ENC cell. '
                                               'If provided, this parameter overrides any other spatial constraints.'),
+        clip_to_enc_cell: bool = Query(default=False,
+                                       description='Whether to clip the heatmap to the geometry of the provided ENC '
+                                                   'cell, instead of its bounding rectangle.'),
         first_mobile_types: list[MobileType] = Query(default=[MobileType.class_a, MobileType.class_b],
                                                      description='The mobile types to include in the first raster.'),
         first_ship_types: list[ShipType] = Query(default=[ShipType.cargo, ShipType.passenger],
@@ -306,22 +439,26 @@ def mapalgebra_heatmap(
                                                         description='The exclusive timestamp that defines '
                                                                     'the end of the temporal bound for the '
                                                                     'second raster.'),
-        dw=Depends(get_dw)
+        dw=Depends(get_dw),
+        client_id: str = Depends(get_client_id)
 ):
     """Return a single mapalgebra heatmap, based on the parameters provided."""
     if srid != 3034:
         raise HTTPException(501, "Only SRID 3034 is supported.")
 
-    with open(os.path.join(current_file_path, "sql/mapalgebra_single_heatmap.sql"), "r") as f:
+    expression = compile_map_algebra(map_algebra_expr, 2)
+    no_data_1_expression = compile_map_algebra(map_algebra_no_data_1_expr, 2)
+    no_data_2_expression = compile_map_algebra(map_algebra_no_data_2_expr, 2)
+    if 1 in no_data_1_expression.operands or 2 in no_data_2_expression.operands:
+        raise HTTPException(400, "The no data expressions may only reference the raster which has data.")
+
+    # The operands are queried as single heatmaps, such that they are cached independently of the expressions
+    with open(os.path.join(current_file_path, "sql/single_heatmap.sql"), "r") as f:
         query = f.read()
 
     spatial_resolution, x_min, y_min, x_max, y_max, width, height = \
-        get_spatial_resolution_and_bounds(dw, spatial_resolution, x_min, y_min, x_max, y_max, enc_cell)
-
-    first_start_date_id = int(first_start_timestamp.strftime("%Y%m%d"))
-    first_end_date_id = int(first_end_timestamp.strftime("%Y%m%d"))
-    second_start_date_id = int(second_start_timestamp.strftime("%Y%m%d"))
-    second_end_date_id = int(second_end_timestamp.strftime("%Y%m%d"))
+        get_spatial_resolution_and_bounds(dw, spatial_resolution, x_min, y_min, x_max, y_max, enc_cell,
+                                          single_display_size(output_format))
 
     params = {
         'width': width,
@@ -336,47 +473,279 @@ def mapalgebra_heatmap(
         'max_cell_y': int(y_max / 5000),
         'spatial_resolution': int(spatial_resolution),
         'heatmap_type_slug': heatmap_type,
-        'map_algebra_expr': map_algebra_expr,
-        'map_algebra_no_data_1_expr': map_algebra_no_data_1_expr,
-        'map_algebra_no_data_2_expr': map_algebra_no_data_2_expr,
-        'first_mobile_types': first_mobile_types,
-        'first_ship_types': first_ship_types,
-        'first_start_date_id': first_start_date_id,
-        'first_end_date_id': first_end_date_id,
-        'first_start_timestamp': first_start_timestamp,
-        'first_end_timestamp': first_end_timestamp,
-        'second_mobile_types': second_mobile_types,
-        'second_ship_types': second_ship_types,
-        'second_start_date_id': second_start_date_id,
-        'second_end_date_id': second_end_date_id,
-        'second_start_timestamp': second_start_timestamp,
-        'second_end_timestamp': second_end_timestamp,
+        'clip_geometry': get_clip_geometry(dw, enc_cell, clip_to_enc_cell),
+    }
+    first_params = operand_params(params, first_mobile_types, first_ship_types, first_start_timestamp,
+                                  first_end_timestamp)
+    second_params = operand_params(params, second_mobile_types, second_ship_types, second_start_timestamp,
+                                   second_end_timestamp)
+
+    cost = estimate_heatmap_cost(width, height, spatial_resolution, first_start_timestamp, first_end_timestamp) + \
+        estimate_heatmap_cost(width, height, spatial_resolution, second_start_timestamp, second_end_timestamp)
+
+    return admitted_single_flight(
+        client_id, cost,
+        request_key("mapalgebra_heatmap", {
+            **params,
+            **{f"first_{key}": value for key, value in first_params.items()},
+            **{f"second_{key}": value for key, value in second_params.items()},
+            'map_algebra_expr': map_algebra_expr,
+            'map_algebra_no_data_1_expr': map_algebra_no_data_1_expr,
+            'map_algebra_no_data_2_expr': map_algebra_no_data_2_expr,
+            'output_format': output_format
+        }),
+        lambda: algebra_response(
+            query, [first_params, second_params],
+            lambda rasters: map_algebra_rasters(*rasters, expression, no_data_1_expression, no_data_2_expression),
+            output_format, f"{heatmap_type.value} - custom map algebra"
+        )
+    )
+
+
+def operand_params(params: dict, mobile_types: list[MobileType], ship_types: list[ShipType],
+                   start_timestamp: datetime.datetime, end_timestamp: datetime.datetime) -> dict:
+    """Create the parameters of the single heatmap query of an operand of map algebra."""
+    return {
+        **params,
+        'mobile_types': mobile_types,
+        'ship_types': ship_types,
+        **temporal_bound_ids(start_timestamp, end_timestamp),
+        'start_timestamp': start_timestamp,
+        'end_timestamp': end_timestamp,
     }
 
-    result, query_time_taken_sec = measure_time(lambda: dw.execute(text(query), params).fetchone())
 
-    if result is None or result[0] is None:
+def algebra_response(query: str, operands: list[dict], combine: Callable[[list[bytes | None]], bytes],
+                     output_format: SingleOutputFormat, title: str) -> PlainTextResponse:
+    """
+    Fetch the rasters of the operands of raster algebra concurrently, combine them, and return the result.
+
+    Keyword arguments:
+        query: the query returning the raster of a single heatmap as a GeoTIFF
+        operands: the parameters of the query of each raster
+        combine: combines the rasters, where rasters without any data are None, into a single GeoTIFF
+        output_format: the output format of the response
+        title: title of the heatmap, shown if rendered as an image
+    """
+    rasters, query_time_taken_sec = measure_time(lambda: fetch_single_rasters(query, operands))
+
+    if all(raster is None for raster in rasters):
         raise HTTPException(404, "No heatmap data found given the parameters.")
 
-    if output_format == SingleOutputFormat.png:
-        png, image_time_taken_sec = try_get_png_from_geotiff(
-            result[0].tobytes(),
-            can_be_negative=True,
-            title=f"{heatmap_type.value} - custom map algebra"
+    raster, algebra_time_taken_sec = measure_time(lambda: combine(rasters))
+
+    return raster_response(raster, output_format, title, operands[0]['spatial_resolution'], can_be_negative=True,
+                           headers={
+                               'Query-Time': str(query_time_taken_sec),
+                               'Algebra-Time': str(algebra_time_taken_sec)
+                           })
+
+
+@router.post("/algebra/{spatial_resolution}", response_class=PlainTextResponse)
+def raster_algebra_heatmap(
+        algebra: RasterAlgebra,
+        # Path parameters
+        spatial_resolution: SpatialResolution = Path(description='The spatial resolution of the heatmap.',
+                                                     example=SpatialResolution.five_kilometers),
+        # Query parameters
+        output_format: SingleOutputFormat = Query(default=SingleOutputFormat.tiff,
+                                                  description='Output format of the heatmap. PNGs are rendered '
+                                                              'at a coarser spatial resolution if the bounds do not '
+                                                              'fit in 2000x2000 pixels at the requested resolution.'),
+        x_min: int = Query(default=3600000,
+                           description='Defines the "left side" of the bounding rectangle, '
+                                       'coordinates must match the provided "srid" parameter.'),
+        y_min: int = Query(default=3030000,
+                           description='Defines the "bottom side" of the bounding rectangle, '
+                                       'coordinates must match the provided "srid" parameter.'),
+        x_max: int = Query(default=4395000,
+                           description='Defines the "right side" of the bounding rectangle, '
+                                       'coordinates must match the provided "srid" parameter.'),
+        y_max: int = Query(default=3485000,
+                           description='Defines the "top side" of the bounding rectangle, '
+                                       'coordinates must match the provided "srid" parameter.'),
+        srid: int = Query(default=3034,
+                          description='The spatial reference system for the heatmap. '
+                                      'Currently only EPSG:3034 is supported.'),
+        enc_cell: EncCell = Query(default=None,
+                                  description='Limits the heatmaps spatial extent to the provided ENC cell. '
+                                              'If provided, this parameter overrides any other spatial constraints.'),
+        clip_to_enc_cell: bool = Query(default=False,
+                                       description='Whether to clip the heatmap to the geometry of the provided ENC '
+                                                   'cell, instead of its bounding rectangle.'),
+        dw=Depends(get_dw),
+        client_id: str = Depends(get_client_id)
+):
+    """
+    Return a heatmap combining any number of heatmaps pixel by pixel, based on the parameters provided.
+
+    The operands are queried concurrently as single heatmaps, which are cached independently of the expression,
+    and the expression is evaluated once over all of them.
+    """
+    if srid != 3034:
+        raise HTTPException(501, "Only SRID 3034 is supported.")
+
+    expression = compile_map_algebra(algebra.expression, len(algebra.operands))
+
+    with open(os.path.join(current_file_path, "sql/single_heatmap.sql"), "r") as f:
+        query = f.read()
+
+    spatial_resolution, x_min, y_min, x_max, y_max, width, height = \
+        get_spatial_resolution_and_bounds(dw, spatial_resolution, x_min, y_min, x_max, y_max, enc_cell,
+                                          single_display_size(output_format))
+
+    params = {
+        'width': width,
+        'height': height,
+        'min_x': x_min,
+        'min_y': y_min,
+        'max_x': x_max,
+        'max_y': y_max,
+        'min_cell_x': int(x_min / 5000),
+        'min_cell_y': int(y_min / 5000),
+        'max_cell_x': int(x_max / 5000),
+        'max_cell_y': int(y_max / 5000),
+        'spatial_resolution': int(spatial_resolution),
+        'clip_geometry': get_clip_geometry(dw, enc_cell, clip_to_enc_cell),
+    }
+    operands = [
+        operand_params({**params, 'heatmap_type_slug': operand.heatmap_type}, operand.mobile_types,
+                       operand.ship_types, operand.start_timestamp, operand.end_timestamp)
+        for operand in algebra.operands
+    ]
+
+    cost = sum(estimate_heatmap_cost(width, height, spatial_resolution, operand.start_timestamp,
+                                     operand.end_timestamp) for operand in algebra.operands)
+
+    return admitted_single_flight(
+        client_id, cost,
+        request_key("raster_algebra_heatmap", {
+            # The operands are flattened, as the order of lists is not significant to request keys
+            **{f"operand_{index}_{key}": value
+               for index, operand in enumerate(operands) for key, value in operand.items()},
+            'expression': algebra.expression,
+            'no_data_value': algebra.no_data_value,
+            'output_format': output_format
+        }),
+        lambda: algebra_response(
+            query, operands, lambda rasters: raster_algebra_rasters(rasters, expression, algebra.no_data_value),
+            output_format, "custom raster algebra"
         )
-        return PlainTextResponse(png, media_type="image/png",
-                                 headers={
-                                     'Query-Time': str(query_time_taken_sec),
-                                     'Image-Time': str(image_time_taken_sec)
-                                 })
+    )
+
+
+@router.get("/stats/{heatmap_type}/{spatial_resolution}", response_model=list[ZoneStatistics])
+def heatmap_statistics(
+        # Path parameters
+        heatmap_type: HeatmapType = Path(description='The type of the heatmap.',
+                                         example=HeatmapType.count),
+        spatial_resolution: SpatialResolution = Path(description='The spatial resolution of the heatmap.',
+                                                     example=SpatialResolution.five_kilometers),
+        # Query parameters
+        enc_cells: list[EncCell] = Query(default=[],
+                                         description='The ENC cells to compute the statistics inside.'),
+        bboxes: list[str] = Query(default=[],
+                                  description='Bounding rectangles to compute the statistics inside, each given as '
+                                              '"x_min,y_min,x_max,y_max" in EPSG:3034.'),
+        percentiles: list[float] = Query(default=[50, 90, 99],
+                                         description='The percentiles of the pixel values to compute, between 0 and '
+                                                     '100.'),
+        temporal_resolution: TemporalResolution = Query(default=None,
+                                                        description='If provided, the statistics are computed for '
+                                                                    'every period of this temporal resolution, '
+                                                                    'instead of the whole temporal bound.'),
+        mobile_types: list[MobileType] = Query(default=[MobileType.class_a, MobileType.class_b],
+                                               description='Limits what mobile type the ships must belong to.'),
+        ship_types: list[ShipType] = Query(default=[ship_type for ship_type in ShipType],
+                                           description='Limits what ship type the ships must belong to.'),
+        start_timestamp: datetime.datetime = Query(default="2022-01-01T00:00:00Z",
+                                                   description='The inclusive timestamp that defines '
+                                                               'the start of the temporal bound.'),
+        end_timestamp: datetime.datetime = Query(default="2022-02-01T00:00:00Z",
+                                                 description='The exclusive timestamp that defines '
+                                                             'the end of the temporal bound.'),
+        dw=Depends(get_dw),
+        client_id: str = Depends(get_client_id)
+):
+    """
+    Return the statistics of the pixel values of a heatmap inside each of the provided zones.
 
-    return PlainTextResponse(result[0].tobytes(), media_type="image/tiff",
-                             headers={'Query-Time': str(query_time_taken_sec)}
-                             )
+    The zones are ENC cells and bounding rectangles, and a pixel is inside a zone if its center is inside it.
+    """
+    zones = [reference_geometry_zone(get_reference_geometry(dw, enc_cell)) for enc_cell in enc_cells] + \
+        [bbox_zone(bbox) for bbox in bboxes]
+    if len(zones) == 0:
+        raise HTTPException(400, "At least one ENC cell or bounding box must be provided.")
+    if any(not 0 <= percentile <= 100 for percentile in percentiles):
+        raise HTTPException(400, "Percentiles must be between 0 and 100.")
 
+    spatial_resolution, x_min, y_min, x_max, y_max, width, height = \
+        get_spatial_resolution_and_bounds(dw, spatial_resolution, *zones_bounds(zones), None)
 
-@router.get("/multi/{heatmap_type}/{spatial_resolution}/{temporal_resolution}", response_class=PlainTextResponse)
-def multi_heatmap(
+    params = {
+        'width': width,
+        'height': height,
+        'min_x': x_min,
+        'min_y': y_min,
+        'max_x': x_max,
+        'max_y': y_max,
+        'min_cell_x': int(x_min / 5000),
+        'min_cell_y': int(y_min / 5000),
+        'max_cell_x': int(x_max / 5000),
+        'max_cell_y': int(y_max / 5000),
+        'spatial_resolution': int(spatial_resolution),
+        'heatmap_type_slug': heatmap_type,
+        'clip_geometry': None,
+        'mobile_types': mobile_types,
+        'ship_types': ship_types,
+        **temporal_bound_ids(start_timestamp, end_timestamp),
+        'start_timestamp': start_timestamp,
+        'end_timestamp': end_timestamp,
+    }
+
+    cost = estimate_heatmap_cost(width, height, spatial_resolution, start_timestamp, end_timestamp)
+
+    return admitted_single_flight(
+        client_id, cost,
+        request_key("heatmap_statistics", {
+            **params,
+            # The order of the zones and percentiles is significant, as it is the order of the statistics
+            'zones': json.dumps([zone.name for zone in zones]),
+            'percentiles': ",".join(f"{percentile:g}" for percentile in percentiles),
+            'temporal_resolution': temporal_resolution
+        }),
+        lambda: raster_zonal_statistics(
+            fetch_statistics_rasters(dw, params, temporal_resolution), zones, percentiles
+        )
+    )
+
+
+def fetch_statistics_rasters(dw: Session, params: dict, temporal_resolution: TemporalResolution | None) \
+        -> list[tuple[str | None, bytes]]:
+    """
+    Fetch the rasters to compute zonal statistics of, reusing the cached rasters of single and multi heatmaps.
+
+    Keyword arguments:
+        dw: database connection
+        params: the parameters of the single or multi heatmap query
+        temporal_resolution: the temporal resolution of the periods of the rasters, or None for a single raster
+
+    Returns: tuples of the period of each raster, or None for a single raster, and the raster as a GeoTIFF.
+    """
+    if temporal_resolution is None:
+        with open(os.path.join(current_file_path, "sql/single_heatmap.sql"), "r") as f:
+            rasters = [(None, fetch_single_raster(dw, f.read(), params))]
+    else:
+        with open(os.path.join(current_file_path, f"sql/multi_heatmaps/{temporal_resolution.value}.sql"), "r") as f:
+            rasters = [(frame.title, frame.raster) for frame in fetch_frames(dw, f.read(), params, temporal_resolution)]
+
+    rasters = [(period, raster) for period, raster in rasters if raster is not None]
+    if len(rasters) == 0:
+        raise HTTPException(404, "No heatmap data found given the parameters.")
+    return rasters
+
+
+def multi_heatmap_request(
         heatmap_type: HeatmapType = Path(description='The type of the heatmap.',
                                          example=HeatmapType.count),
         spatial_resolution: SpatialResolution = Path(description='The spatial resolution of the heatmap.',
@@ -384,9 +753,27 @@ def multi_heatmap(
         temporal_resolution: TemporalResolution = Path(description='The temporal resolution of the heatmap.',
                                                        example=TemporalResolution.daily),
         output_format: MultiOutputFormat = Query(default=MultiOutputFormat.mp4,
-                                                 description='The output format of result.'),
+                                                 description='The output format of result. The "npz" and "tiff" '
+                                                             'formats return the values of the frames as a NumPy '
+                                                             'archive or a multi-band GeoTIFF, instead of a video.'),
         fps: int = Query(default=10,
                          description='The frames per second of the result.'),
+        max_value: float = Query(default=None, gt=0,
+                                 description='Fixes the maximum of the colour scale of all frames. If provided, '
+                                             'frames are rendered while later frames are still being queried, '
+                                             'otherwise the maximum of all frames is used.'),
+        preset: EncoderPreset = Query(default=EncoderPreset.veryfast,
+                                      description='The encoder preset, trading encoding speed for compression. '
+                                                  'Not used for GIFs.'),
+        crf: int = Query(default=None, ge=0, le=63,
+                         description='The constant rate factor of the encoder, where lower values give higher '
+                                     'quality and larger files. Defaults to 23 for MP4, 33 for WebM and 20 for WebP. '
+                                     'Not used for GIFs.'),
+        max_dimension: int = Query(default=None, ge=16, le=4096,
+                                   description='Downscales the frames such that neither their width nor their height '
+                                               'exceeds this number of pixels. Rendered frames use a coarser spatial '
+                                               'resolution if the bounds do not fit in this number of pixels, or in '
+                                               '2000 pixels, at the requested resolution.'),
         x_min: int = Query(default=3600000,
                            description='Defines the "left side" of the bounding rectangle, '
                                        'coordinates must match the provided "srid" parameter.'),
@@ -405,6 +792,9 @@ def multi_heatmap(
         enc_cell: EncCell = Query(default=None,
                                   description='Limits the heatmaps spatial extent to the provided ENC cell. '
                                               'If provided, this parameter overrides any other spatial constraints.'),
+        clip_to_enc_cell: bool = Query(default=False,
+                                       description='Whether to clip the heatmap to the geometry of the provided ENC '
+                                                   'cell, instead of its bounding rectangle.'),
         mobile_types: list[MobileType] = Query(default=[MobileType.class_a, MobileType.class_b],
                                                description='Limits what mobile type the ships must belong to.'),
         ship_types: list[ShipType] = Query(default=[ShipType.cargo, ShipType.passenger],
@@ -416,8 +806,8 @@ def multi_heatmap(
                                                  description='The exclusive timestamp that defines '
                                                              'the end of the temporal bound.'),
         dw=Depends(get_dw)
-):
-    """Return a multi heatmap, based on the parameters provided."""
+) -> MultiHeatmapRequest:
+    """Parse the parameters of a multi heatmap request, shared by the synchronous and asynchronous endpoints."""
     if srid != 3034:
         raise HTTPException(501, "Only SRID 3034 is supported.")
 
@@ -425,10 +815,8 @@ def multi_heatmap(
         query = f.read()
 
     spatial_resolution, x_min, y_min, x_max, y_max, width, height = \
-        get_spatial_resolution_and_bounds(dw, spatial_resolution, x_min, y_min, x_max, y_max, enc_cell)
-
-    start_date_id = int(start_timestamp.strftime("%Y%m%d"))
-    end_date_id = int(end_timestamp.strftime("%Y%m%d"))
+        get_spatial_resolution_and_bounds(dw, spatial_resolution, x_min, y_min, x_max, y_max, enc_cell,
+                                          multi_display_size(output_format, max_dimension))
 
     params = {
         'width': width,
@@ -443,33 +831,185 @@ def multi_heatmap(
         'max_cell_y': int(y_max / 5000),
         'spatial_resolution': int(spatial_resolution),
         'heatmap_type_slug': heatmap_type,
+        'clip_geometry': get_clip_geometry(dw, enc_cell, clip_to_enc_cell),
         'mobile_types': mobile_types,
         'ship_types': ship_types,
-        'start_date_id': start_date_id,
-        'end_date_id': end_date_id,
+        **temporal_bound_ids(start_timestamp, end_timestamp),
         'start_timestamp': start_timestamp,
         'end_timestamp': end_timestamp,
     }
 
-    result, query_time_taken_sec = measure_time(lambda: dw.execute(text(query), params).fetchall())
-
-    if result is None or len(result) == 0:
-        raise HTTPException(404, "No heatmap data found given the parameters.")
+    return MultiHeatmapRequest(
+        query=query,
+        params=params,
+        heatmap_type=heatmap_type,
+        temporal_resolution=temporal_resolution,
+        output_format=output_format,
+        fps=fps,
+        max_value=max_value,
+        encoder=EncoderSettings(preset=preset, crf=crf, max_dimension=max_dimension),
+        cost=estimate_heatmap_cost(width, height, spatial_resolution, start_timestamp, end_timestamp,
+                                   temporal_resolution)
+    )
 
-    max_value = max([r[2] for r in result])
 
-    result = [(r[0], r[1].tobytes()) for r in result]
+@router.get("/multi/{heatmap_type}/{spatial_resolution}/{temporal_resolution}", response_class=PlainTextResponse)
+def multi_heatmap(
+        heatmap_request: MultiHeatmapRequest = Depends(multi_heatmap_request),
+        dw=Depends(get_dw),
+        client_id: str = Depends(get_client_id)
+):
+    """
+    Return a multi heatmap, based on the parameters provided.
 
-    video, image_time_taken_sec = measure_time(
-        lambda: geo_tiffs_to_video(result, fps, output_format.value, heatmap_type.value, max_value)
+    Long temporal bounds may take longer to render than connections are kept open,
+    in which case the heatmap should be created as a job with a POST request instead.
+    """
+    return admitted_single_flight(
+        client_id, heatmap_request.cost,
+        heatmap_request.key,
+        lambda: multi_heatmap_response(dw, heatmap_request)
     )
 
-    media_type = f"video/{output_format.value}"
-    if output_format == MultiOutputFormat.gif:
-        media_type = f"image/{output_format.value}"
 
-    return PlainTextResponse(video.read(), media_type=media_type,
+@router.post("/multi/{heatmap_type}/{spatial_resolution}/{temporal_resolution}", response_model=Job,
+             status_code=202)
+def create_multi_heatmap_job(
+        request: Request,
+        response: Response,
+        heatmap_request: MultiHeatmapRequest = Depends(multi_heatmap_request),
+        dw=Depends(get_dw),
+        client_id: str = Depends(get_client_id)
+):
+    """
+    Create a job rendering a multi heatmap in the background, based on the parameters provided.
+
+    The progress of the job is available at the returned location, and the heatmap can be downloaded once it succeeded.
+    Identical jobs which are queued, running or succeeded since the latest ETL import are reused.
+    """
+    check_cost(heatmap_request.cost)
+    key = request_key(MULTI_HEATMAP_JOB, {'request': heatmap_request.key, 'import_id': get_latest_import_id(dw)})
+    job_id = create_job(MULTI_HEATMAP_JOB, key, heatmap_request, client_id)
+    response.headers["Location"] = str(request.url_for("job", job_id=job_id))
+    return job_with_result_url(request, job_id)
+
+
+def multi_heatmap_response(dw: Session, heatmap_request: MultiHeatmapRequest) -> PlainTextResponse:
+    """
+    Query the rasters of a multi heatmap, and return them rendered as a video in the requested output format.
+
+    Keyword arguments:
+        dw: database connection
+        heatmap_request: the parsed parameters of the multi heatmap
+    """
+    video, query_time_taken_sec, image_time_taken_sec = render_multi_heatmap(dw, heatmap_request)
+
+    return PlainTextResponse(video, media_type=multi_media_type(heatmap_request.output_format),
                              headers={
                                  'Query-Time': str(query_time_taken_sec),
                                  'Image-Time': str(image_time_taken_sec)
                              })
+
+
+def run_multi_heatmap_job(dw: Session, heatmap_request: MultiHeatmapRequest, progress: JobProgress) \
+        -> tuple[bytes, str]:
+    """
+    Render a multi heatmap as a job, recording the number of frames fetched and rendered.
+
+    Heavy jobs wait for a heavy slot like heavy requests, but without timeout, as no client is waiting for them.
+    """
+    params = heatmap_request.params
+    progress.total(len(get_periods(params['start_timestamp'], params['end_timestamp'],
+                                   heatmap_request.temporal_resolution)))
+    with admission_controller.heavy_slot(heatmap_request.cost, background=True):
+        video, _, _ = render_multi_heatmap(dw, heatmap_request, on_fetched=progress.fetched,
+                                           on_rendered=progress.rendered)
+    return video, multi_media_type(heatmap_request.output_format)
+
+
+def render_multi_heatmap(dw: Session, heatmap_request: MultiHeatmapRequest,
+                         on_fetched: Callable[[int], None] = None, on_rendered: Callable[[int], None] = None) \
+        -> tuple[bytes, float, float]:
+    """
+    Fetch the frames of a multi heatmap and render them as a video, reusing cached frames of the same periods.
+
+    Output formats which are frame stacks are not rendered, see stack_multi_heatmap.
+
+    If the maximum of the colour scale is fixed by the request, frames are rendered as soon as they are fetched,
+    while later frames are still being queried. The query time then includes the overlapping render time.
+
+    Keyword arguments:
+        dw: database connection
+        heatmap_request: the parsed parameters of the multi heatmap
+        on_fetched: called with the number of periods fetched so far, each time a period is fetched
+        on_rendered: called with the number of frames rendered so far, each time a frame is rendered
+
+    Returns: the video, and the time taken to query and render it in seconds.
+    """
+    if heatmap_request.output_format in frame_stack_writers:
+        return stack_multi_heatmap(dw, heatmap_request, on_fetched)
+
+    frames = (frame for frame in iter_frames(dw, heatmap_request.query, heatmap_request.params,
+                                             heatmap_request.temporal_resolution, on_fetched)
+              if frame is not None)
+    title_prefix = heatmap_request.heatmap_type.value
+
+    if heatmap_request.max_value is None:
+        frames, query_time_taken_sec = measure_time(lambda: list(frames))
+        max_value = max([frame.max for frame in frames], default=None)
+        pngs, render_time_taken_sec = measure_time(lambda: render_frames(frames, title_prefix, max_value, on_rendered))
+    else:
+        pngs, query_time_taken_sec = measure_time(
+            lambda: render_frames(frames, title_prefix, heatmap_request.max_value, on_rendered)
+        )
+        render_time_taken_sec = 0
+
+    if len(pngs) == 0:
+        raise HTTPException(404, "No heatmap data found given the parameters.")
+
+    video, image_time_taken_sec = measure_time(
+        lambda: encode_video(pngs, heatmap_request.fps, heatmap_request.output_format, heatmap_request.encoder)
+    )
+
+    return video.read(), query_time_taken_sec, render_time_taken_sec + image_time_taken_sec
+
+
+def stack_multi_heatmap(dw: Session, heatmap_request: MultiHeatmapRequest,
+                        on_fetched: Callable[[int], None] = None) -> tuple[bytes, float, float]:
+    """
+    Fetch the frames of a multi heatmap and stack their values into a single array, without rendering them.
+
+    Keyword arguments:
+        dw: database connection
+        heatmap_request: the parsed parameters of the multi heatmap, with a frame stack output format
+        on_fetched: called with the number of periods fetched so far, each time a period is fetched
+
+    Returns: the frame stack, and the time taken to query and stack it in seconds.
+    """
+    frames, query_time_taken_sec = measure_time(
+        lambda: fetch_frames(dw, heatmap_request.query, heatmap_request.params, heatmap_request.temporal_resolution,
+                             on_fetched)
+    )
+
+    if len(frames) == 0:
+        raise HTTPException(404, "No heatmap data found given the parameters.")
+
+    stack, stack_time_taken_sec = measure_time(lambda: frame_stack_writers[heatmap_request.output_format](frames))
+    return stack, query_time_taken_sec, stack_time_taken_sec
+
+
+def multi_display_size(output_format: MultiOutputFormat, max_dimension: int | None) -> tuple[int, int] | None:
+    """Get the maximum width and height the frames of a multi heatmap are displayed at, or None if not rendered."""
+    if output_format in frame_stack_writers:
+        return None
+    if max_dimension is None:
+        return max_width, max_height
+    return min(max_width, max_dimension), min(max_height, max_dimension)
+
+
+def multi_media_type(output_format: MultiOutputFormat) -> str:
+    """Get the media type of a multi heatmap in the given output format."""
+    return multi_media_types[output_format]
+
+
+register_job_handler(MULTI_HEATMAP_JOB, run_multi_heatmap_job)
@@ -0,0 +1,140 @@
+"""
+Catalogue of the heatmaps available in the data warehouse.
+
+Finding the temporal domain of every heatmap requires grouping the entire fact_cell_heatmap table, so this is only
+done once. Afterwards, the catalogue is kept up to date incrementally, by only grouping the heatmaps on the dates
+imported by the ETL since the catalogue was last refreshed.
+"""
+import datetime
+import hashlib
+import json
+import os
+import threading
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+
+from app.etl_imports import get_latest_import_id, get_imported_date_ids
+from app.querybuilder import QueryBuilder
+
+SQL_PATH = os.path.join(os.path.dirname(__file__), "sql")
+
+temporal_resolution_names = {
+    86400: "daily",
+    3600: "hourly",
+}
+
+
+class HeatmapCatalogue:
+    """In-memory catalogue of the available heatmaps, and the temporal domain of each of their resolutions."""
+
+    def __init__(self):
+        """Initialise an empty catalogue, which is filled on the first refresh."""
+        self.import_id = None
+        self.entries: dict[tuple[str, int, int], dict] = {}
+        # The heatmap metadata and its ETag, replaced together such that they always match.
+        self.snapshot: tuple[dict, str] = ({}, '""')
+        self._lock = threading.Lock()
+
+    def refresh(self, dw: Session) -> None:
+        """
+        Bring the catalogue up to date with the latest ETL import.
+
+        Args:
+            dw: The data warehouse session.
+        """
+        latest_import_id = get_latest_import_id(dw)
+        if latest_import_id == self.import_id:
+            return
+
+        with self._lock:
+            if latest_import_id == self.import_id:
+                return
+
+            for row in self._query_new_heatmaps(dw, latest_import_id):
+                self._add(row)
+
+            self._publish()
+            self.import_id = latest_import_id
+
+    def _query_new_heatmaps(self, dw: Session, latest_import_id: int) -> list[dict]:
+        """Query the available heatmaps on all dates on the first refresh, otherwise only on the imported dates."""
+        if self.import_id is None:
+            return self._query(dw, "available_heatmaps.sql", {})
+
+        date_ids = get_imported_date_ids(dw, self.import_id, latest_import_id)
+        if not date_ids:
+            return []
+        return self._query(dw, "available_heatmaps_on_dates.sql", {"date_ids": date_ids})
+
+    @staticmethod
+    def _query(dw: Session, sql_file: str, params: dict) -> list[dict]:
+        """Execute a query for available heatmaps and return the rows as dicts."""
+        query = QueryBuilder(SQL_PATH).add_sql(sql_file).get_query_text()
+        return [dict(row) for row in dw.execute(query, params).mappings()]
+
+    def _add(self, row: dict) -> None:
+        """Add a heatmap to the catalogue, or extend the temporal domain of an existing one."""
+        key = (row['slug'], row['spatial_resolution'], row['temporal_resolution_sec'])
+        entry = self.entries.get(key)
+        if entry is not None:
+            row['min_date_id'] = min(row['min_date_id'], entry['min_date_id'])
+            row['max_date_id'] = max(row['max_date_id'], entry['max_date_id'])
+        self.entries[key] = row
+
+    def _publish(self) -> None:
+        """Build the heatmap metadata from the catalogue entries, and replace the current snapshot with it."""
+        heatmap_types = {}
+
+        for (slug, spatial_resolution, temporal_resolution_sec), entry in sorted(self.entries.items()):
+            heatmap_type = heatmap_types.setdefault(slug, {
+                "name": entry['name'],
+                "description": entry['description'],
+                "spatial_resolutions": {},
+            })
+            cell_size = heatmap_type["spatial_resolutions"].setdefault(f"{spatial_resolution}m", {
+                "resolution": spatial_resolution,
+                "units": "meters",
+                "temporal_resolutions": {},
+            })
+            temporal_resolution_name = temporal_resolution_names.get(temporal_resolution_sec,
+                                                                     f"{temporal_resolution_sec}s")
+            cell_size["temporal_resolutions"][temporal_resolution_name] = {
+                "resolution": temporal_resolution_sec,
+                "units": "seconds",
+                "temporal_domain": {
+                    "start": date_id_to_datetime(entry['min_date_id']),
+                    "end": date_id_to_datetime(entry['max_date_id']) + datetime.timedelta(days=1)
+                }
+            }
+
+        heatmap_types = jsonable_encoder(heatmap_types)
+        etag = hashlib.sha256(json.dumps(heatmap_types, sort_keys=True).encode()).hexdigest()[:32]
+        self.snapshot = (heatmap_types, f'"{etag}"')
+
+
+def date_id_to_datetime(date_id: int) -> datetime.datetime:
+    """Convert a date id in the format YYYYMMDD to a datetime at the start of the day in UTC."""
+    return datetime.datetime.strptime(str(date_id), "%Y%m%d").replace(tzinfo=datetime.timezone.utc)
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Check whether an If-None-Match header matches the given ETag.
+
+    Args:
+        if_none_match: The value of the If-None-Match header, if provided.
+        etag: The current ETag of the resource.
+    """
+    if if_none_match is None:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+catalogue = HeatmapCatalogue()
+
+
+def load_heatmap_catalogue(dw: Session) -> None:
+    """Fill the heatmap catalogue, used to warm it up when the API starts."""
+    catalogue.refresh(dw)
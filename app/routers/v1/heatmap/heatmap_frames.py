@@ -0,0 +1,265 @@
+"""
+Frames of multi heatmaps, cached per period such that overlapping requests only query the periods they do not share.
+
+The raster of a frame is cached under its period, clipped to the temporal bound of the request, together with all
+other parameters determining the raster, and the latest ETL import of the dates in the period, such that frames are
+recomputed once new data is imported for them. The rendered frame is cached under the raster and its colour scale.
+"""
+import bisect
+import datetime
+import math
+from functools import partial
+from typing import Any, Callable, Iterable, Iterator, NamedTuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.datawarehouse import BackgroundQueries, PARALLEL_QUERIES, SessionLocal
+from app.disk_cache import DiskCache
+from app.etl_imports import get_import_ids_by_date
+from app.routers.v1.heatmap.heatmap_renders import geo_tiffs_to_pngs
+from app.routers.v1.heatmap.periods import get_periods, period_start
+from app.schemas.temporal_resolution import TemporalResolution
+from app.single_flight import request_key
+from helper_functions import as_bytes, temporal_bound_ids
+
+# The maximum number of consecutive periods queried by a single query.
+PERIODS_PER_QUERY = 7
+# The size the cached rasters and rendered frames may each take up on disk.
+CACHE_SIZE_BYTES = 2 * 1024 ** 3
+
+# The parameters of a multi heatmap query defining its temporal bound, which are replaced by the period of a frame.
+temporal_params = ['start_timestamp', 'end_timestamp', 'start_date_id', 'start_time_id', 'end_date_id', 'end_time_id']
+
+raster_cache = DiskCache("heatmap_frames", CACHE_SIZE_BYTES)
+render_cache = DiskCache("heatmap_frame_renders", CACHE_SIZE_BYTES)
+
+
+class Frame(NamedTuple):
+    """The raster of a single period of a multi heatmap."""
+
+    key: str
+    title: str
+    raster: bytes
+    max: float
+
+
+def fetch_frames(dw: Session, query: str, params: dict, temporal_resolution: TemporalResolution,
+                 on_fetched: Callable[[int], None] = None) -> list[Frame]:
+    """
+    Fetch the frames of a multi heatmap, only querying the periods which are not cached.
+
+    Keyword arguments:
+        dw: database connection
+        query: the multi heatmap query of the temporal resolution
+        params: the parameters of the query
+        temporal_resolution: the temporal resolution of the frames
+        on_fetched: called with the number of periods fetched so far, including cached periods
+
+    Returns: the frames of the periods with data, in chronological order.
+    """
+    return [frame for frame in iter_frames(dw, query, params, temporal_resolution, on_fetched) if frame is not None]
+
+
+def iter_frames(dw: Session, query: str, params: dict, temporal_resolution: TemporalResolution,
+                on_fetched: Callable[[int], None] = None) -> Iterator[Frame | None]:
+    """
+    Fetch the frames of a multi heatmap, yielding them in chronological order as soon as they are available.
+
+    Periods missing from the cache are split into chunks of consecutive periods, which are queried concurrently over
+    separate connections, with the temporal bound narrowed to the chunk. The frames of the first chunks can thereby
+    be rendered while later chunks are still being queried. Only a few chunks are queried ahead of the frames
+    consumed, such that the chunks of a long multi heatmap do not hold up the queries of other requests.
+
+    Keyword arguments:
+        dw: database connection, used to look up the ETL imports of the periods
+        query: the multi heatmap query of the temporal resolution
+        params: the parameters of the query
+        temporal_resolution: the temporal resolution of the frames
+        on_fetched: called with the number of periods fetched so far, including cached periods
+
+    Returns: an iterator of the frame of each period, or None for periods without data.
+    """
+    periods = get_periods(params['start_timestamp'], params['end_timestamp'], temporal_resolution)
+    import_ids = get_import_ids_by_date(dw, params['start_date_id'], params['end_date_id'])
+    keys = [frame_key(params, temporal_resolution, period, import_ids) for period in periods]
+
+    frames = get_cached(raster_cache, keys)
+    chunks = [chunk for first, last in missing_runs([index for index in range(len(periods)) if index not in frames])
+              for chunk in split_run(first, last)]
+
+    chunk_starts = {first for first, _ in chunks}
+    chunk_frames = BackgroundQueries(
+        partial(query_frames_in_session, query, params, temporal_resolution, periods, keys, first, last)
+        for first, last in chunks
+    )
+    try:
+        for index in range(len(periods)):
+            if index in chunk_starts:
+                frames.update(next(chunk_frames))
+            _report(on_fetched, index + 1)
+            yield frames[index]
+    finally:
+        # Chunks which have not started are not queried if the frames are no longer needed
+        chunk_frames.close()
+
+
+def split_run(first: int, last: int) -> list[tuple[int, int]]:
+    """
+    Split a run of consecutive periods into chunks, queried concurrently.
+
+    Short runs are spread across all parallel queries, long runs are split into chunks of PERIODS_PER_QUERY periods.
+    """
+    length = last - first + 1
+    size = min(PERIODS_PER_QUERY, math.ceil(length / PARALLEL_QUERIES))
+    return [(start, min(start + size - 1, last)) for start in range(first, last + 1, size)]
+
+
+def query_frames_in_session(*args) -> dict[int, Frame | None]:
+    """Query the frames of consecutive periods using a new session, see query_frames for the arguments."""
+    with SessionLocal() as session:
+        return query_frames(session, *args)
+
+
+def frame_key(params: dict, temporal_resolution: TemporalResolution,
+              period: tuple[datetime.datetime, datetime.datetime], import_ids: dict[int, int]) -> str:
+    """
+    Create the key of the frame of a period.
+
+    Keyword arguments:
+        params: the parameters of the multi heatmap query
+        temporal_resolution: the temporal resolution of the frames
+        period: the inclusive start and exclusive end of the period, clipped to the temporal bound of the request
+        import_ids: the id of the latest ETL import of each date id
+    """
+    first_date_id, last_date_id = date_id(period[0]), date_id(period[1] - datetime.timedelta(microseconds=1))
+    return request_key("heatmap_frame", {
+        **{key: value for key, value in params.items() if key not in temporal_params},
+        'temporal_resolution': temporal_resolution,
+        'period': period,
+        'import_id': max([import_id for day, import_id in import_ids.items() if first_date_id <= day <= last_date_id],
+                         default=0),
+    })
+
+
+def query_frames(dw: Session, query: str, params: dict, temporal_resolution: TemporalResolution,
+                 periods: list[tuple[datetime.datetime, datetime.datetime]], keys: list[str], first: int, last: int) \
+        -> dict[int, Frame | None]:
+    """
+    Query the frames of consecutive periods and cache them, including the absence of data in periods without frames.
+
+    Keyword arguments:
+        dw: database connection
+        query: the multi heatmap query of the temporal resolution
+        params: the parameters of the query
+        temporal_resolution: the temporal resolution of the frames
+        periods: all periods of the multi heatmap
+        keys: the keys of the frames of all periods
+        first: the index of the first period to query
+        last: the index of the last period to query
+    """
+    rows = dw.execute(text(query), {
+        **params,
+        'start_timestamp': periods[first][0],
+        'end_timestamp': periods[last][1],
+        **temporal_bound_ids(periods[first][0], periods[last][1]),
+    }).fetchall()
+
+    starts = [period_start(periods[index][0].date(), temporal_resolution) for index in range(first, last + 1)]
+    frames = {index: None for index in range(first, last + 1)}
+    for title, raster, max_value, first_date_id in rows:
+        if raster is None:
+            continue
+        day = period_start(date_from_id(first_date_id), temporal_resolution)
+        index = first + max(bisect.bisect_right(starts, day) - 1, 0)
+        frames[index] = Frame(keys[index], title, as_bytes(raster), max_value)
+
+    for index, frame in frames.items():
+        raster_cache.set(keys[index], frame)
+    return frames
+
+
+def render_frames(frames: Iterable[Frame], title_prefix: str, max_value: float,
+                  on_rendered: Callable[[int], None] = None) -> list[bytes]:
+    """
+    Render the frames of a multi heatmap as PNGs, only rendering the frames which are not cached.
+
+    The frames may be a lazy iterable, in which case each frame is rendered as soon as it is produced.
+
+    Keyword arguments:
+        frames: the frames to render
+        title_prefix: prefix for the title of each frame
+        max_value: max value of the colour scale shared by all frames
+        on_rendered: called with the number of frames rendered so far, including cached frames
+    """
+    keys = []
+    pngs = {}
+    missing = []
+    rendered = geo_tiffs_to_pngs(uncached_rasters(frames, title_prefix, max_value, keys, pngs, missing),
+                                 title_prefix, max_value, lambda count: _report(on_rendered, len(pngs) + count))
+
+    for index, png in zip(missing, rendered):
+        render_cache.set(keys[index], png)
+        pngs[index] = png
+
+    return [pngs[index] for index in range(len(keys))]
+
+
+def uncached_rasters(frames: Iterable[Frame], title_prefix: str, max_value: float, keys: list[str],
+                     pngs: dict[int, bytes], missing: list[int]) -> Iterator[tuple[str, bytes]]:
+    """
+    Look up the rendered frames in the cache, yielding the title and raster of the frames which must be rendered.
+
+    Keyword arguments:
+        frames: the frames to render
+        title_prefix: prefix for the title of each frame
+        max_value: max value of the colour scale shared by all frames
+        keys: list the render key of each frame is appended to
+        pngs: dictionary the cached rendered frames are added to, by their index
+        missing: list the index of each frame which must be rendered is appended to
+    """
+    for index, frame in enumerate(frames):
+        keys.append(request_key("heatmap_frame_render", {'frame': frame.key, 'title_prefix': title_prefix,
+                                                         'max_value': max_value}))
+        try:
+            pngs[index] = render_cache.get(keys[index])
+        except KeyError:
+            missing.append(index)
+            yield frame.title, frame.raster
+
+
+def get_cached(cache: DiskCache, keys: list[str]) -> dict[int, Any]:
+    """Get the cached values of the keys, by the index of their key."""
+    values = {}
+    for index, key in enumerate(keys):
+        try:
+            values[index] = cache.get(key)
+        except KeyError:
+            continue
+    return values
+
+
+def missing_runs(indices: list[int]) -> list[tuple[int, int]]:
+    """Group ascending indices into runs of consecutive indices, as tuples of the first and last index of each run."""
+    runs = []
+    for index in indices:
+        if runs and runs[-1][1] == index - 1:
+            runs[-1] = (runs[-1][0], index)
+        else:
+            runs.append((index, index))
+    return runs
+
+
+def date_id(timestamp: datetime.datetime) -> int:
+    """Get the date id of the date of a timestamp."""
+    return int(timestamp.strftime("%Y%m%d"))
+
+
+def date_from_id(value: int) -> datetime.date:
+    """Get the date identified by a date id."""
+    return datetime.date(value // 10000, value // 100 % 100, value % 100)
+
+
+def _report(callback: Callable[[int], None] | None, count: int) -> None:
+    if callback is not None:
+        callback(count)
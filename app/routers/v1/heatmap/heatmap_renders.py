@@ -1,77 +1,120 @@
 """Utility functions for rendering heatmaps."""
 import io
 import multiprocessing
+from collections import deque
+from contextlib import ExitStack
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.pool import Pool
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 from rasterio.enums import Resampling
-from typing import List, Tuple
+from typing import Callable, Iterable, List, Tuple
 
-import numpy as np
 import rasterio as rio
 from matplotlib import colors
 from rasterio import MemoryFile
 from rasterio.plot import show
 import matplotlib.pyplot as plt
 from PIL import Image
-import imageio.v2 as imageio
-
-from app.schemas.multi_output_format import MultiOutputFormat
 
 max_width, max_height = [2000, 2000]
+# The number of frames passed to the rendering processes at a time, bounding the shared memory a render holds.
+MAX_FRAMES_IN_FLIGHT = 8
 
 
-def geo_tiff_to_imageio(geo_tiff_bytes: io.BytesIO, title: str, max_value: float):
+def geo_tiff_to_png_from_shared_memory(args: Tuple[str, int, str, float]) -> bytes:
     """
-    Wrap around creating PNG and loading into ImageIO. Used to multiprocess the creation of PNGs.
+    Render a GeoTIFF placed in shared memory as a PNG, and return its bytes. Used to multiprocess the creation of PNGs.
 
     Keyword arguments:
-        geo_tiff_bytes: Binary representation of the GeoTIFF
-        title: title which should be shown on the image
-        max_value: max value for the heatmap, used for aligning the color scale.
+        args: tuple of (name of the shared memory block holding the GeoTIFF, size of the GeoTIFF in bytes,
+            title which should be shown on the image, max value for the heatmap used for aligning the color scale)
     """
-    return imageio.imread(geo_tiff_to_png(geo_tiff_bytes, title=title, max_value=max_value))
-
-
-def geo_tiffs_to_video(
-        rasters: List[Tuple[str, io.BytesIO]],
-        fps: int,
-        format: str,
+    name, size, title, max_value = args
+    shared = shared_memory.SharedMemory(name=name)
+    try:
+        # Copied once out of the block, which is cheaper than unpickling it from the pipe of the pool
+        geo_tiff_bytes = bytes(shared.buf[:size])
+    finally:
+        shared.close()
+    return geo_tiff_to_png(geo_tiff_bytes, title=title, max_value=max_value).read()
+
+
+def geo_tiffs_to_pngs(
+        rasters: Iterable[Tuple[str, bytes]],
         title_prefix: str,
-        max_value: float = None
-) -> io.BytesIO:
+        max_value: float = None,
+        on_rendered: Callable[[int], None] = None
+) -> List[bytes]:
     """
-    Create a video from a list of GeoTIFFs.
+    Render GeoTIFFs as PNGs in parallel, e.g. to be used as the frames of a video.
+
+    The GeoTIFFs may be a lazy iterable, in which case each GeoTIFF is rendered as soon as it is produced.
+    The rendering processes are only started once the first GeoTIFF is produced, as all frames may be cached.
+    GeoTIFFs are passed to the rendering processes through shared memory, instead of being pickled through a pipe.
+    At most MAX_FRAMES_IN_FLIGHT GeoTIFFs are in shared memory at a time, and each is freed once its frame is rendered.
 
     Keyword arguments:
-        rasters: list of tuples of (title, GeoTIFF bytes)
-        fps: frames per second
-        format: output format
+        rasters: iterable of tuples of (title, GeoTIFF bytes)
         title_prefix: prefix for the title of each frame
         max_value: max value for the heatmap
+        on_rendered: called with the number of frames rendered so far, each time a frame is rendered
     """
-    with multiprocessing.Pool() as pool:
-        frames = pool.starmap(
-            geo_tiff_to_imageio,
-            [(raster, f"{title_prefix} - {title}", max_value) for title, raster in rasters]
-        )
-
-    frames = np.array(frames)
-
-    # Save the frames to a buffer
-    buffer = io.BytesIO()
-
-    if format == MultiOutputFormat.gif:
-        duration = 1 / fps
-        imageio.mimsave(buffer, frames, duration=duration, format='gif')
-    else:
-        imageio.mimsave(buffer, frames, fps=fps, format=format)
-
-    buffer.seek(0)
-
-    return buffer
+    pngs = []
+    pending = deque()
+    pool = None
+    with ExitStack() as stack:
+        try:
+            for title, raster in rasters:
+                pool = pool or start_rendering_processes(stack)
+                if len(pending) == MAX_FRAMES_IN_FLIGHT:
+                    collect_png(pending, pngs, on_rendered)
+                shared = share(raster)
+                pending.append((shared, pool.apply_async(
+                    geo_tiff_to_png_from_shared_memory,
+                    ((shared.name, len(raster), f"{title_prefix} - {title}", max_value),)
+                )))
+            while pending:
+                collect_png(pending, pngs, on_rendered)
+        finally:
+            for shared, _ in pending:
+                release(shared)
+    return pngs
+
+
+def start_rendering_processes(stack: ExitStack) -> Pool:
+    """Start a pool of rendering processes, which is terminated when the exit stack is closed."""
+    # Start the resource tracker before forking, such that the rendering processes share it with this process,
+    # and the shared memory they attach to is only tracked once
+    resource_tracker.ensure_running()
+    return stack.enter_context(multiprocessing.Pool())
+
+
+def collect_png(pending: deque, pngs: List[bytes], on_rendered: Callable[[int], None] | None) -> None:
+    """Wait for the oldest pending frame to be rendered, append it to the PNGs and free its shared memory."""
+    shared, result = pending[0]
+    png = result.get()
+    pending.popleft()
+    release(shared)
+    pngs.append(png)
+    if on_rendered is not None:
+        on_rendered(len(pngs))
+
+
+def share(data: bytes) -> shared_memory.SharedMemory:
+    """Copy bytes into a new block of shared memory, which must be closed and unlinked by the caller."""
+    shared = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+    shared.buf[:len(data)] = data
+    return shared
+
+
+def release(shared: shared_memory.SharedMemory) -> None:
+    """Close and unlink a block of shared memory created by share."""
+    shared.close()
+    shared.unlink()
 
 
 def geo_tiff_to_png(
-        geo_tiff_bytes: io.BytesIO,
+        geo_tiff_bytes: bytes,
         can_be_negative: bool = False,
         title: str = None,
         max_value: float = None
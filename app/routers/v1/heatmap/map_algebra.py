@@ -0,0 +1,447 @@
+"""
+Map algebra over heatmap rasters, evaluated locally with NumPy instead of per pixel in PostGIS.
+
+Expressions use the grammar of the expressions of ST_MapAlgebra, such that existing expressions keep working:
+the value of a pixel of a raster is referenced as [rastN.val] or [rastN], and its 1-based column and row as
+[rastN.x] and [rastN.y]. Expressions may contain numbers, the operators +, -, *, /, % and ^, parentheses, casts to
+numeric types with ::, and the functions listed in map_algebra_functions. Like in ST_MapAlgebra, the values of rasters
+are double precision values, which round and casts to integers round half to even, while the numbers of expressions
+are numeric values, which they round half away from zero.
+
+Expressions are parsed into a tree of NumPy operations, so no part of an expression is ever executed as code.
+"""
+import re
+from typing import Callable, NamedTuple, Sequence
+
+import numpy as np
+from fastapi import HTTPException
+from rasterio import MemoryFile
+
+# The maximum length of an expression.
+MAX_EXPRESSION_LENGTH = 1000
+# The maximum nesting depth of parentheses and function calls in an expression.
+MAX_EXPRESSION_DEPTH = 32
+
+# A compiled expression, evaluated over the values of the rasters as float64 arrays of the same shape.
+Evaluate = Callable[[Sequence[np.ndarray]], np.ndarray]
+
+token_pattern = re.compile(r"""\s*(?:
+    (?P<number>(?:\d+\.?\d*|\.\d+)(?:e[+-]?\d+)?)
+    |\[rast(?P<operand>\d+)(?:\.(?P<attribute>val|x|y))?\]
+    |(?P<name>[a-z_][a-z_0-9]*)
+    |(?P<symbol>::|[-+*/%^(),])
+)""", re.VERBOSE | re.IGNORECASE)
+
+
+def round_half_away_from_zero(values: np.ndarray) -> np.ndarray:
+    """Round to the nearest integer like PostgreSQL rounds numeric values, where halves are rounded away from zero."""
+    return np.sign(values) * np.floor(np.abs(values) + 0.5)
+
+
+# The functions of expressions, by their name and number of arguments, where None allows any number of arguments.
+map_algebra_functions: dict[str, tuple[Callable[..., np.ndarray], int | None]] = {
+    'abs': (np.abs, 1),
+    'sqrt': (np.sqrt, 1),
+    'cbrt': (np.cbrt, 1),
+    'exp': (np.exp, 1),
+    'ln': (np.log, 1),
+    'log': (np.log10, 1),
+    'log10': (np.log10, 1),
+    'power': (np.power, 2),
+    'mod': (np.fmod, 2),
+    'round': (round_half_away_from_zero, 1),
+    'floor': (np.floor, 1),
+    'ceil': (np.ceil, 1),
+    'ceiling': (np.ceil, 1),
+    'trunc': (np.trunc, 1),
+    'sign': (np.sign, 1),
+    'greatest': (lambda *values: np.maximum.reduce(np.broadcast_arrays(*values)), None),
+    'least': (lambda *values: np.minimum.reduce(np.broadcast_arrays(*values)), None),
+    'pi': (lambda: np.pi, 0),
+}
+
+# The functions returning double precision values in PostgreSQL, whatever the types of their arguments.
+double_precision_functions = {'cbrt', 'pi'}
+
+# The operators of expressions, by their symbol.
+map_algebra_operators: dict[str, Callable[[np.ndarray, np.ndarray], np.ndarray]] = {
+    '+': np.add,
+    '-': np.subtract,
+    '*': np.multiply,
+    '/': np.divide,
+    '%': np.fmod,
+    '^': np.power,
+}
+
+# The numeric types expressions may be cast to, and whether the cast rounds to an integer like in PostgreSQL.
+map_algebra_casts = {
+    'smallint': True, 'int': True, 'int2': True, 'int4': True, 'int8': True, 'integer': True, 'bigint': True,
+    'real': False, 'float': False, 'float4': False, 'float8': False, 'double precision': False, 'numeric': False,
+}
+# The types of map_algebra_casts which are floating point types.
+floating_point_casts = {'real', 'float', 'float4', 'float8', 'double precision'}
+
+
+class MapAlgebraExpression(NamedTuple):
+    """A compiled map algebra expression."""
+
+    evaluate: Evaluate
+    # The 1-based numbers of the rasters referenced by the expression.
+    operands: frozenset[int]
+
+
+def compile_map_algebra(expression: str, operand_count: int) -> MapAlgebraExpression:
+    """
+    Compile a map algebra expression, such that it can be evaluated over rasters.
+
+    Raises an HTTPException if the expression is invalid, or references rasters which do not exist.
+
+    Keyword arguments:
+        expression: the map algebra expression
+        operand_count: the number of rasters the expression may reference
+    """
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise invalid_expression(expression, f"it is longer than {MAX_EXPRESSION_LENGTH} characters")
+    parser = MapAlgebraParser(expression, operand_count)
+    evaluate = parser.parse()
+    return MapAlgebraExpression(evaluate, frozenset(parser.operands))
+
+
+def invalid_expression(expression: str, reason: str) -> HTTPException:
+    """Create an exception rejecting an invalid map algebra expression."""
+    return HTTPException(400, f'Invalid map algebra expression "{expression}": {reason}.')
+
+
+def tokenize(expression: str) -> list[re.Match]:
+    """Split an expression into its tokens, rejecting characters which are not part of any token."""
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = token_pattern.match(expression, position)
+        if match is None or match.end() == position:
+            raise invalid_expression(expression, f"unexpected character at position {position + 1}")
+        tokens.append(match)
+        position = match.end()
+    return tokens
+
+
+class MapAlgebraParser:
+    """Recursive descent parser compiling a map algebra expression into NumPy operations."""
+
+    def __init__(self, expression: str, operand_count: int):
+        """
+        Create a parser of an expression.
+
+        Keyword arguments:
+            expression: the map algebra expression
+            operand_count: the number of rasters the expression may reference
+        """
+        self.expression = expression
+        self.operand_count = operand_count
+        self.tokens = tokenize(expression)
+        self.position = 0
+        self.depth = 0
+        self.operands: set[int] = set()
+        # The evaluations of double precision values, e.g. the values of rasters, which PostgreSQL rounds half to even.
+        # Other values are numeric, e.g. numbers of the expression, which PostgreSQL rounds half away from zero.
+        self.double_precision: set[Evaluate] = set()
+
+    def parse(self) -> Evaluate:
+        """Parse the whole expression."""
+        evaluate = self.parse_sum()
+        if self.peek() is not None:
+            raise self.error(f'unexpected "{self.peek().group().strip()}"')
+        return evaluate
+
+    def parse_sum(self) -> Evaluate:
+        """Parse additions and subtractions, which bind the weakest."""
+        return self.parse_binary(('+', '-'), self.parse_product)
+
+    def parse_product(self) -> Evaluate:
+        """Parse multiplications, divisions and modulo."""
+        return self.parse_binary(('*', '/', '%'), self.parse_power)
+
+    def parse_power(self) -> Evaluate:
+        """Parse exponentiations, which are left-associative like in PostgreSQL."""
+        return self.parse_binary(('^',), self.parse_unary)
+
+    def parse_binary(self, symbols: tuple[str, ...], parse_operand: Callable[[], Evaluate]) -> Evaluate:
+        """Parse a left-associative chain of binary operators of the same precedence."""
+        evaluate = parse_operand()
+        while self.peek_symbol() in symbols:
+            operator = map_algebra_operators[self.next().group('symbol')]
+            right = parse_operand()
+            evaluate = self.typed(_binary(operator, evaluate, right), self.is_double_precision(evaluate, right))
+        return evaluate
+
+    def parse_unary(self) -> Evaluate:
+        """Parse a signed value, where the sign binds stronger than exponentiation like in PostgreSQL."""
+        if self.peek_symbol() in ('-', '+'):
+            negate = self.next().group('symbol') == '-'
+            evaluate = self.nested(self.parse_unary)
+            return self.typed(_unary(np.negative, evaluate), self.is_double_precision(evaluate)) if negate else evaluate
+        return self.parse_cast()
+
+    def parse_cast(self) -> Evaluate:
+        """Parse a value followed by any number of casts to numeric types."""
+        evaluate = self.parse_primary()
+        while self.peek_symbol() == '::':
+            self.next()
+            type_name = self.parse_type_name()
+            if map_algebra_casts[type_name]:
+                evaluate = _unary(self.rounding(evaluate), evaluate)
+            else:
+                evaluate = self.typed(_unary(np.asarray, evaluate), type_name in floating_point_casts)
+        return evaluate
+
+    def parse_type_name(self) -> str:
+        """Parse the name of a numeric type."""
+        name = self.expect_name()
+        if name == 'double':
+            name = f"{name} {self.expect_name()}"
+        if name not in map_algebra_casts:
+            raise self.error(f'cannot cast to "{name}"')
+        return name
+
+    def parse_primary(self) -> Evaluate:
+        """Parse a number, a raster reference, a function call or a parenthesised expression."""
+        token = self.expect_token()
+        if token.group('number') is not None:
+            number = float(token.group('number'))
+            return lambda values: number
+        if token.group('operand') is not None:
+            return self.parse_operand(int(token.group('operand')), (token.group('attribute') or 'val').lower())
+        if token.group('name') is not None:
+            return self.nested(lambda: self.parse_function(token.group('name').lower()))
+        if token.group('symbol') == '(':
+            return self.nested(self.parse_parenthesised)
+        raise self.error(f'unexpected "{token.group().strip()}"')
+
+    def parse_operand(self, number: int, attribute: str) -> Evaluate:
+        """Create the evaluation of a reference to the value, column or row of the pixels of a raster."""
+        if not 1 <= number <= self.operand_count:
+            raise self.error(f"it references [rast{number}], but only {self.operand_count} rasters are available")
+        self.operands.add(number)
+        if attribute == 'x':
+            return lambda values: np.indices(values[number - 1].shape)[1] + 1.0
+        if attribute == 'y':
+            return lambda values: np.indices(values[number - 1].shape)[0] + 1.0
+        return self.typed(lambda values: values[number - 1], True)
+
+    def parse_function(self, name: str) -> Evaluate:
+        """Parse the arguments of a call to a function."""
+        if name not in map_algebra_functions:
+            raise self.error(f'unknown function "{name}"')
+        function, arity = map_algebra_functions[name]
+        self.expect_symbol('(')
+        arguments = [] if self.peek_symbol() == ')' else self.parse_arguments()
+        self.expect_symbol(')')
+        if (arity is None and len(arguments) == 0) or (arity is not None and len(arguments) != arity):
+            raise self.error(f'wrong number of arguments to "{name}"')
+        if name == 'round':
+            function = self.rounding(arguments[0])
+        return self.typed(lambda values: function(*[argument(values) for argument in arguments]),
+                          name in double_precision_functions or self.is_double_precision(*arguments))
+
+    def parse_arguments(self) -> list[Evaluate]:
+        """Parse the comma separated arguments of a function call."""
+        arguments = [self.parse_sum()]
+        while self.peek_symbol() == ',':
+            self.next()
+            arguments.append(self.parse_sum())
+        return arguments
+
+    def parse_parenthesised(self) -> Evaluate:
+        """Parse the expression of a parenthesis, after its opening parenthesis."""
+        evaluate = self.parse_sum()
+        self.expect_symbol(')')
+        return evaluate
+
+    def typed(self, evaluate: Evaluate, double_precision: bool) -> Evaluate:
+        """Record whether an evaluation results in double precision values, and return the evaluation."""
+        if double_precision:
+            self.double_precision.add(evaluate)
+        return evaluate
+
+    def is_double_precision(self, *evaluates: Evaluate) -> bool:
+        """Whether any of the evaluations results in double precision values."""
+        return any(evaluate in self.double_precision for evaluate in evaluates)
+
+    def rounding(self, evaluate: Evaluate) -> Callable[[np.ndarray], np.ndarray]:
+        """Get the function rounding the values of an evaluation to the nearest integer like PostgreSQL."""
+        return np.rint if self.is_double_precision(evaluate) else round_half_away_from_zero
+
+    def nested(self, parse: Callable[[], Evaluate]) -> Evaluate:
+        """Parse a nested part of the expression, rejecting expressions that are nested too deeply."""
+        self.depth += 1
+        if self.depth > MAX_EXPRESSION_DEPTH:
+            raise self.error(f"it is nested deeper than {MAX_EXPRESSION_DEPTH} levels")
+        evaluate = parse()
+        self.depth -= 1
+        return evaluate
+
+    def peek(self) -> re.Match | None:
+        """Get the next token without consuming it, or None at the end of the expression."""
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def peek_symbol(self) -> str | None:
+        """Get the symbol of the next token without consuming it, or None if it is not a symbol."""
+        token = self.peek()
+        return None if token is None else token.group('symbol')
+
+    def next(self) -> re.Match | None:
+        """Consume the next token, or return None at the end of the expression."""
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def expect_token(self) -> re.Match:
+        """Consume the next token, which must exist."""
+        token = self.next()
+        if token is None:
+            raise self.error("unexpected end of the expression")
+        return token
+
+    def expect_symbol(self, symbol: str) -> None:
+        """Consume the next token, which must be the given symbol."""
+        if self.peek_symbol() != symbol:
+            raise self.error(f'expected "{symbol}"')
+        self.next()
+
+    def expect_name(self) -> str:
+        """Consume the next token, which must be a name, and return the name in lowercase."""
+        token = self.next()
+        if token is None or token.group('name') is None:
+            raise self.error("expected the name of a type")
+        return token.group('name').lower()
+
+    def error(self, reason: str) -> HTTPException:
+        """Create an exception rejecting the expression."""
+        return invalid_expression(self.expression, reason)
+
+
+def _binary(operator: Callable[[np.ndarray, np.ndarray], np.ndarray], left: Evaluate, right: Evaluate) -> Evaluate:
+    return lambda values: operator(left(values), right(values))
+
+
+def _unary(function: Callable[[np.ndarray], np.ndarray], evaluate: Evaluate) -> Evaluate:
+    return lambda values: function(evaluate(values))
+
+
+def apply_map_algebra(first: np.ma.MaskedArray, second: np.ma.MaskedArray, expression: MapAlgebraExpression,
+                      no_data_1_expression: MapAlgebraExpression, no_data_2_expression: MapAlgebraExpression) \
+        -> np.ma.MaskedArray:
+    """
+    Combine two rasters of the same shape pixel by pixel, with the semantics of the two raster ST_MapAlgebra.
+
+    Pixels without data in both rasters, and pixels for which an expression is undefined, e.g. divisions by zero,
+    have no data in the result.
+
+    Keyword arguments:
+        first: the values of the first raster, masked where it has no data
+        second: the values of the second raster, masked where it has no data
+        expression: the expression of pixels with data in both rasters
+        no_data_1_expression: the expression of pixels only with data in the second raster
+        no_data_2_expression: the expression of pixels only with data in the first raster
+    """
+    first_mask, second_mask = np.ma.getmaskarray(first), np.ma.getmaskarray(second)
+    values = [raster.filled(0).astype(np.float64) for raster in (first, second)]
+    with np.errstate(all='ignore'):
+        result = np.select(
+            [~first_mask & ~second_mask, first_mask & ~second_mask, ~first_mask & second_mask],
+            [_evaluate(e, values) for e in (expression, no_data_1_expression, no_data_2_expression)],
+            default=np.nan
+        )
+    return np.ma.masked_invalid(result)
+
+
+def map_algebra_rasters(first: bytes | None, second: bytes | None, expression: MapAlgebraExpression,
+                        no_data_1_expression: MapAlgebraExpression, no_data_2_expression: MapAlgebraExpression) \
+        -> bytes:
+    """
+    Combine two GeoTIFFs of the same extent pixel by pixel, see apply_map_algebra.
+
+    Keyword arguments:
+        first: the first raster, or None if it has no data at all
+        second: the second raster, or None if it has no data at all
+        expression: the expression of pixels with data in both rasters
+        no_data_1_expression: the expression of pixels only with data in the second raster
+        no_data_2_expression: the expression of pixels only with data in the first raster
+    """
+    (first_values, second_values), profile = read_operands([first, second])
+    return write_result(apply_map_algebra(first_values, second_values, expression, no_data_1_expression,
+                                          no_data_2_expression), profile)
+
+
+def apply_raster_algebra(operands: list[np.ma.MaskedArray], expression: MapAlgebraExpression,
+                         no_data_value: float | None = None) -> np.ma.MaskedArray:
+    """
+    Combine any number of rasters of the same shape pixel by pixel.
+
+    Pixels where none of the rasters referenced by the expression has data, and pixels for which the expression is
+    undefined, have no data in the result.
+
+    Keyword arguments:
+        operands: the values of the rasters, masked where they have no data
+        expression: the expression combining the rasters
+        no_data_value: the value of rasters without data at a pixel, or None if the result should have no data at
+            pixels where any raster referenced by the expression has no data
+    """
+    referenced = sorted(expression.operands) or range(1, len(operands) + 1)
+    masks = np.stack([np.ma.getmaskarray(operands[number - 1]) for number in referenced])
+    missing = masks.any(axis=0) if no_data_value is None else masks.all(axis=0)
+    values = [operand.filled(no_data_value or 0).astype(np.float64) for operand in operands]
+    with np.errstate(all='ignore'):
+        result = np.where(missing, np.nan, _evaluate(expression, values))
+    return np.ma.masked_invalid(result)
+
+
+def raster_algebra_rasters(rasters: list[bytes | None], expression: MapAlgebraExpression,
+                           no_data_value: float | None = None) -> bytes:
+    """
+    Combine any number of GeoTIFFs of the same extent pixel by pixel, see apply_raster_algebra.
+
+    Keyword arguments:
+        rasters: the rasters, where rasters without any data are None
+        expression: the expression combining the rasters
+        no_data_value: the value of rasters without data at a pixel, see apply_raster_algebra
+    """
+    operands, profile = read_operands(rasters)
+    return write_result(apply_raster_algebra(operands, expression, no_data_value), profile)
+
+
+def _evaluate(expression: MapAlgebraExpression, values: list[np.ndarray]) -> np.ndarray:
+    return np.broadcast_to(np.asarray(expression.evaluate(values), dtype=np.float64), values[0].shape)
+
+
+def read_operands(rasters: Sequence[bytes | None]) -> tuple[list[np.ma.MaskedArray], dict]:
+    """
+    Read the first band of GeoTIFFs sharing the same extent, where rasters without any data may be None.
+
+    Returns the values of the rasters, masked where they have no data, and the profile of the rasters.
+
+    Keyword arguments:
+        rasters: the GeoTIFFs, of which at least one must not be None
+    """
+    bands = {}
+    profile = None
+    for index, raster in enumerate(rasters):
+        if raster is None:
+            continue
+        with MemoryFile(raster) as memfile:
+            with memfile.open() as dataset:
+                bands[index] = dataset.read(1, masked=True)
+                profile = profile or dataset.profile
+    shape = (profile['height'], profile['width'])
+    empty = np.ma.masked_all(shape, dtype=np.float64)
+    return [bands.get(index, empty) for index in range(len(rasters))], profile
+
+
+def write_result(result: np.ma.MaskedArray, profile: dict) -> bytes:
+    """Write the result of map algebra as a single band float GeoTIFF, with NaN where it has no data."""
+    profile = {**profile, 'count': 1, 'dtype': 'float32', 'nodata': np.nan}
+    with MemoryFile() as memfile:
+        with memfile.open(**profile) as dataset:
+            dataset.write(result.filled(np.nan).astype(np.float32), 1)
+        return memfile.read()
@@ -0,0 +1,74 @@
+"""Utility functions for dividing a temporal bound into the periods of a temporal resolution."""
+import datetime
+
+from app.schemas.temporal_resolution import TemporalResolution
+
+# The number of months in a period, for the temporal resolutions with periods of varying length.
+months_per_period = {
+    TemporalResolution.monthly: 1,
+    TemporalResolution.quarterly: 3,
+    TemporalResolution.yearly: 12,
+}
+
+
+def period_start(day: datetime.date, temporal_resolution: TemporalResolution) -> datetime.date:
+    """
+    Get the first day of the period containing the given day.
+
+    Weeks are ISO weeks starting on mondays, matching the iso_year and week_of_year of dim_date.
+
+    Keyword arguments:
+        day: the day to get the period of
+        temporal_resolution: the temporal resolution defining the periods
+    """
+    if temporal_resolution == TemporalResolution.daily:
+        return day
+    if temporal_resolution == TemporalResolution.weekly:
+        return day - datetime.timedelta(days=day.weekday())
+    months = months_per_period[temporal_resolution]
+    return day.replace(month=(day.month - 1) // months * months + 1, day=1)
+
+
+def next_period_start(start: datetime.date, temporal_resolution: TemporalResolution) -> datetime.date:
+    """
+    Get the first day of the period following the period starting on the given day.
+
+    Keyword arguments:
+        start: the first day of a period
+        temporal_resolution: the temporal resolution defining the periods
+    """
+    if temporal_resolution == TemporalResolution.daily:
+        return start + datetime.timedelta(days=1)
+    if temporal_resolution == TemporalResolution.weekly:
+        return start + datetime.timedelta(days=7)
+    month_index = start.year * 12 + start.month - 1 + months_per_period[temporal_resolution]
+    return datetime.date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def get_periods(start_timestamp: datetime.datetime, end_timestamp: datetime.datetime,
+                temporal_resolution: TemporalResolution) -> list[tuple[datetime.datetime, datetime.datetime]]:
+    """
+    Divide a temporal bound into the periods of a temporal resolution, clipped to the temporal bound.
+
+    Keyword arguments:
+        start_timestamp: the inclusive start of the temporal bound
+        end_timestamp: the exclusive end of the temporal bound
+        temporal_resolution: the temporal resolution defining the periods
+
+    Returns: a list of (inclusive start, exclusive end) timestamps of each period, in chronological order.
+    """
+    periods = []
+    start = period_start(start_timestamp.date(), temporal_resolution)
+    while _at_midnight(start, start_timestamp) < end_timestamp:
+        end = next_period_start(start, temporal_resolution)
+        periods.append((
+            max(_at_midnight(start, start_timestamp), start_timestamp),
+            min(_at_midnight(end, start_timestamp), end_timestamp)
+        ))
+        start = end
+    return periods
+
+
+def _at_midnight(day: datetime.date, reference: datetime.datetime) -> datetime.datetime:
+    """Get the start of the day, in the same timezone as the reference timestamp."""
+    return datetime.datetime.combine(day, datetime.time(), tzinfo=reference.tzinfo)
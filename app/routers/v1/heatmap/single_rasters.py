@@ -0,0 +1,60 @@
+"""
+Rasters of single heatmaps, cached such that they can be reused as they are, or as the operands of map algebra.
+
+The raster is cached under all parameters of the query, and the latest ETL import of the dates in the temporal bound,
+such that it is recomputed once new data is imported for it. Heatmaps without data are cached as well.
+"""
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.datawarehouse import SessionLocal, query_executor
+from app.disk_cache import DiskCache
+from app.etl_imports import get_import_ids_by_date
+from app.single_flight import request_key
+from helper_functions import as_bytes
+
+# The size the cached rasters may take up on disk.
+CACHE_SIZE_BYTES = 1024 ** 3
+
+raster_cache = DiskCache("heatmap_rasters", CACHE_SIZE_BYTES)
+
+
+def fetch_single_raster(dw: Session, query: str, params: dict) -> bytes | None:
+    """
+    Fetch the raster of a single heatmap as a GeoTIFF, or None if there is no data given the parameters.
+
+    Keyword arguments:
+        dw: database connection
+        query: the query returning the raster of the heatmap as a GeoTIFF
+        params: the parameters of the query, including the start_date_id and end_date_id of its temporal bound
+    """
+    import_ids = get_import_ids_by_date(dw, params['start_date_id'], params['end_date_id'])
+    key = request_key("heatmap_raster", {**params, 'query': query, 'import_id': max(import_ids.values(), default=0)})
+    try:
+        return raster_cache.get(key)
+    except KeyError:
+        pass
+
+    result = dw.execute(text(query), params).fetchone()
+    raster = None if result is None or result[0] is None else as_bytes(result[0])
+    raster_cache.set(key, raster)
+    return raster
+
+
+def fetch_single_rasters(query: str, operands: list[dict]) -> list[bytes | None]:
+    """
+    Fetch the rasters of several single heatmaps concurrently in the background, see fetch_single_raster.
+
+    Keyword arguments:
+        query: the query returning the raster of a heatmap as a GeoTIFF
+        operands: the parameters of the query of each raster
+
+    Returns: the raster of each heatmap, in the order of the parameters.
+    """
+    return list(query_executor.map(lambda params: fetch_single_raster_in_session(query, params), operands))
+
+
+def fetch_single_raster_in_session(query: str, params: dict) -> bytes | None:
+    """Fetch the raster of a single heatmap using a new session, see fetch_single_raster."""
+    with SessionLocal() as session:
+        return fetch_single_raster(session, query, params)
@@ -0,0 +1,12 @@
+SELECT
+    dht.slug,
+    dht.name,
+    dht.description,
+    spatial_resolution,
+    temporal_resolution_sec,
+    min(date_id) AS min_date_id,
+    max(date_id) AS max_date_id
+FROM dim_heatmap_type dht
+JOIN fact_cell_heatmap fch on dht.heatmap_type_id = fch.heatmap_type_id
+WHERE fch.date_id = ANY (:date_ids)
+GROUP BY dht.slug, dht.name, dht.description, spatial_resolution, temporal_resolution_sec
\ No newline at end of file
@@ -1,29 +1,40 @@
-WITH reference (rast, geom) AS (
+WITH reference (rast, geom, clip_geom) AS (
     SELECT ST_AddBand(
         ST_MakeEmptyRaster (:width, :height, :min_x, :min_y, :spatial_resolution, :spatial_resolution, 0, 0, 3034),
         '32BUI'::text,
         1,
         0
     ) AS rast,
-    ST_MakeEnvelope(:min_x, :min_y, :max_x, :max_y, 3034) AS geom
+    ST_MakeEnvelope(:min_x, :min_y, :max_x, :max_y, 3034) AS geom,
+    -- The geometry to clip the heatmap to, if any
+    ST_SetSRID(ST_GeomFromGeoJSON(CAST(:clip_geometry AS text)), 3034) AS clip_geom
 )
 SELECT
     q3.year::text AS title,
     CASE WHEN q3.rast IS NULL THEN NULL ELSE
         ST_AsGDALRaster(q3.rast,'GTiff')
     END AS raster,
-    (ST_SummaryStats(q3.rast)).max AS max
+    (ST_SummaryStats(q3.rast)).max AS max,
+    -- The first date with data in the period, identifying the period the row belongs to
+    q3.first_date_id
 FROM (
     SELECT
         q2.year,
-        ST_MapAlgebra(q2.rast, reference.rast, '[rast1.val]+[rast2.val]', extenttype := 'SECOND') AS rast
+        q2.first_date_id,
+        CASE WHEN reference.clip_geom IS NULL THEN
+            ST_MapAlgebra(q2.rast, reference.rast, '[rast1.val]+[rast2.val]', extenttype := 'SECOND')
+        ELSE
+            ST_Clip(ST_MapAlgebra(q2.rast, reference.rast, '[rast1.val]+[rast2.val]', extenttype := 'SECOND'), reference.clip_geom, false)
+        END AS rast
     FROM reference, (
         SELECT
             q1.year,
+            MIN(q1.first_date_id) AS first_date_id,
             ST_Union(q1.rast) AS rast
         FROM (
             SELECT
                 q0.year,
+                q0.first_date_id,
                 -- If there are 2 bands in the raster, assume it is to calculate average by dividing the first band by the second band
                 CASE WHEN ST_Numbands(q0.rast) > 1 THEN
                     ST_MapAlgebra(q0.rast, 1, q0.rast, 2, '[rast1.val]/[rast2.val]', extenttype := 'FIRST')
@@ -33,14 +44,15 @@ FROM (
             FROM (
                 SELECT
                     dd.year,
+                    MIN(fch.date_id) AS first_date_id,
                     ST_Union(fch.rast, 'SUM') AS rast
                 FROM fact_cell_heatmap fch
                 JOIN dim_ship_type dst on fch.ship_type_id = dst.ship_type_id
                 JOIN dim_date dd on fch.date_id = dd.date_id
                 WHERE fch.spatial_resolution = :spatial_resolution
                 AND fch.heatmap_type_id = (SELECT heatmap_type_id FROM dim_heatmap_type WHERE slug = :heatmap_type_slug)
-                AND timestamp_from_date_time_id(fch.date_id, fch.time_id) < :end_timestamp
-                AND timestamp_from_date_time_id(fch.date_id, fch.time_id) >= :start_timestamp
+                AND (fch.date_id, fch.time_id) < (:end_date_id, :end_time_id)
+                AND (fch.date_id, fch.time_id) >= (:start_date_id, :start_time_id)
                 AND dst.ship_type = ANY (:ship_types)
                 AND dst.mobile_type = ANY (:mobile_types)
                 AND fch.cell_x >= :min_cell_x
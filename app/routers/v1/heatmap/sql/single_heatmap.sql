@@ -1,15 +1,24 @@
-WITH reference (rast, geom) AS (
+WITH reference (rast, geom, clip_geom) AS (
     SELECT ST_AddBand(
         ST_MakeEmptyRaster (:width, :height, :min_x, :min_y, :spatial_resolution, :spatial_resolution, 0, 0, 3034),
         '32BUI'::text,
         1,
         0
     ) AS rast,
-    ST_MakeEnvelope(:min_x, :min_y, :max_x, :max_y, 3034) AS geom
+    ST_MakeEnvelope(:min_x, :min_y, :max_x, :max_y, 3034) AS geom,
+    -- The geometry to clip the heatmap to, if any
+    ST_SetSRID(ST_GeomFromGeoJSON(CAST(:clip_geometry AS text)), 3034) AS clip_geom
 )
 SELECT
     CASE WHEN q2.rast IS NULL THEN NULL ELSE
-        ST_AsGDALRaster(ST_MapAlgebra(q2.rast, reference.rast, '[rast1.val]+[rast2.val]', extenttype := 'SECOND'),'GTiff')
+        ST_AsGDALRaster(
+            CASE WHEN reference.clip_geom IS NULL THEN
+                ST_MapAlgebra(q2.rast, reference.rast, '[rast1.val]+[rast2.val]', extenttype := 'SECOND')
+            ELSE
+                ST_Clip(ST_MapAlgebra(q2.rast, reference.rast, '[rast1.val]+[rast2.val]', extenttype := 'SECOND'), reference.clip_geom, false)
+            END,
+            'GTiff'
+        )
     END AS raster
 FROM reference, (
     SELECT ST_Union(q1.rast) AS rast FROM (
@@ -27,8 +36,8 @@ FROM reference, (
             JOIN dim_ship_type dst on fch.ship_type_id = dst.ship_type_id
             WHERE fch.spatial_resolution = :spatial_resolution
             AND fch.heatmap_type_id = (SELECT heatmap_type_id FROM dim_heatmap_type WHERE slug = :heatmap_type_slug)
-            AND timestamp_from_date_time_id(fch.date_id, fch.time_id) < :end_timestamp
-            AND timestamp_from_date_time_id(fch.date_id, fch.time_id) >= :start_timestamp
+            AND (fch.date_id, fch.time_id) < (:end_date_id, :end_time_id)
+            AND (fch.date_id, fch.time_id) >= (:start_date_id, :start_time_id)
             AND dst.ship_type = ANY (:ship_types)
             AND dst.mobile_type = ANY (:mobile_types)
             AND fch.cell_x >= :min_cell_x
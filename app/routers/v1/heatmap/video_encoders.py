@@ -0,0 +1,133 @@
+"""
+Encoding of rendered heatmap frames into videos and animated images.
+
+Videos are encoded with FFmpeg, using x264 for MP4 and VP9 for WebM, while GIF and animated WebP are encoded with
+Pillow. All encoders are software encoders, trading speed for compression through the preset and CRF settings.
+"""
+import io
+from typing import Callable, List, NamedTuple
+
+import imageio.v2 as imageio
+import numpy as np
+from matplotlib import colormaps
+from PIL import Image
+
+from app.schemas.encoder_preset import EncoderPreset
+from app.schemas.multi_output_format import MultiOutputFormat
+
+# The default constant rate factor of each codec, balancing quality and size.
+default_crf = {
+    MultiOutputFormat.mp4: 23,
+    MultiOutputFormat.webm: 33,
+    MultiOutputFormat.webp: 20,
+}
+
+# The speed settings of VP9 for each preset, as (deadline, cpu-used).
+vp9_speeds = {
+    EncoderPreset.ultrafast: ("realtime", 8),
+    EncoderPreset.superfast: ("realtime", 7),
+    EncoderPreset.veryfast: ("realtime", 6),
+    EncoderPreset.faster: ("realtime", 5),
+    EncoderPreset.fast: ("good", 4),
+    EncoderPreset.medium: ("good", 2),
+    EncoderPreset.slow: ("good", 1),
+}
+
+# The compression method of WebP for each preset, from 0 (fastest) to 6 (smallest).
+webp_methods = {preset: method for method, preset in enumerate(EncoderPreset)}
+
+
+class EncoderSettings(NamedTuple):
+    """The settings of the encoder of a multi heatmap."""
+
+    preset: EncoderPreset = EncoderPreset.veryfast
+    crf: int | None = None
+    max_dimension: int | None = None
+
+
+def gif_palette() -> Image.Image:
+    """
+    Create the fixed palette of GIFs, such that frames are quantised by a lookup instead of a palette per frame.
+
+    The palette consists of the colours of the turbo colour map used for heatmaps, and shades of grey for the text,
+    colour bar and background.
+    """
+    turbo = colormaps['turbo'](np.linspace(0, 1, 192))[:, :3] * 255
+    greys = np.repeat(np.linspace(0, 255, 64)[:, np.newaxis], 3, axis=1)
+    palette = Image.new('P', (1, 1))
+    palette.putpalette(np.concatenate([turbo, greys]).astype(np.uint8).flatten().tolist())
+    return palette
+
+
+_gif_palette = gif_palette()
+
+
+def encode_video(pngs: List[bytes], fps: int, output_format: MultiOutputFormat,
+                 settings: EncoderSettings = EncoderSettings()) -> io.BytesIO:
+    """
+    Encode rendered frames into a video or animated image.
+
+    Keyword arguments:
+        pngs: the frames as PNGs
+        fps: frames per second
+        output_format: the output format
+        settings: the preset, CRF and maximum dimension of the output
+    """
+    frames = [downscale(Image.open(io.BytesIO(png)).convert('RGB'), settings.max_dimension) for png in pngs]
+    buffer = io.BytesIO()
+    encoders[output_format](buffer, frames, fps, settings)
+    buffer.seek(0)
+    return buffer
+
+
+def downscale(frame: Image.Image, max_dimension: int | None) -> Image.Image:
+    """Downscale a frame such that neither its width nor its height exceeds the maximum dimension, if any."""
+    if max_dimension is None or max(frame.size) <= max_dimension:
+        return frame
+    scale = max_dimension / max(frame.size)
+    return frame.resize((max(int(frame.width * scale), 1), max(int(frame.height * scale), 1)), Image.LANCZOS)
+
+
+def encode_mp4(buffer: io.BytesIO, frames: List[Image.Image], fps: int, settings: EncoderSettings) -> None:
+    """Encode frames as an H.264 MP4 with x264."""
+    crf = default_crf[MultiOutputFormat.mp4] if settings.crf is None else settings.crf
+    _encode_ffmpeg(buffer, frames, fps, 'mp4', 'libx264',
+                   ['-crf', str(crf), '-preset', settings.preset.value, '-movflags', '+faststart'])
+
+
+def encode_webm(buffer: io.BytesIO, frames: List[Image.Image], fps: int, settings: EncoderSettings) -> None:
+    """Encode frames as a VP9 WebM with libvpx in constant quality mode."""
+    crf = default_crf[MultiOutputFormat.webm] if settings.crf is None else settings.crf
+    deadline, cpu_used = vp9_speeds[settings.preset]
+    _encode_ffmpeg(buffer, frames, fps, 'webm', 'libvpx-vp9',
+                   ['-crf', str(crf), '-b:v', '0', '-deadline', deadline, '-cpu-used', str(cpu_used), '-row-mt', '1'])
+
+
+def encode_gif(buffer: io.BytesIO, frames: List[Image.Image], fps: int, settings: EncoderSettings) -> None:
+    """Encode frames as an animated GIF, quantised to the fixed palette without dithering."""
+    quantised = [frame.quantize(palette=_gif_palette, dither=Image.Dither.NONE) for frame in frames]
+    quantised[0].save(buffer, format='GIF', save_all=True, append_images=quantised[1:],
+                      duration=int(1000 / fps), loop=0)
+
+
+def encode_webp(buffer: io.BytesIO, frames: List[Image.Image], fps: int, settings: EncoderSettings) -> None:
+    """Encode frames as an animated WebP, with the CRF mapped to the inverse of the WebP quality."""
+    crf = default_crf[MultiOutputFormat.webp] if settings.crf is None else settings.crf
+    frames[0].save(buffer, format='WEBP', save_all=True, append_images=frames[1:], duration=int(1000 / fps),
+                   loop=0, quality=max(100 - crf, 0), method=webp_methods[settings.preset])
+
+
+def _encode_ffmpeg(buffer: io.BytesIO, frames: List[Image.Image], fps: int, format: str, codec: str,
+                   output_params: List[str]) -> None:
+    # A macro block size of 2 only resizes frames to the even dimensions required by the yuv420p pixel format
+    imageio.mimsave(buffer, [np.asarray(frame) for frame in frames], format=format, fps=fps, codec=codec,
+                    quality=None, pixelformat='yuv420p', macro_block_size=2, output_params=output_params)
+
+
+# The encoder of each output format.
+encoders: dict[MultiOutputFormat, Callable[[io.BytesIO, List[Image.Image], int, EncoderSettings], None]] = {
+    MultiOutputFormat.mp4: encode_mp4,
+    MultiOutputFormat.webm: encode_webm,
+    MultiOutputFormat.gif: encode_gif,
+    MultiOutputFormat.webp: encode_webp,
+}
@@ -0,0 +1,106 @@
+"""
+Zonal statistics of heatmaps, i.e. statistics of the pixel values of a heatmap inside each of a number of zones.
+
+The statistics are computed with NumPy over the cached rasters of heatmaps, so only a few numbers per zone are
+returned instead of the rasters. A pixel belongs to a zone if its center is inside the geometry of the zone.
+"""
+from typing import NamedTuple
+
+import numpy as np
+from fastapi import HTTPException
+from rasterio import MemoryFile
+from rasterio.features import geometry_mask
+
+from app.reference_geometries import ReferenceGeometry
+
+
+class Zone(NamedTuple):
+    """A named zone, with its bounds and geometry in EPSG:3034."""
+
+    name: str
+    min_x: float
+    min_y: float
+    max_x: float
+    max_y: float
+    geometry: dict
+
+
+def reference_geometry_zone(reference_geometry: ReferenceGeometry) -> Zone:
+    """Create the zone of a reference geometry, i.e. an ENC cell."""
+    return Zone(*reference_geometry)
+
+
+def bbox_zone(bbox: str) -> Zone:
+    """
+    Create the zone of a bounding box given as "x_min,y_min,x_max,y_max".
+
+    Raises an HTTPException if the bounding box is malformed.
+    """
+    try:
+        min_x, min_y, max_x, max_y = [float(value) for value in bbox.split(",")]
+    except ValueError:
+        raise HTTPException(400, f'The bounding box "{bbox}" is not of the form "x_min,y_min,x_max,y_max".')
+    if min_x >= max_x or min_y >= max_y:
+        raise HTTPException(400, f'The bounding box "{bbox}" is empty.')
+    return Zone(bbox, min_x, min_y, max_x, max_y, {
+        'type': 'Polygon',
+        'coordinates': [[(min_x, min_y), (max_x, min_y), (max_x, max_y), (min_x, max_y), (min_x, min_y)]],
+    })
+
+
+def zones_bounds(zones: list[Zone]) -> tuple[float, float, float, float]:
+    """Get the bounds covering all zones."""
+    return (min(zone.min_x for zone in zones), min(zone.min_y for zone in zones),
+            max(zone.max_x for zone in zones), max(zone.max_y for zone in zones))
+
+
+def raster_zonal_statistics(rasters: list[tuple[str | None, bytes]], zones: list[Zone],
+                            percentiles: list[float]) -> list[dict]:
+    """
+    Compute the statistics of the pixel values of rasters inside each zone.
+
+    The rasters must share the same extent, such that the pixels of each zone are only located once.
+
+    Keyword arguments:
+        rasters: tuples of the period of each raster, or None if it is not a period of a multi heatmap, and its GeoTIFF
+        zones: the zones to compute the statistics of
+        percentiles: the percentiles of the pixel values to compute, between 0 and 100
+
+    Returns: the statistics of each zone of each raster, ordered by raster and then zone.
+    """
+    statistics = []
+    masks = None
+    for period, raster in rasters:
+        with MemoryFile(raster) as memfile:
+            with memfile.open() as dataset:
+                values = dataset.read(1, masked=True)
+                if masks is None:
+                    masks = [geometry_mask([zone.geometry], values.shape, dataset.transform, invert=True)
+                             for zone in zones]
+        statistics.extend({'zone': zone.name, 'period': period, **zone_statistics(values, mask, percentiles)}
+                          for zone, mask in zip(zones, masks))
+    return statistics
+
+
+def zone_statistics(values: np.ma.MaskedArray, mask: np.ndarray, percentiles: list[float]) -> dict:
+    """
+    Compute the statistics of the pixel values with data inside a zone.
+
+    Keyword arguments:
+        values: the pixel values of the raster, masked where it has no data
+        mask: whether each pixel is inside the zone
+        percentiles: the percentiles of the pixel values to compute, between 0 and 100
+    """
+    inside = values.data[mask & ~np.ma.getmaskarray(values)].astype(np.float64)
+    if inside.size == 0:
+        return {'count': 0, 'sum': 0, 'mean': None, 'min': None, 'max': None,
+                'percentiles': {f"{percentile:g}": None for percentile in percentiles}}
+    return {
+        'count': int(inside.size),
+        'sum': float(inside.sum()),
+        'mean': float(inside.mean()),
+        'min': float(inside.min()),
+        'max': float(inside.max()),
+        'percentiles': {f"{percentile:g}": float(value)
+                        for percentile, value in zip(percentiles, np.percentile(inside, percentiles))},
+    }
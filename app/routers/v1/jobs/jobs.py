@@ -0,0 +1,36 @@
+"""Endpoint controller for querying the progress and results of asynchronous jobs."""
+from fastapi import APIRouter, Header, Path, Request
+from fastapi.responses import StreamingResponse
+
+from app.jobs import get_job, get_job_artefact
+from app.ranged_response import ranged_file_response
+from app.schemas.job import Job, JobStatus
+
+router = APIRouter()
+
+
+@router.get("/{job_id}", response_model=Job)
+def job(request: Request, job_id: str = Path(description="The id of the job.")):
+    """Get the state and progress of a job."""
+    return job_with_result_url(request, job_id)
+
+
+@router.get("/{job_id}/result", response_class=StreamingResponse,
+            responses={
+                206: {"description": "The requested range of the result."},
+                409: {"description": "The job has not succeeded."},
+                416: {"description": "The requested range cannot be satisfied."}
+            })
+def job_result(job_id: str = Path(description="The id of the job."),
+               range_header: str | None = Header(default=None, alias="Range")):
+    """Download the result of a job that succeeded. Supports single range requests, e.g. to resume a download."""
+    path, media_type = get_job_artefact(job_id)
+    return ranged_file_response(path, media_type, range_header)
+
+
+def job_with_result_url(request: Request, job_id: str) -> Job:
+    """Get the state and progress of a job, including where its result can be downloaded if it succeeded."""
+    result = get_job(job_id)
+    if result.status == JobStatus.succeeded:
+        result.result_url = str(request.url_for("job_result", job_id=job_id))
+    return result
@@ -8,6 +8,8 @@ from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from app.dependencies import get_dw
 from app.querybuilder import QueryBuilder
+from app.ship_names import suggest_ships
+from app.ship_presence import candidate_ship_ids
 from helper_functions import response_dict, get_values_from_enum_list
 from app.schemas.search_method_spatial import SearchMethodSpatial
 from app.schemas.mobile_type import MobileType
@@ -15,12 +17,17 @@ from app.schemas.ship_type import ShipType
 from typing import List
 from datetime import datetime
 from app.schemas.ship import Ship
+from app.schemas.ship_suggestion import ShipSuggestion
 import os
+import re
 
 router = APIRouter()
 
 SQL_PATH = os.path.join(os.path.dirname(__file__), "sql")
 
+# The maximum number of ships suggested for a prefix.
+MAX_SUGGESTIONS = 50
+
 
 @router.get("/", response_model=List[Ship])
 async def ships(
@@ -165,6 +172,10 @@ async def ships(
                                                 description="Filter for ships with specified flag states."),
         flag_state_nin: list[str] | None = Query(default=None,
                                                  description="Filter for ships without specified flag states."),
+        name_search: str | None = Query(default=None, min_length=2,
+                                        description="Search for ships with a name or callsign starting with or "
+                                                    "similar to the given value, ignoring case. The ships are "
+                                                    "ordered by how well they match."),
 
         # Filters for ship type
         mobile_type_in: List[MobileType] | None = Query(default=None,
@@ -248,18 +259,10 @@ async def ships(
 
     params.update(temporal_params)
 
-    # Add FROM and WHERE clauses to query, depending on the spatial/temporal bounds provided
-    if not temporal_bounds and not spatial_bounds:
-        qb.add_sql("from_ship.sql")
-
-    elif search_method == SearchMethodSpatial.trajectories:
-        add_trajectory_from_where_clause_to_query(qb, spatial_bounds, temporal_bounds)
-
-    elif "cell" in search_method.value:
-        add_cell_from_where_clause_to_query(qb, placeholders, search_method, spatial_bounds, temporal_bounds)
-
-    else:
-        raise HTTPException(status_code=400, detail="Search method not supported")
+    # Add the FROM clause, and limit the ships to those found by the search method if bounds are provided
+    qb.add_sql("from_ship.sql")
+    if temporal_bounds or spatial_bounds:
+        add_ship_ids_to_query(dw, qb, params, placeholders, search_method, spatial_bounds, temporal_bounds)
 
     # All filter parameters for the ship dimension.
     filter_params_ship = {
@@ -301,8 +304,11 @@ async def ships(
     add_filters_to_query_and_param(qb, "ds.", filter_params_ship, params)
     add_filters_to_query_and_param(qb, "dst.", filter_params_ship_type, params)
 
+    # Add the fuzzy search on name and callsign, which also ranks the ships
+    rank = add_name_search_to_query(qb, params, name_search)
+
     # Clause for order by, offset and limit is added to the query
-    qb.add_string("ORDER BY ds.ship_id LIMIT :limit OFFSET :offset;")
+    qb.add_string(f"ORDER BY {rank}ds.ship_id LIMIT :limit OFFSET :offset;")
 
     # Finally, format all placeholders in the query, then collect the query string and return the response
     qb.format_query(placeholders)
@@ -310,16 +316,46 @@ async def ships(
     return JSONResponse(response_dict(final_query, dw, params))
 
 
-def add_trajectory_from_where_clause_to_query(qb: QueryBuilder, spatial_bounds: bool, temporal_bounds: bool) -> None:
+def add_ship_ids_to_query(dw: Session, qb: QueryBuilder, params: dict, placeholders: dict,
+                          search_method: SearchMethodSpatial, spatial_bounds: bool, temporal_bounds: bool) -> None:
     """
-    Add the FROM and WHERE clauses for the trajectory search method to the query builder.
+    Limit the ships of the query to the ships found within the bounds by the search method.
+
+    The ships are limited with a semi-join on the ids of the ships found, such that only the distinct ship ids are
+    collected from the facts, instead of joining every fact with the ship dimension and removing duplicates afterwards.
 
     Args:
-        qb (QueryBuilder): The query builder to add the clauses to.
+        dw (Session): The data warehouse session.
+        qb (QueryBuilder): The query builder to add the semi-join to.
+        params (dict): The parameters of the query, including the spatial and temporal bounds.
+        placeholders (dict): The placeholders to update.
+        search_method (SearchMethodSpatial): The search method to use.
+        spatial_bounds (bool): If true, the ships are searched within the spatial bounds.
+        temporal_bounds (bool): If true, the ships are searched within the temporal bounds.
+    """
+    ship_ids = QueryBuilder(qb.sql_path)
+    if search_method == SearchMethodSpatial.trajectories:
+        add_trajectory_ship_ids_to_query(ship_ids, spatial_bounds, temporal_bounds)
+    elif "cell" in search_method.value:
+        add_cell_ship_ids_to_query(ship_ids, placeholders, search_method, spatial_bounds, temporal_bounds)
+        if temporal_bounds:
+            add_candidate_ship_ids_to_query(dw, ship_ids, params, search_method, spatial_bounds)
+    else:
+        raise HTTPException(status_code=400, detail="Search method not supported")
+
+    qb.add_where_from_string(f"ds.ship_id IN ({ship_ids.get_query_str()}\n)")
+
+
+def add_trajectory_ship_ids_to_query(qb: QueryBuilder, spatial_bounds: bool, temporal_bounds: bool) -> None:
+    """
+    Add the query of the ids of the ships with trajectories within the bounds to the query builder.
+
+    Args:
+        qb (QueryBuilder): The empty query builder to add the query to.
         spatial_bounds (bool): If true, the spatial bounds are added to the WHERE clause.
         temporal_bounds (bool): If true, the temporal bounds are added to the WHERE clause.
     """
-    qb.add_sql("from_trajectory.sql")
+    qb.add_sql("ship_ids_from_trajectory.sql")
 
     # Add partition elimination
     if temporal_bounds:
@@ -331,26 +367,26 @@ def add_trajectory_from_where_clause_to_query(qb: QueryBuilder, spatial_bounds:
                                  "span(timestamp_from_date_time_id(:start_date, :start_time), "
                                  "timestamp_from_date_time_id(:end_date, :end_time), True, True)) && dt.trajectory")
     elif spatial_bounds:
-        qb.add_where_from_string("WHERE STBOX(ST_MakeEnvelope(:xmin, :ymin, :xmax, :ymax, 4326)) && dt.trajectory")
+        qb.add_where_from_string("STBOX(ST_MakeEnvelope(:xmin, :ymin, :xmax, :ymax, 4326)) && dt.trajectory")
 
     elif temporal_bounds:
         qb.add_where_from_string("STBOX(span(timestamp_from_date_time_id(:start_date, :start_time), "
                                  "timestamp_from_date_time_id(:end_date, :end_time), True, True)) && dt.trajectory")
 
 
-def add_cell_from_where_clause_to_query(qb: QueryBuilder, placeholders: dict, search_method: SearchMethodSpatial,
-                                        spatial_bounds: bool, temporal_bounds: bool) -> None:
+def add_cell_ship_ids_to_query(qb: QueryBuilder, placeholders: dict, search_method: SearchMethodSpatial,
+                               spatial_bounds: bool, temporal_bounds: bool) -> None:
     """
-    Add the FROM and WHERE clauses for the cell search method to the query builder and update the placeholders.
+    Add the query of the ids of the ships with cell facts within the bounds to the query builder.
 
     Args:
-        qb (QueryBuilder): The query builder to add the clauses to.
+        qb (QueryBuilder): The empty query builder to add the query to.
         placeholders (dict): The placeholders to update.
         search_method (SearchMethodSpatial): The search method to use. Determines the cell size.
         spatial_bounds (bool): If true, the spatial bounds are added to the WHERE clause.
         temporal_bounds (bool): If true, the temporal bounds are added to the WHERE clause.
     """
-    qb.add_sql("from_cell.sql")
+    qb.add_sql("ship_ids_from_cell.sql")
     placeholders.update({"CELL_SIZE": search_method.value})
 
     # Add partition elimination
@@ -370,6 +406,51 @@ def add_cell_from_where_clause_to_query(qb: QueryBuilder, placeholders: dict, se
         qb.add_where_from_string("STBOX(ST_MakeEnvelope(:xmin, :ymin, :xmax, :ymax, 3034)) && fc.st_bounding_box")
 
 
+def add_candidate_ship_ids_to_query(dw: Session, qb: QueryBuilder, params: dict, search_method: SearchMethodSpatial,
+                                    spatial_bounds: bool) -> None:
+    """
+    Pre-filter the cell facts of the query to the ships the ship presence index finds within the bounds, if it can.
+
+    Args:
+        dw (Session): The data warehouse session.
+        qb (QueryBuilder): The query builder of the ship ids of the cell facts.
+        params (dict): The parameters of the query, including the spatial and temporal bounds.
+        search_method (SearchMethodSpatial): The cell search method, determining the cell size.
+        spatial_bounds (bool): If true, the ships are searched within the spatial bounds.
+    """
+    bounds = (params["xmin"], params["ymin"], params["xmax"], params["ymax"]) if spatial_bounds else None
+    cell_size = int(search_method.value.removeprefix("cell_").removesuffix("m"))
+    candidates = candidate_ship_ids(dw, bounds, int(params["start_date"]), int(params["end_date"]), cell_size)
+    if candidates is not None:
+        params["candidate_ship_ids"] = candidates
+        qb.add_where_from_string("fc.ship_id = ANY(:candidate_ship_ids)")
+
+
+def add_name_search_to_query(qb: QueryBuilder, params: dict, name_search: str | None) -> str:
+    """
+    Limit the ships of the query to the ships with a name or callsign starting with or similar to the search.
+
+    Similarity is trigram similarity from pg_trgm, such that misspelled names are found, and both the similarity and the
+    prefix conditions can be answered by the trigram indexes on the name and callsign of the ship dimension.
+
+    Args:
+        qb (QueryBuilder): The query builder to add the filter to.
+        params (dict): The parameters to add the search parameters to.
+        name_search (str | None): The name or callsign to search for, or None to not search.
+
+    Returns: the ORDER BY expressions ranking the ships by how well they match, or an empty string if not searching.
+    """
+    if not name_search:
+        return ""
+
+    params["name_search"] = name_search
+    params["name_search_prefix"] = re.sub(r"([\\%_])", r"\\\1", name_search) + "%"
+    qb.add_where_from_string("(ds.name % :name_search OR ds.callsign % :name_search "
+                             "OR ds.name ILIKE :name_search_prefix OR ds.callsign ILIKE :name_search_prefix)")
+    return ("(ds.name ILIKE :name_search_prefix OR ds.callsign ILIKE :name_search_prefix) DESC, "
+            "GREATEST(similarity(ds.name, :name_search), similarity(ds.callsign, :name_search)) DESC, ")
+
+
 def update_params_datetime(param_dict: dict, dt: datetime, start_or_end: str) -> None:
     """
     Update the given parameter dict with the given parameters.
@@ -422,6 +503,21 @@ def add_filters_to_query_and_param(qb: QueryBuilder, relation_name: str, filter_
             qb.add_where(relation_name + param_name, qb.get_sql_operator(key), value, params)
 
 
+@router.get("/suggest", response_model=List[ShipSuggestion])
+def suggest(
+        prefix: str = Query(min_length=1, description="The beginning of a name, callsign or word of a name of a ship, "
+                                                      "ignoring case."),
+        limit: int = Query(default=10, ge=1, le=MAX_SUGGESTIONS, description="Limits the number of ships returned."),
+        dw: Session = Depends(get_dw)
+):
+    """
+    Suggest ships by the beginning of their name or callsign, as it is typed.
+
+    Suggestions are answered from an index kept in memory, with exact matches first, followed by alphabetical order.
+    """
+    return [suggestion._asdict() for suggestion in suggest_ships(dw, prefix, limit)]
+
+
 @router.get("/{ship_id}",  response_model=Ship)
 async def ship_by_id(
         ship_id: int = Path(description="The ship ID for a ship in the data warehouse."),
@@ -1,4 +1,4 @@
-SELECT DISTINCT ds.ship_id,
+SELECT ds.ship_id,
        ds.name,
        ds.callsign,
        ds.mmsi,
@@ -0,0 +1,2 @@
+SELECT DISTINCT fc.ship_id
+FROM fact_{CELL_SIZE} fc
\ No newline at end of file
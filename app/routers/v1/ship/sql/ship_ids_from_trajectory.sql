@@ -0,0 +1,3 @@
+SELECT DISTINCT ft.ship_id
+FROM fact_trajectory ft
+    JOIN dim_trajectory dt ON ft.trajectory_sub_id = dt.trajectory_sub_id AND ft.start_date_id = dt.date_id
\ No newline at end of file
@@ -0,0 +1,14 @@
+-- Estimate the number of rows in a relation from the planner statistics, without scanning it.
+-- Partitioned relations are estimated as the sum of their partitions, and distributed Citus relations
+-- as the sum of the statistics of their shards, as the coordinator holds no statistics for these.
+SELECT COALESCE(SUM(
+    CASE WHEN EXISTS (SELECT 1 FROM pg_dist_partition pdp WHERE pdp.logicalrelid = pt.relid) THEN (
+        SELECT SUM(GREATEST(shard.result::numeric, 0))
+        FROM run_command_on_shards(pt.relid, 'SELECT reltuples FROM pg_class WHERE oid = ''%s''::regclass') shard
+        WHERE shard.success
+    ) ELSE (
+        SELECT GREATEST(pc.reltuples, 0) FROM pg_class pc WHERE pc.oid = pt.relid
+    ) END
+), 0)::bigint AS count
+FROM pg_partition_tree(CAST(:table AS regclass)) pt
+WHERE pt.isleaf;
@@ -0,0 +1,236 @@
+"""
+Compact binary encoding of trajectories, see docs/binary_trajectories.md for the specification of the format.
+
+Coordinates are stored at a fixed precision and timestamps as epoch seconds, both as zigzag varint deltas from the
+previous point, and the rate of turn, heading and draught are aligned to the timeline of the trajectory.
+The trajectories are encoded from the Moving Features JSON returned by the data warehouse.
+"""
+import bisect
+import json
+from datetime import datetime
+from typing import Any, Iterator
+
+from fastapi.encoders import jsonable_encoder
+
+# The first bytes of an encoded response, and the version of the format.
+MAGIC = b"QPIT"
+VERSION = 1
+# The number of decimals of the coordinates, in degrees of EPSG:4326.
+COORDINATE_DECIMALS = 6
+# The time series aligned to the timeline of the trajectory, in order, and the number of decimals of their values.
+SERIES_DECIMALS = {"rot": 1, "heading": 1, "draught": 1}
+
+
+def encode_trajectories(rows: list[dict[str, Any]]) -> bytes:
+    """
+    Encode trajectories, with their trajectory and time series as Moving Features JSON, in the binary format.
+
+    Args:
+        rows: The trajectories, as returned by the Moving Features JSON trajectory queries.
+    """
+    buffer = bytearray(MAGIC)
+    buffer.append(VERSION)
+    buffer.append(COORDINATE_DECIMALS)
+    write_varint(buffer, len(rows))
+    for row in rows:
+        encode_trajectory(buffer, row)
+    return bytes(buffer)
+
+
+def encode_trajectory(buffer: bytearray, row: dict[str, Any]) -> None:
+    """Encode a single trajectory, appending it to the buffer."""
+    metadata = {key: value for key, value in row.items() if key != "trajectory" and key not in SERIES_DECIMALS}
+    metadata_bytes = json.dumps(jsonable_encoder(metadata), separators=(",", ":")).encode()
+    write_varint(buffer, len(metadata_bytes))
+    buffer.extend(metadata_bytes)
+
+    sequences = mfjson_sequences(row["trajectory"])
+    write_varint(buffer, len(sequences))
+    timeline = []
+    previous = [0, 0, 0]
+    for sequence in sequences:
+        timestamps = [epoch_seconds(value) for value in sequence["datetimes"]]
+        buffer.append(int(sequence.get("lower_inc", True)) | int(sequence.get("upper_inc", True)) << 1)
+        write_varint(buffer, len(timestamps))
+        for timestamp, (x, y) in zip(timestamps, sequence["coordinates"]):
+            point = [timestamp, round(x * 10 ** COORDINATE_DECIMALS), round(y * 10 ** COORDINATE_DECIMALS)]
+            for index in range(3):
+                write_varint(buffer, zigzag(point[index] - previous[index]))
+            previous = point
+        timeline.extend(timestamps)
+
+    for name, decimals in SERIES_DECIMALS.items():
+        encode_series(buffer, aligned_values(row.get(name), timeline), decimals)
+
+
+def encode_series(buffer: bytearray, values: list[float | None], decimals: int) -> None:
+    """Encode the values of a time series at every point of the timeline, as a presence bitmap and deltas."""
+    bitmap = bytearray((len(values) + 7) // 8)
+    for index, value in enumerate(values):
+        if value is not None:
+            bitmap[index // 8] |= 1 << (index % 8)
+    buffer.extend(bitmap)
+    previous = 0
+    for value in values:
+        if value is not None:
+            scaled = round(value * 10 ** decimals)
+            write_varint(buffer, zigzag(scaled - previous))
+            previous = scaled
+
+
+def aligned_values(series: Any, timeline: list[int]) -> list[float | None]:
+    """
+    Get the value of a time series at every timestamp of the timeline, or None where it is not defined.
+
+    The value at a timestamp is the value of the latest instant of the series at or before it, within the same sequence.
+
+    Args:
+        series: The time series as Moving Features JSON, or None if the trajectory has no such series.
+        timeline: The timestamps of the trajectory as epoch seconds.
+    """
+    sequences = [([epoch_seconds(value) for value in sequence["datetimes"]], sequence["values"])
+                 for sequence in mfjson_sequences(series)]
+    return [value_at(sequences, timestamp) for timestamp in timeline]
+
+
+def value_at(sequences: list[tuple[list[int], list[float]]], timestamp: int) -> float | None:
+    """Get the value of the latest instant at or before the timestamp, within the sequence containing it."""
+    for timestamps, values in sequences:
+        if timestamps and timestamps[0] <= timestamp <= timestamps[-1]:
+            return values[bisect.bisect_right(timestamps, timestamp) - 1]
+    return None
+
+
+def mfjson_sequences(mfjson: Any) -> list[dict[str, Any]]:
+    """Get the sequences of a temporal value as Moving Features JSON, which may be a single sequence or a list."""
+    if mfjson is None:
+        return []
+    if isinstance(mfjson, list):
+        return [sequence for value in mfjson for sequence in mfjson_sequences(value)]
+    return [instant_as_sequence(sequence) for sequence in mfjson.get("sequences") or [mfjson]]
+
+
+def instant_as_sequence(mfjson: dict[str, Any]) -> dict[str, Any]:
+    """
+    Wrap the single timestamp and value of a temporal instant as Moving Features JSON in lists, like a sequence.
+
+    Sequences are returned as they are.
+
+    Args:
+        mfjson: A temporal instant or sequence as Moving Features JSON.
+    """
+    if not isinstance(mfjson.get("datetimes"), str):
+        return mfjson
+    sequence = {**mfjson, "datetimes": [mfjson["datetimes"]]}
+    if "coordinates" in mfjson:
+        sequence["coordinates"] = [mfjson["coordinates"]]
+    if "values" in mfjson and not isinstance(mfjson["values"], list):
+        sequence["values"] = [mfjson["values"]]
+    return sequence
+
+
+def epoch_seconds(value: str | datetime) -> int:
+    """Convert a timestamp of Moving Features JSON to seconds since the epoch."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return round(value.timestamp())
+
+
+def zigzag(value: int) -> int:
+    """Map a signed integer to an unsigned integer, such that small magnitudes give small numbers."""
+    return value << 1 if value >= 0 else (-value << 1) - 1
+
+
+def unzigzag(value: int) -> int:
+    """Map an unsigned integer back to the signed integer it was zigzag encoded from."""
+    return value >> 1 if value & 1 == 0 else -((value + 1) >> 1)
+
+
+def write_varint(buffer: bytearray, value: int) -> None:
+    """Append an unsigned integer as a little-endian base 128 varint."""
+    while value >= 0x80:
+        buffer.append(value & 0x7F | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+class Reader:
+    """Reads the values of the binary format from its bytes."""
+
+    def __init__(self, data: bytes):
+        """
+        Create a reader of the bytes.
+
+        Args:
+            data: The encoded trajectories.
+        """
+        self.data = data
+        self.position = 0
+
+    def bytes(self, count: int) -> bytes:
+        """Read a number of raw bytes."""
+        value = self.data[self.position:self.position + count]
+        self.position += count
+        return value
+
+    def varint(self) -> int:
+        """Read an unsigned varint."""
+        value = shift = 0
+        while True:
+            byte = self.data[self.position]
+            self.position += 1
+            value |= (byte & 0x7F) << shift
+            shift += 7
+            if byte < 0x80:
+                return value
+
+    def deltas(self, count: int, start: int = 0) -> Iterator[int]:
+        """Read a number of zigzag varint deltas, yielding the running values."""
+        value = start
+        for _ in range(count):
+            value += unzigzag(self.varint())
+            yield value
+
+
+def decode_trajectories(data: bytes) -> list[dict[str, Any]]:
+    """
+    Decode trajectories from the binary format, the reference decoder of the specification.
+
+    Each trajectory is decoded into its metadata, with its "sequences" of points, and the "timestamps", "coordinates"
+    and the aligned time series of all points of the sequences.
+
+    Args:
+        data: The encoded trajectories.
+    """
+    reader = Reader(data)
+    if reader.bytes(4) != MAGIC or reader.bytes(1)[0] != VERSION:
+        raise ValueError("The data is not binary trajectories of a supported version.")
+    scale = 10 ** reader.bytes(1)[0]
+    return [decode_trajectory(reader, scale) for _ in range(reader.varint())]
+
+
+def decode_trajectory(reader: Reader, scale: int) -> dict[str, Any]:
+    """Decode a single trajectory from the reader."""
+    trajectory = json.loads(reader.bytes(reader.varint()))
+    trajectory.update(sequences=[], timestamps=[], coordinates=[])
+    previous = [0, 0, 0]
+    for _ in range(reader.varint()):
+        flags = reader.bytes(1)[0]
+        count = reader.varint()
+        trajectory["sequences"].append({"lower_inc": bool(flags & 1), "upper_inc": bool(flags & 2), "count": count})
+        for _ in range(count):
+            previous = [value + unzigzag(reader.varint()) for value in previous]
+            trajectory["timestamps"].append(previous[0])
+            trajectory["coordinates"].append([previous[1] / scale, previous[2] / scale])
+
+    for name, decimals in SERIES_DECIMALS.items():
+        trajectory[name] = decode_series(reader, len(trajectory["timestamps"]), decimals)
+    return trajectory
+
+
+def decode_series(reader: Reader, count: int, decimals: int) -> list[float | None]:
+    """Decode the values of a time series at every point of the timeline."""
+    bitmap = reader.bytes((count + 7) // 8)
+    present = [bool(bitmap[index // 8] & 1 << (index % 8)) for index in range(count)]
+    values = iter(list(reader.deltas(sum(present))))
+    return [next(values) / 10 ** decimals if is_present else None for is_present in present]
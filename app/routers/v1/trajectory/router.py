@@ -1,16 +1,24 @@
 """Router for all trajectory endpoints."""
 from datetime import datetime
 from fastapi import APIRouter, Depends, Query, HTTPException, Path
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from app.dependencies import get_dw
 from sqlalchemy.orm import Session
 from app.schemas.mobile_type import MobileType
+from app.schemas.ship_type import ShipType
 from app.querybuilder import QueryBuilder
-from helper_functions import response_json, get_values_from_enum_list
+from helper_functions import response_dict, response_json, get_values_from_enum_list
 from typing import Any
 import os
 from app.schemas.time_series_representation import TimeSeriesRepresentation
 from app.schemas.trajectory import GeoJSONTrajectoryResponse, MFJSONTrajectoryResponse
+from app.schemas.trajectory_batch import TrajectoryBatch
+from app.routers.v1.trajectory.binary_trajectories import encode_trajectories
+from app.routers.v1.trajectory.simplification import Simplification, trajectory_simplification, \
+    simplified_trajectory, zoom_tolerance
+from app.routers.v1.trajectory.trajectory_batches import group_by_date, stream_trajectories
+from app.routers.v1.trajectory.vector_tiles import MAX_FEATURES, MIN_ZOOM, TILE_BUFFER, TILE_EXTENT, fetch_tile, \
+    tile_bounds, validate_temporal_span
 
 router = APIRouter()
 
@@ -23,6 +31,7 @@ async def get_trajectories_by_date_id_and_sub_id(
                             example=20070110),
         sub_id: str = Path(description="The sub id of the trajectory.",
                            example=49396455),
+        simplification: Simplification = Depends(trajectory_simplification),
         dw=Depends(get_dw)):
     """
     Get a single trajectory from a start date id and trajectory sub id.
@@ -32,6 +41,7 @@ async def get_trajectories_by_date_id_and_sub_id(
     params = {"date_id": date_id, "sub_id": sub_id}
     qb = QueryBuilder(SQL_PATH)
     qb.add_sql("select_date_id_and_sub_id.sql")
+    _format_trajectory(qb, params, "dt.trajectory", simplification)
     final_query = qb.get_query_str()
 
     # Returned as a JSON Array by FastAPI.
@@ -39,6 +49,31 @@ async def get_trajectories_by_date_id_and_sub_id(
     return JSONResponse(response_json(final_query, dw, params))
 
 
+@router.post("/trajectories/batch", response_model=list[MFJSONTrajectoryResponse])
+def get_trajectories_by_ids(
+        batch: TrajectoryBatch,
+        simplification: Simplification = Depends(trajectory_simplification)):
+    """
+    Get many trajectories by their start date id and trajectory sub id at once.
+
+    The trajectories are grouped by start date id, such that each group is a single query routed to the partition of
+    its date, and the groups are queried concurrently. The trajectories are streamed as a JSON array of MFJSON objects
+    as their groups finish, and trajectories that do not exist are left out.
+    """
+    params = {}
+    qb = QueryBuilder(SQL_PATH)
+    qb.add_sql("select_MFJSON.sql")
+    _format_trajectory(qb, params, "dt.trajectory", simplification)
+    # Both date ids are filtered on directly, such that the query is pruned to a single partition of both tables.
+    qb.add_where_from_string("ft.start_date_id = :date_id")
+    qb.add_where_from_string("dt.date_id = :date_id")
+    qb.add_where_from_string("ft.trajectory_sub_id = ANY(:sub_ids)")
+    qb.add_string("ORDER BY ft.trajectory_sub_id;")
+
+    return StreamingResponse(stream_trajectories(qb.get_query_str(), params, group_by_date(batch.ids)),
+                             media_type="application/json")
+
+
 @router.get("/trajectories/", response_model=list[GeoJSONTrajectoryResponse] | list[MFJSONTrajectoryResponse])
 async def get_trajectories(
         offset: int = Query(default=0, description="Specifies the offset of the first result to return."),
@@ -92,7 +127,10 @@ async def get_trajectories(
                                        "If not provided, the result is not cropped."),
         time_series_representation_type: TimeSeriesRepresentation =
         Query(default=TimeSeriesRepresentation.MFJSON,
-              description="The time series representation of the trajectory data in the result."),
+              description="The time series representation of the trajectory data in the result. "
+                          "The Binary representation is a compact encoding of the trajectories, "
+                          "specified in docs/binary_trajectories.md."),
+        simplification: Simplification = Depends(trajectory_simplification),
         dw: Session = Depends(get_dw)
 ):
     """Get trajectories based on the provided parameters."""
@@ -106,21 +144,8 @@ async def get_trajectories(
     # SRID is not required to be complete, and is therefore not part of this dict.
     spatial_params = {"xmin": x_min, "ymin": y_min, "xmax": x_max, "ymax": y_max}
 
-    qb = QueryBuilder(SQL_PATH)
-
-    # Check if cropped trajectories is requested, and set the parameters accordingly.
-    _validate_temporal_bounds(temporal_params)
-    _set_cropped_param(temporal_params, params, crop)
-
-    # Adding SELECT, FROM and JOIN clauses to the query, depending on the requested content type.
-    _add_trajectory_query(crop, qb, time_series_representation_type)
-
-    # If certain parameters are provided, then they are added to the query as a WHERE/AND clause, filtering results.
-    _filter_operator(qb, params, {"ds": ship_params, "dst": ship_type_params, "dns": nav_status_params,
-                                  "dt": trajectory_dim_params}, "IN")
-    _filter_operator(qb, params, {"ft": trajectory_params}, "=")
-
     # Check if any temporal or spatial parameters are provided and update the parameters accordingly.
+    _validate_temporal_bounds(temporal_params)
     temporal_bounds = _update_params_temporal(params, temporal_params)
     spatial_bounds = _update_params(params, spatial_params)
 
@@ -130,6 +155,21 @@ async def get_trajectories(
 
     _update_params(params, {"srid": srid}) if spatial_bounds else None
 
+    # Trajectories can only be cropped if there are bounds to crop them to.
+    bounds = _bounds(spatial_bounds, temporal_bounds)
+    crop = crop and bounds is not None
+
+    # Adding SELECT, FROM and JOIN clauses to the query, depending on the requested content type.
+    qb = QueryBuilder(SQL_PATH)
+    _with_bounds(qb, bounds)
+    _add_trajectory_query(crop, qb, time_series_representation_type)
+    _format_trajectory(qb, params, "dt.clipped_trajectory" if crop else "dt.trajectory", simplification, bounds)
+
+    # If certain parameters are provided, then they are added to the query as a WHERE/AND clause, filtering results.
+    _filter_operator(qb, params, {"ds": ship_params, "dst": ship_type_params, "dns": nav_status_params,
+                                  "dt": trajectory_dim_params}, "IN")
+    _filter_operator(qb, params, {"ft": trajectory_params}, "=")
+
     # If temporal or spatial bounds are provided, WHERE clauses are added to the query.
     _filter_temporal_spatial(qb, spatial_bounds, temporal_bounds)
 
@@ -138,9 +178,69 @@ async def get_trajectories(
 
     final_query = qb.get_query_str()
 
+    if time_series_representation_type == TimeSeriesRepresentation.BINARY:
+        return Response(encode_trajectories(response_dict(final_query, dw, params)),
+                        media_type="application/octet-stream")
+
     return JSONResponse(response_json(final_query, dw, params))
 
 
+@router.get("/tiles/{z}/{x}/{y}.mvt", response_class=Response,
+            responses={200: {"content": {"application/vnd.mapbox-vector-tile": {}}}})
+def get_trajectory_tile(
+        z: int = Path(ge=MIN_ZOOM, le=22, description="The zoom level of the tile."),
+        x: int = Path(ge=0, description="The column of the tile, from the west."),
+        y: int = Path(ge=0, description="The row of the tile, from the north."),
+        mobile_type: list[MobileType] | None = Query(default=None,
+                                                     description="Limits what mobile type the ships must belong to."
+                                                                 "\nIf not provided, all mobile types are included."),
+        ship_type: list[ShipType] | None = Query(default=None,
+                                                 description="Limits what ship type the ships must belong to."
+                                                             "\nIf not provided, all ship types are included."),
+        start_timestamp: datetime = Query(example="2022-01-01T00:00:00Z",
+                                          description="The inclusive timestamp that defines "
+                                                      "the start of the temporal bound."),
+        end_timestamp: datetime = Query(example="2022-01-02T00:00:00Z",
+                                        description="The inclusive timestamp that defines "
+                                                    "the end of the the temporal bound, "
+                                                    "at most 31 days after its start."),
+        stopped: bool | None = Query(default=None,
+                                     description="If the result must represents stopped ships."
+                                                 "\nIf not provided, both stopped and "
+                                                 "non-stopped ships are represented."),
+        dw: Session = Depends(get_dw)
+):
+    """
+    Get the trajectories of a tile as a Mapbox vector tile, for drawing trajectories on web maps.
+
+    The tile has a single layer "trajectories", where each feature is a trajectory cropped to the tile and the temporal
+    bound, simplified to the size of a pixel at the zoom level. The features have the attributes trajectory_sub_id,
+    date_id, ship_type, mobile_type and stopped. Tiles are served from zoom level 6, and have at most 10000 features.
+    """
+    validate_temporal_span(start_timestamp, end_timestamp)
+    params = {"z": z, "x": x, "y": y, "extent": TILE_EXTENT, "buffer": TILE_BUFFER, "max_features": MAX_FEATURES}
+    _update_params(params, tile_bounds(z, x, y))
+    temporal_bounds = _update_params_temporal(params, {"start_timestamp": start_timestamp,
+                                                       "end_timestamp": end_timestamp})
+
+    bounds = _bounds(True, temporal_bounds)
+
+    qb = QueryBuilder(SQL_PATH)
+    _with_bounds(qb, bounds)
+    qb.add_sql("select_MVT.sql")
+    _format_trajectory(qb, params, "dt.clipped_trajectory", Simplification(zoom_tolerance(z)), bounds)
+
+    _filter_operator(qb, params, {"dst": {
+        "mobile_type": get_values_from_enum_list(mobile_type, MobileType) if mobile_type else None,
+        "ship_type": get_values_from_enum_list(ship_type, ShipType) if ship_type else None,
+    }}, "IN")
+    _filter_operator(qb, params, {"ft": {"infer_stopped": stopped}}, "=")
+    _filter_temporal_spatial(qb, True, temporal_bounds)
+    qb.add_string("LIMIT :max_features\n) as tile WHERE tile.geom IS NOT NULL;")
+
+    return Response(fetch_tile(dw, qb.get_query_str(), params), media_type="application/vnd.mapbox-vector-tile")
+
+
 def _add_trajectory_query(crop: bool, qb: QueryBuilder,
                           time_series_representation_type: TimeSeriesRepresentation) -> None:
     """
@@ -151,6 +251,10 @@ def _add_trajectory_query(crop: bool, qb: QueryBuilder,
         qb: The query builder to add the clauses to.
         time_series_representation_type: The time series representation of the trajectory data in the result.
     """
+    # Binary trajectories are encoded from the Moving Features JSON of the trajectories
+    if time_series_representation_type == TimeSeriesRepresentation.BINARY:
+        time_series_representation_type = TimeSeriesRepresentation.MFJSON
+
     try:
         if crop:
             qb.add_sql(f"select_{time_series_representation_type.value}_cropped.sql")
@@ -160,6 +264,22 @@ def _add_trajectory_query(crop: bool, qb: QueryBuilder,
         raise HTTPException(status_code=400, detail="Invalid time series representation type") from e
 
 
+def _format_trajectory(qb: QueryBuilder, params: dict[str, Any], trajectory: str,
+                       simplification: Simplification, bounds: str | None = None) -> None:
+    """
+    Replace the trajectory and dim_trajectory placeholders of the query.
+
+    Args:
+        qb: The query builder containing the trajectory and dim_trajectory placeholders.
+        params: The params dict to add the parameters of the simplifications to.
+        trajectory: The SQL expression of the trajectory, before it is simplified.
+        simplification: The simplifications to apply to the trajectory.
+        bounds: The arguments of the STBOX of the bounds, or None if no bounds are provided.
+    """
+    qb.format_query({"TRAJECTORY": simplified_trajectory(trajectory, simplification, params),
+                     "DIM_TRAJECTORY": _dim_trajectory(bounds)})
+
+
 def _update_params_temporal(params: dict[str, Any], temporal_dict: dict[str, datetime]) -> bool:
     """
     Update the params dict with the values from temporal_dict.
@@ -219,55 +339,70 @@ def _filter_operator(qb: QueryBuilder, params: dict[str, Any], filter_dict: dict
                 qb.add_where(relation + "." + key, operator, value, params)
 
 
-def _filter_temporal_spatial(qb: QueryBuilder, spatial_bounds: bool, temporal_bounds: bool) -> None:
+def _bounds(spatial_bounds: bool, temporal_bounds: bool) -> str | None:
     """
-    Add temporal and spatial filters to the query if bounds are provided.
+    Get the arguments of the STBOX of the spatial and temporal bounds, or None if no bounds are provided.
 
     Args:
-        qb: The QueryBuilder object to add the WHERE/AND clause to.
         spatial_bounds: True if spatial bounds are provided, False otherwise.
         temporal_bounds: True if temporal bounds are provided, False otherwise.
     """
-    bound_placeholder = ""
-    if temporal_bounds or spatial_bounds:
-        qb.add_where_from_string("STBOX({BOUNDS}) && dt.trajectory AND "
-                                 "atstbox(dt.trajectory, STBOX({BOUNDS})) IS NOT NULL")
-        # Adding spatial filters to the query if provided
-        if spatial_bounds:
-            bound_placeholder = "ST_Transform(ST_MakeEnvelope(:xmin, :ymin, :xmax, :ymax, :srid), 4326)"
-        # Adding temporal filters to the query if provided
-        if temporal_bounds:
-            # Add partition elimination
-            qb.add_where_from_string("dt.date_id BETWEEN :start_date AND :end_date")
-            qb.add_where_from_string("ft.start_date_id BETWEEN :start_date AND :end_date")
-
-            if bound_placeholder != "":
-                bound_placeholder += ", "
-            bound_placeholder += "span(timestamp_from_date_time_id(:start_date, :start_time), " \
-                                 "timestamp_from_date_time_id(:end_date, :end_time), True, True)"
-    qb.format_query({"BOUNDS": bound_placeholder}) if bound_placeholder != "" else None
-
-
-def _set_cropped_param(temporal_params: dict[str, datetime], params: dict[str, Any], cropped: bool) -> None:
+    bounds = []
+    if spatial_bounds:
+        bounds.append("ST_Transform(ST_MakeEnvelope(:xmin, :ymin, :xmax, :ymax, :srid), 4326)")
+    if temporal_bounds:
+        bounds.append("span(timestamp_from_date_time_id(:start_date, :start_time), "
+                      "timestamp_from_date_time_id(:end_date, :end_time), True, True)")
+    return ", ".join(bounds) if bounds else None
+
+
+def _with_bounds(qb: QueryBuilder, bounds: str | None) -> None:
     """
-    Set the cropped parameter in the params dict if the trajectory must be cropped.
+    Start the query with the bounds CTE if bounds are provided, such that their STBOX is computed once per query.
 
     Args:
-        temporal_params: The temporal parameters.
-        params: The params dict to add the values to.
-        cropped: True if the trajectory must be cropped, False otherwise.
+        qb: The empty query builder to add the CTE to.
+        bounds: The arguments of the STBOX of the bounds, or None if no bounds are provided.
     """
-    if not cropped:
-        return None
-    else:
-        from_datetime = temporal_params["start_timestamp"]
-        to_datetime = temporal_params["end_timestamp"]
+    if bounds is not None:
+        qb.add_sql("with_bounds.sql")
+        qb.format_query({"BOUNDS": bounds})
+
+
+def _dim_trajectory(bounds: str | None) -> str:
+    """
+    Get the SQL of the trajectory dimension to join as "dt".
+
+    If bounds are provided, only the trajectories intersecting the bounds are joined, with the trajectory clipped to
+    the bounds as the column clipped_trajectory. The derived table is not correlated with the rest of the query,
+    such that it can be planned on each shard of dim_trajectory, and is never inlined, such that the clipped
+    trajectory is computed once per trajectory however often the query refers to it.
+
+    Args:
+        bounds: The arguments of the STBOX of the bounds, or None if no bounds are provided.
+    """
+    if bounds is None:
+        return "dim_trajectory"
+    return QueryBuilder(SQL_PATH).add_sql("clipped_dim_trajectory.sql").get_query_str().strip()
+
 
-        # Creates a string representation of a time span in a MobilityDB compatible format
-        tstzspan_string = "[" + from_datetime.strftime("%Y-%m-%d %H:%M:%S") + ", "\
-                              + to_datetime.strftime("%Y-%m-%d %H:%M:%S") + "]"
+def _filter_temporal_spatial(qb: QueryBuilder, spatial_bounds: bool, temporal_bounds: bool) -> None:
+    """
+    Add temporal and spatial filters to the query if bounds are provided.
 
-        _update_params(params, {"crop_span": tstzspan_string})
+    The bounds must have been added with _with_bounds, and dim_trajectory joined as in _dim_trajectory.
+
+    Args:
+        qb: The QueryBuilder object to add the WHERE/AND clause to.
+        spatial_bounds: True if spatial bounds are provided, False otherwise.
+        temporal_bounds: True if temporal bounds are provided, False otherwise.
+    """
+    if temporal_bounds or spatial_bounds:
+        qb.add_where_from_string("dt.clipped_trajectory IS NOT NULL")
+    # Adding partition elimination if temporal bounds are provided
+    if temporal_bounds:
+        qb.add_where_from_string("dt.date_id BETWEEN :start_date AND :end_date")
+        qb.add_where_from_string("ft.start_date_id BETWEEN :start_date AND :end_date")
 
 
 def _validate_temporal_bounds(temporal_params: dict[str, datetime]) -> None:
@@ -0,0 +1,94 @@
+"""
+Simplification of trajectories in the data warehouse, such that overview maps do not receive points they cannot show.
+
+Trajectories are stored in EPSG:4326, so they are transformed to the metric EPSG:3034 to simplify them with tolerances
+in meters, and transformed back afterwards.
+"""
+import math
+from typing import Any, NamedTuple
+
+from fastapi import HTTPException, Query
+
+# The metric spatial reference system trajectories are simplified in.
+METRIC_SRID = 3034
+# The spatial reference system trajectories are stored in.
+TRAJECTORY_SRID = 4326
+# The circumference of the earth at the equator in meters, and the size of a web map tile in pixels.
+EARTH_CIRCUMFERENCE_M = 40075016.686
+TILE_SIZE_PX = 256
+# The latitude of the spatial domain of the data warehouse, at which the size of a pixel of a zoom level is computed.
+DOMAIN_LATITUDE = 56
+
+
+class Simplification(NamedTuple):
+    """The simplifications to apply to trajectories, where None disables a simplification."""
+
+    # The Douglas-Peucker tolerance in meters.
+    tolerance: float | None = None
+    # The minimum distance in meters between consecutive points.
+    min_distance: float | None = None
+    # The minimum number of seconds between consecutive points.
+    min_time_delta: int | None = None
+
+
+def trajectory_simplification(
+        simplify_tolerance: float | None = Query(default=None, gt=0,
+                                                 description="Simplifies the trajectories with the Douglas-Peucker "
+                                                             "algorithm, removing points that deviate less than this "
+                                                             "number of meters from the simplified trajectory."),
+        zoom: int | None = Query(default=None, ge=0, le=22,
+                                 description="Simplifies the trajectories with the Douglas-Peucker algorithm, with a "
+                                             "tolerance of the size of a pixel of a web map at this zoom level. "
+                                             "Cannot be combined with simplify_tolerance."),
+        min_distance: float | None = Query(default=None, gt=0,
+                                           description="Removes points closer than this number of meters to the "
+                                                       "previous point of the trajectories."),
+        min_time_delta: int | None = Query(default=None, gt=0,
+                                           description="Removes points less than this number of seconds after the "
+                                                       "previous point of the trajectories.")
+) -> Simplification:
+    """Parse the simplification parameters of a trajectory request."""
+    if simplify_tolerance is not None and zoom is not None:
+        raise HTTPException(status_code=400, detail="Only one of simplify_tolerance and zoom may be provided.")
+    if zoom is not None:
+        simplify_tolerance = zoom_tolerance(zoom)
+    return Simplification(simplify_tolerance, min_distance, min_time_delta)
+
+
+def zoom_tolerance(zoom: int) -> float:
+    """
+    Get the size in meters of a pixel of a web map at a zoom level, within the spatial domain of the data warehouse.
+
+    Args:
+        zoom: The zoom level of the web map.
+    """
+    return EARTH_CIRCUMFERENCE_M * math.cos(math.radians(DOMAIN_LATITUDE)) / (TILE_SIZE_PX * 2 ** zoom)
+
+
+def simplified_trajectory(trajectory: str, simplification: Simplification, params: dict[str, Any]) -> str:
+    """
+    Wrap the SQL expression of a trajectory in the requested simplifications, adding their parameters to the params.
+
+    Points are first decimated in time, then by distance, and finally simplified with Douglas-Peucker.
+
+    Args:
+        trajectory: The SQL expression of the trajectory.
+        simplification: The simplifications to apply.
+        params: The params dict to add the parameters of the simplifications to.
+    """
+    if simplification.min_time_delta is not None:
+        trajectory = f"minTimeDeltaSimplify({trajectory}, make_interval(secs => :min_time_delta))"
+        params["min_time_delta"] = simplification.min_time_delta
+
+    spatial = [(function, name, value) for function, name, value in (
+        ("minDistSimplify", "min_distance", simplification.min_distance),
+        ("douglasPeuckerSimplify", "simplify_tolerance", simplification.tolerance),
+    ) if value is not None]
+    if len(spatial) == 0:
+        return trajectory
+
+    trajectory = f"transform({trajectory}, {METRIC_SRID})"
+    for function, name, value in spatial:
+        trajectory = f"{function}({trajectory}, :{name})"
+        params[name] = value
+    return f"transform({trajectory}, {TRAJECTORY_SRID})"
@@ -0,0 +1,7 @@
+(
+    -- The set-returning unnest keeps PostgreSQL from inlining the derived table into the outer query, such that
+    -- atstbox is evaluated once per trajectory rather than once per reference to clipped_trajectory.
+    SELECT bounded.*, unnest(ARRAY[atstbox(bounded.trajectory, bounds.stbox)]) as clipped_trajectory
+    FROM dim_trajectory as bounded
+    JOIN bounds ON bounds.stbox && bounded.trajectory
+)
\ No newline at end of file
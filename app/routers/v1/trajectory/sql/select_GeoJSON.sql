@@ -7,9 +7,9 @@ SELECT ft.trajectory_sub_id,
         END
        ) as eta_timestamp,
        json_build_object(
-           'trajectory', st_asgeojson(trajectory::geometry, options := 2)::jsonb
+           'trajectory', st_asgeojson(({TRAJECTORY})::geometry, options := 2)::jsonb
                              || json_build_object(
-                                 'datetimes',timestamps(trajectory))::jsonb)
+                                 'datetimes',timestamps({TRAJECTORY}))::jsonb)
            as trajectory,
        asMFJSON(dt.rot)::json as rot,
        asMFJSON(dt.heading)::json as heading,
@@ -38,7 +38,7 @@ SELECT ft.trajectory_sub_id,
            'width', ds.width
        ) as ship
 FROM fact_trajectory as ft
-JOIN dim_trajectory as dt ON ft.trajectory_sub_id = dt.trajectory_sub_id AND ft.start_date_id = dt.date_id
+JOIN {DIM_TRAJECTORY} as dt ON ft.trajectory_sub_id = dt.trajectory_sub_id AND ft.start_date_id = dt.date_id
 JOIN dim_nav_status as dns ON ft.nav_status_id = dns.nav_status_id
 JOIN dim_ship as ds ON ft.ship_id = ds.ship_id
 JOIN dim_ship_type as dst ON ds.ship_type_id = dst.ship_type_id
\ No newline at end of file
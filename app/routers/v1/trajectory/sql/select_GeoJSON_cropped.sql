@@ -7,14 +7,13 @@ SELECT ft.trajectory_sub_id,
         END
        ) as eta_timestamp,
        json_build_object(
-           'trajectory', st_asgeojson(atstbox(dt.trajectory, STBOX({BOUNDS}))::geometry, options := 2)::jsonb
+           'trajectory', st_asgeojson(({TRAJECTORY})::geometry, options := 2)::jsonb
            || json_build_object(
-               'datetimes',timestamps(
-                   atstbox(dt.trajectory, STBOX({BOUNDS}))))::jsonb)
+               'datetimes',timestamps({TRAJECTORY}))::jsonb)
            as trajectory,
-       asMFJSON(attime(dt.rot, tstzspan :crop_span))::json as rot,
-       asMFJSON(attime(dt.heading, tstzspan :crop_span))::json as heading,
-       asMFJSON(attime(dt.draught, tstzspan :crop_span))::json as draught,
+       asMFJSON(attime(dt.rot, getTime(dt.clipped_trajectory)))::json as rot,
+       asMFJSON(attime(dt.heading, getTime(dt.clipped_trajectory)))::json as heading,
+       asMFJSON(attime(dt.draught, getTime(dt.clipped_trajectory)))::json as draught,
        dt.destination,
        ft.duration,
        ft.length,
@@ -39,7 +38,7 @@ SELECT ft.trajectory_sub_id,
            'width', ds.width
        ) as ship
 FROM fact_trajectory as ft
-JOIN dim_trajectory as dt ON ft.trajectory_sub_id = dt.trajectory_sub_id AND ft.start_date_id = dt.date_id
+JOIN {DIM_TRAJECTORY} as dt ON ft.trajectory_sub_id = dt.trajectory_sub_id AND ft.start_date_id = dt.date_id
 JOIN dim_nav_status as dns ON ft.nav_status_id = dns.nav_status_id
 JOIN dim_ship as ds ON ft.ship_id = ds.ship_id
 JOIN dim_ship_type as dst ON ds.ship_type_id = dst.ship_type_id
\ No newline at end of file
@@ -6,7 +6,7 @@ SELECT ft.trajectory_sub_id,
             ELSE timestamp_from_date_time_id(ft.eta_date_id, ft.eta_time_id)
         END
        ) as eta_timestamp,
-       asMFJSON(dt.trajectory)::json as trajectory,
+       asMFJSON({TRAJECTORY})::json as trajectory,
        asMFJSON(dt.rot)::json as rot,
        asMFJSON(dt.heading)::json as heading,
        asMFJSON(dt.draught)::json as draught,
@@ -34,7 +34,7 @@ SELECT ft.trajectory_sub_id,
            'width', ds.width
        ) as ship
 FROM fact_trajectory as ft
-JOIN dim_trajectory as dt ON ft.trajectory_sub_id = dt.trajectory_sub_id AND ft.start_date_id = dt.date_id
+JOIN {DIM_TRAJECTORY} as dt ON ft.trajectory_sub_id = dt.trajectory_sub_id AND ft.start_date_id = dt.date_id
 JOIN dim_nav_status as dns ON ft.nav_status_id = dns.nav_status_id
 JOIN dim_ship as ds ON ft.ship_id = ds.ship_id
 JOIN dim_ship_type as dst ON ds.ship_type_id = dst.ship_type_id
\ No newline at end of file
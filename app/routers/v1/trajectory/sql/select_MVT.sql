@@ -0,0 +1,13 @@
+SELECT ST_AsMVT(tile, 'trajectories', :extent, 'geom')
+FROM (
+    SELECT ft.trajectory_sub_id,
+           ft.start_date_id as date_id,
+           dst.ship_type,
+           dst.mobile_type,
+           ft.infer_stopped as stopped,
+           ST_AsMVTGeom(ST_Transform(({TRAJECTORY})::geometry, 3857), ST_TileEnvelope(:z, :x, :y),
+                        :extent, :buffer, true) as geom
+    FROM fact_trajectory as ft
+    JOIN {DIM_TRAJECTORY} as dt ON ft.trajectory_sub_id = dt.trajectory_sub_id AND ft.start_date_id = dt.date_id
+    JOIN dim_ship as ds ON ft.ship_id = ds.ship_id
+    JOIN dim_ship_type as dst ON ds.ship_type_id = dst.ship_type_id
\ No newline at end of file
@@ -0,0 +1,3 @@
+WITH bounds AS MATERIALIZED (
+    SELECT STBOX({BOUNDS}) as stbox
+)
\ No newline at end of file
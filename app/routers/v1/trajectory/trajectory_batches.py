@@ -0,0 +1,61 @@
+"""
+Batches of trajectories fetched by their ids, such that many trajectories only take a few queries.
+
+The ids are grouped by their date id, which the trajectory tables are distributed and partitioned by, so the query of
+each group is routed to a single shard and partition. A few groups are queried concurrently at a time, and the
+trajectories are streamed as a JSON array as soon as their group has been queried.
+"""
+import json
+from functools import partial
+from typing import Iterator
+
+from fastapi.encoders import jsonable_encoder
+
+from app.datawarehouse import BackgroundQueries, SessionLocal
+from app.schemas.trajectory_batch import TrajectoryId
+from helper_functions import response_dict
+
+
+def group_by_date(ids: list[TrajectoryId]) -> dict[int, list[int]]:
+    """
+    Group the sub ids of trajectories by their date id, without duplicates.
+
+    Args:
+        ids: The ids of the trajectories.
+    """
+    groups = {}
+    for trajectory_id in ids:
+        sub_ids = groups.setdefault(trajectory_id.date_id, [])
+        if trajectory_id.sub_id not in sub_ids:
+            sub_ids.append(trajectory_id.sub_id)
+    return groups
+
+
+def stream_trajectories(query: str, params: dict, groups: dict[int, list[int]]) -> Iterator[str]:
+    """
+    Query the trajectories of the groups concurrently, yielding them as a JSON array in the order of the groups.
+
+    Args:
+        query: The query of the trajectories of a single date id, given the date_id and sub_ids parameters.
+        params: The other parameters of the query.
+        groups: The sub ids of the trajectories to get, by their date id.
+    """
+    yield "["
+    separator = ""
+    group_rows = BackgroundQueries(partial(fetch_group, query, {**params, "date_id": date_id, "sub_ids": sub_ids})
+                                   for date_id, sub_ids in groups.items())
+    try:
+        for rows in group_rows:
+            for row in rows:
+                yield separator + json.dumps(jsonable_encoder(row))
+                separator = ","
+    finally:
+        # Groups which have not started are not queried if the client disconnects
+        group_rows.close()
+    yield "]"
+
+
+def fetch_group(query: str, params: dict) -> list[dict]:
+    """Query the trajectories of a single date id using a new session."""
+    with SessionLocal() as session:
+        return response_dict(query, session, params)
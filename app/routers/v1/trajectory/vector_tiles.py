@@ -0,0 +1,95 @@
+"""
+Mapbox vector tiles of trajectories, such that web maps can draw the trajectories of an area at any zoom level.
+
+Tiles are addressed as z/x/y in the Web Mercator tiling scheme. The trajectories of a tile are cropped to the tile with
+a small buffer, simplified to the size of a pixel at its zoom level, and encoded with ST_AsMVT in the data warehouse.
+Encoded tiles are cached under their address, filters and the latest ETL import.
+
+Tiles are only served from MIN_ZOOM, within a temporal bound of at most MAX_TEMPORAL_SPAN, and with at most
+MAX_FEATURES trajectories, such that a single tile cannot encode every trajectory of the data warehouse.
+"""
+from datetime import datetime, timedelta
+from typing import Any
+
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.disk_cache import DiskCache
+from app.etl_imports import get_latest_import_id
+from app.single_flight import request_key
+from helper_functions import as_bytes
+
+# The spatial reference system of the tiling scheme, and half the width of its square extent in meters.
+WEB_MERCATOR_SRID = 3857
+WEB_MERCATOR_HALF_WIDTH_M = 20037508.342789244
+# The size of a tile in the integer coordinates of vector tiles, and the buffer around it in the same units.
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+# The lowest zoom level tiles are served at, where a tile covers about the spatial domain of the data warehouse.
+MIN_ZOOM = 6
+# The longest temporal bound of a tile, and the maximum number of trajectories encoded in a tile.
+MAX_TEMPORAL_SPAN = timedelta(days=31)
+MAX_FEATURES = 10000
+# The size the cached tiles may take up on disk.
+CACHE_SIZE_BYTES = 256 * 1024 ** 2
+
+tile_cache = DiskCache("trajectory_tiles", CACHE_SIZE_BYTES)
+
+
+def tile_bounds(z: int, x: int, y: int) -> dict[str, float]:
+    """
+    Get the bounds of a tile including its buffer, in EPSG:3857.
+
+    Raises an HTTPException if the tile does not exist at the zoom level.
+
+    Args:
+        z: The zoom level of the tile.
+        x: The column of the tile, from the west.
+        y: The row of the tile, from the north.
+    """
+    if x >= 2 ** z or y >= 2 ** z:
+        raise HTTPException(status_code=400, detail=f"The tile {z}/{x}/{y} does not exist.")
+    size = 2 * WEB_MERCATOR_HALF_WIDTH_M / 2 ** z
+    buffer = size * TILE_BUFFER / TILE_EXTENT
+    return {"xmin": -WEB_MERCATOR_HALF_WIDTH_M + x * size - buffer,
+            "ymin": WEB_MERCATOR_HALF_WIDTH_M - (y + 1) * size - buffer,
+            "xmax": -WEB_MERCATOR_HALF_WIDTH_M + (x + 1) * size + buffer,
+            "ymax": WEB_MERCATOR_HALF_WIDTH_M - y * size + buffer,
+            "srid": WEB_MERCATOR_SRID}
+
+
+def validate_temporal_span(start_timestamp: datetime, end_timestamp: datetime) -> None:
+    """
+    Raise an HTTPException if the temporal bound of a tile is empty or longer than MAX_TEMPORAL_SPAN.
+
+    Args:
+        start_timestamp: The inclusive start of the temporal bound.
+        end_timestamp: The inclusive end of the temporal bound.
+    """
+    if end_timestamp <= start_timestamp:
+        raise HTTPException(status_code=400, detail="The end of the temporal bound must be after its start.")
+    if end_timestamp - start_timestamp > MAX_TEMPORAL_SPAN:
+        raise HTTPException(status_code=400, detail=f"The temporal bound of a tile may be at most "
+                                                    f"{MAX_TEMPORAL_SPAN.days} days.")
+
+
+def fetch_tile(dw: Session, query: str, params: dict[str, Any]) -> bytes:
+    """
+    Fetch an encoded vector tile, from the cache if it was encoded since the latest ETL import.
+
+    Args:
+        dw: The data warehouse session.
+        query: The query returning the tile encoded with ST_AsMVT.
+        params: The parameters of the query, including the address of the tile and its filters.
+    """
+    key = request_key("trajectory_tile", {**params, "query": query, "import_id": get_latest_import_id(dw)})
+    try:
+        return tile_cache.get(key)
+    except KeyError:
+        pass
+
+    result = dw.execute(text(query), params).fetchone()
+    tile = b"" if result is None or result[0] is None else as_bytes(result[0])
+    tile_cache.set(key, tile)
+    return tile
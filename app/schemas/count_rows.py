@@ -6,3 +6,4 @@ class CountRows(BaseModel):
     """Pydantic model for portraying the number of rows in a relation."""
 
     count: int = Field(description='The number of rows in the relation.')
+    exact: bool = Field(description='Whether the count is exact, or estimated from the planner statistics.')
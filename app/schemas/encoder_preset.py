@@ -0,0 +1,14 @@
+"""Define the allowed encoder presets for multi heatmaps."""
+from enum import Enum
+
+
+class EncoderPreset(str, Enum):
+    """Enum of encoder presets, trading encoding speed for compression, named after the presets of x264."""
+
+    ultrafast = "ultrafast"
+    superfast = "superfast"
+    veryfast = "veryfast"
+    faster = "faster"
+    fast = "fast"
+    medium = "medium"
+    slow = "slow"
@@ -0,0 +1,30 @@
+"""Models for portraying asynchronous jobs."""
+from datetime import datetime
+from enum import Enum
+
+from pydantic import BaseModel, Field
+
+
+class JobStatus(str, Enum):
+    """Enum of the states of a job."""
+
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+
+
+class Job(BaseModel):
+    """Model for portraying the state and progress of an asynchronous job."""
+
+    id: str = Field(description='The id of the job.')
+    kind: str = Field(description='The kind of the job, e.g. the endpoint it was created from.')
+    status: JobStatus = Field(description='The current state of the job.')
+    frames_total: int | None = Field(description='The number of frames the job produces, once known.')
+    frames_fetched: int = Field(description='The number of frames fetched from the data warehouse.')
+    frames_rendered: int = Field(description='The number of frames rendered.')
+    error: str | None = Field(description='The reason the job failed, if it failed.')
+    created_at: datetime = Field(description='When the job was created.')
+    started_at: datetime | None = Field(description='When a worker started running the job.')
+    finished_at: datetime | None = Field(description='When the job succeeded or failed.')
+    result_url: str | None = Field(description='Where the result of the job can be downloaded, once it succeeded.')
@@ -6,4 +6,8 @@ class MultiOutputFormat(str, Enum):
     """Output format for rasters enum."""
 
     mp4 = "mp4"
+    webm = "webm"
     gif = "gif"
+    webp = "webp"
+    npz = "npz"
+    tiff = "tiff"
@@ -0,0 +1,40 @@
+"""Models for requesting raster algebra over any number of heatmaps."""
+from datetime import datetime
+
+from pydantic import BaseModel, Field
+
+from app.schemas.heatmap_type import HeatmapType
+from app.schemas.mobile_type import MobileType
+from app.schemas.ship_type import ShipType
+
+# The maximum number of heatmaps a single raster algebra request may combine.
+MAX_OPERANDS = 12
+
+
+class HeatmapOperand(BaseModel):
+    """Model for specifying a single heatmap used as an operand of raster algebra."""
+
+    heatmap_type: HeatmapType = Field(default=HeatmapType.count, description='The type of the heatmap.')
+    mobile_types: list[MobileType] = Field(default=[MobileType.class_a, MobileType.class_b],
+                                           description='Limits what mobile type the ships must belong to.')
+    ship_types: list[ShipType] = Field(default=[ShipType.cargo, ShipType.passenger],
+                                       description='Limits what ship type the ships must belong to.')
+    start_timestamp: datetime = Field(description='The inclusive timestamp that defines the start of the temporal '
+                                                  'bound.')
+    end_timestamp: datetime = Field(description='The exclusive timestamp that defines the end of the temporal bound.')
+
+
+class RasterAlgebra(BaseModel):
+    """Model for specifying heatmaps and the expression combining them pixel by pixel."""
+
+    expression: str = Field(description='A map algebra expression over the operands, where the N-th operand is '
+                                        'referenced as [rastN.val]. The grammar is that of the expressions of '
+                                        'ST_MapAlgebra.',
+                            example='([rast2.val] + [rast3.val]) / 2 - [rast1.val]')
+    operands: list[HeatmapOperand] = Field(min_items=1, max_items=MAX_OPERANDS,
+                                           description='The heatmaps combined by the expression.')
+    no_data_value: float | None = Field(default=None,
+                                        description='The value of operands without data at a pixel. If not provided, '
+                                                    'pixels where an operand referenced by the expression has no data '
+                                                    'have no data. Pixels where none of them has data never have '
+                                                    'data.')
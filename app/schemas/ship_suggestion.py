@@ -0,0 +1,11 @@
+"""Model representing a ship suggested by the beginning of its name or callsign."""
+from pydantic import BaseModel, Field
+
+
+class ShipSuggestion(BaseModel):
+    """Ship suggestion Model."""
+
+    ship_id: int = Field(description='The id of the ship.')
+    name: str | None = Field(description='The name of the ship.')
+    callsign: str | None = Field(description='The callsign of the ship.')
+    mmsi: int | None = Field(description='The mmsi of the ship.')
@@ -0,0 +1,42 @@
+"""Models for portraying the schema of a relation."""
+from datetime import datetime
+
+from pydantic import BaseModel, Field
+
+
+class ColumnMetadata(BaseModel):
+    """Model for portraying a column of a relation."""
+
+    name: str = Field(description='The name of the column.')
+    data_type: str = Field(description='The data type of the column.')
+    character_maximum_length: int | None = Field(description='The maximum length of the column, '
+                                                             'if it is a character type with a limit.')
+    numeric_precision: int | None = Field(description='The precision of the column, if it is a numeric type.')
+    nullable: bool = Field(description='Whether the column may contain null values.')
+
+
+class IndexMetadata(BaseModel):
+    """Model for portraying an index on a relation."""
+
+    name: str = Field(description='The name of the index.')
+    definition: str = Field(description='The definition of the index.')
+
+
+class PartitioningMetadata(BaseModel):
+    """Model for portraying how a relation is partitioned and distributed."""
+
+    partition_key: str | None = Field(description='The partition key of the relation, if it is partitioned.')
+    partition_count: int = Field(description='The number of partitions of the relation.')
+    distribution_column: str | None = Field(description='The column the relation is distributed by in the cluster, '
+                                                        'if it is a distributed relation.')
+
+
+class TableMetadata(BaseModel):
+    """Model for portraying the schema of a relation."""
+
+    table: str = Field(description='The name of the relation.')
+    version: str = Field(description='The version of the schema metadata, which changes when the schema changes.')
+    loaded_at: datetime = Field(description='The timestamp of when the schema metadata was introspected.')
+    columns: list[ColumnMetadata] = Field(description='The columns of the relation.')
+    indexes: list[IndexMetadata] = Field(description='The indexes on the relation.')
+    partitioning: PartitioningMetadata | None = Field(description='The partitioning of the relation.')
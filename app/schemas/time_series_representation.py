@@ -7,3 +7,4 @@ class TimeSeriesRepresentation(str, Enum):
 
     GEOJSON = "GeoJSON"
     MFJSON = "MFJSON"
+    BINARY = "Binary"
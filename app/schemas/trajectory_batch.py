@@ -0,0 +1,19 @@
+"""Models for requesting many trajectories by their ids at once."""
+from pydantic import BaseModel, Field
+
+# The maximum number of trajectories a single batch request may get.
+MAX_BATCH_SIZE = 1000
+
+
+class TrajectoryId(BaseModel):
+    """Model for the id of a single trajectory."""
+
+    date_id: int = Field(description='The start date id of the trajectory, in format: YYYYMMDD.', example=20070110)
+    sub_id: int = Field(description='The sub id of the trajectory.', example=49396455)
+
+
+class TrajectoryBatch(BaseModel):
+    """Model for specifying the trajectories of a batch request."""
+
+    ids: list[TrajectoryId] = Field(min_items=1, max_items=MAX_BATCH_SIZE,
+                                    description='The ids of the trajectories to get.')
@@ -0,0 +1,16 @@
+"""Model for portraying the statistics of a heatmap inside a zone."""
+from pydantic import BaseModel, Field
+
+
+class ZoneStatistics(BaseModel):
+    """Model for portraying the statistics of the pixel values of a heatmap inside a zone."""
+
+    zone: str = Field(description='The name of the ENC cell, or the bounding box, of the zone.')
+    period: str | None = Field(description='The period of the statistics, if a temporal resolution is requested.')
+    count: int = Field(description='The number of pixels with data inside the zone.')
+    sum: float = Field(description='The sum of the pixel values inside the zone.')
+    mean: float | None = Field(description='The mean of the pixel values inside the zone.')
+    min: float | None = Field(description='The minimum of the pixel values inside the zone.')
+    max: float | None = Field(description='The maximum of the pixel values inside the zone.')
+    percentiles: dict[str, float | None] = Field(description='The requested percentiles of the pixel values inside '
+                                                             'the zone, by percentile.')
@@ -0,0 +1,144 @@
+"""
+In-process index of the names and callsigns of the ships in the data warehouse, for typeahead suggestions.
+
+The index is a flattened prefix trie: the normalised name, callsign and every word of the name of each ship are kept
+as one sorted list of keys, such that the keys starting with a prefix are the consecutive range found with two binary
+searches. A key equal to the prefix sorts before its extensions, so exact matches are suggested first.
+The index is loaded on startup, and reloaded in the background once the ETL has imported new data, which may include
+new ships. Suggestions keep being made from the previous index while it is reloaded.
+"""
+import bisect
+import logging
+import os
+import threading
+from typing import NamedTuple
+
+from sqlalchemy.orm import Session
+
+from app.datawarehouse import SessionLocal
+from app.etl_imports import get_latest_import_id
+from app.querybuilder import QueryBuilder
+
+SQL_PATH = os.path.join(os.path.dirname(__file__), "sql")
+
+logger = logging.getLogger(__name__)
+
+
+class ShipName(NamedTuple):
+    """The name, callsign and MMSI of a ship."""
+
+    ship_id: int
+    name: str | None
+    callsign: str | None
+    mmsi: int | None
+
+
+class ShipNameIndex(NamedTuple):
+    """The sorted keys of the index, the ship of each key, and the ETL import the index was loaded at."""
+
+    keys: list[str]
+    ships: list[ShipName]
+    import_id: int
+
+
+_index: ShipNameIndex | None = None
+# Held while the index is loaded, such that it is only loaded by one thread at a time.
+_lock = threading.Lock()
+
+
+def normalise(value: str) -> str:
+    """Normalise a name for case insensitive prefix matching, collapsing consecutive whitespace."""
+    return " ".join(value.casefold().split())
+
+
+def build_index(ships: list[ShipName], import_id: int) -> ShipNameIndex:
+    """
+    Build the index of the names and callsigns of ships.
+
+    Args:
+        ships: The ships to index.
+        import_id: The id of the ETL import the ships were loaded at.
+    """
+    entries = set()
+    for ship in ships:
+        name = normalise(ship.name or "")
+        words = name.split(" ")
+        keys = {name, normalise(ship.callsign or "")} | {" ".join(words[index:]) for index in range(1, len(words))}
+        entries.update((key, ship) for key in keys if key)
+
+    entries = sorted(entries, key=lambda entry: (entry[0], entry[1].ship_id))
+    return ShipNameIndex([key for key, _ in entries], [ship for _, ship in entries], import_id)
+
+
+def load_ship_names(dw: Session) -> ShipNameIndex:
+    """
+    Load the names and callsigns of all ships, replacing the index.
+
+    Args:
+        dw: The data warehouse session.
+    """
+    global _index
+
+    import_id = get_latest_import_id(dw)
+    query = QueryBuilder(SQL_PATH).add_sql("ship_names.sql").get_query_text()
+    ships = [ShipName(*row) for row in dw.execute(query).fetchall()]
+    dw.commit()
+
+    _index = build_index(ships, import_id)
+    return _index
+
+
+def _get_index(dw: Session) -> ShipNameIndex:
+    """
+    Get the index, loading it if it has not been loaded yet.
+
+    If the ETL has imported new data since the index was loaded, the index is reloaded in the background,
+    and the previous index is returned in the meantime.
+    """
+    index = _index
+    if index is None:
+        with _lock:
+            if _index is None:
+                load_ship_names(dw)
+        return _index
+
+    if index.import_id != get_latest_import_id(dw) and _lock.acquire(blocking=False):
+        threading.Thread(target=_reload_ship_names, name="ship-names-reloader", daemon=True).start()
+    return index
+
+
+def _reload_ship_names() -> None:
+    """Reload the index using a new session, releasing the lock acquired for the reload once done."""
+    try:
+        with SessionLocal() as dw:
+            load_ship_names(dw)
+    except Exception:
+        logger.exception("Could not reload the ship names.")
+    finally:
+        _lock.release()
+
+
+def suggest_ships(dw: Session, prefix: str, limit: int) -> list[ShipName]:
+    """
+    Suggest the ships with a name, callsign or word of their name starting with a prefix, ignoring case.
+
+    Ships are ordered by their first matching key, so exact matches come first, followed by the ships of the keys
+    continuing the prefix in alphabetical order.
+
+    Args:
+        dw: The data warehouse session, only used if the index has to be loaded.
+        prefix: The prefix typed so far.
+        limit: The maximum number of ships to suggest.
+    """
+    index = _get_index(dw)
+    prefix = normalise(prefix)
+    start = bisect.bisect_left(index.keys, prefix)
+    end = bisect.bisect_left(index.keys, prefix + "\U0010ffff", lo=start)
+
+    suggestions = {}
+    for position in range(start, end):
+        ship = index.ships[position]
+        suggestions.setdefault(ship.ship_id, ship)
+        if len(suggestions) == limit:
+            break
+    return list(suggestions.values())
@@ -0,0 +1,233 @@
+"""
+Index of the ships present in each coarse cell on each day, used to pre-filter spatio-temporal ship searches.
+
+The index maps a cell of PRESENCE_CELL_SIZE meters and a date id to the sorted ids of the ships that entered a cell
+of the finest cell facts inside it on that date. Entering a cell of any size means entering one of the finest cells
+inside it at the same time, so the ships of the cell facts of any size within some bounds are always among the ships
+of the index within the same bounds, extended by the size of a cell.
+
+The index is stored in an SQLite database on local disk, shared by all worker processes of the API on the same
+machine. A background thread in one of the processes indexes every date imported by the ETL, one date at a time,
+and dates imported again are indexed again. A date range is only answered from the index once the latest import of
+all its dates is indexed, such that the index never leaves out a ship.
+"""
+import fcntl
+import logging
+import math
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.datawarehouse import SessionLocal
+from app.etl_imports import IMPORT_CHECK_INTERVAL_SEC, get_import_ids_by_date, get_latest_import_id
+from app.querybuilder import QueryBuilder
+from helper_functions import get_cache_directory
+
+SQL_PATH = os.path.join(os.path.dirname(__file__), "sql")
+
+# The size in meters of the cells of the index, and of the cell facts it is built from.
+PRESENCE_CELL_SIZE = 5000
+SOURCE_CELL_SIZE = 50
+# The maximum number of ships a search is pre-filtered with, above which the pre-filter would cost more than it saves.
+MAX_CANDIDATE_SHIPS = 10000
+# The maximum number of cells and dates of the index read by a search, above which reading them costs too much.
+MAX_PRESENCE_ROWS = 20000
+# The range of date ids covering all dates of the data warehouse.
+ALL_DATE_IDS = (0, 99991231)
+
+logger = logging.getLogger(__name__)
+
+# Event stopping the background thread of this process.
+_stop_event: threading.Event | None = None
+
+
+def candidate_ship_ids(dw: Session, bounds: tuple[float, float, float, float] | None, start_date_id: int,
+                       end_date_id: int, margin: float) -> list[int] | None:
+    """
+    Get the ids of the ships that may be present within the bounds and dates, or None if the index cannot tell.
+
+    The index cannot tell if no bounds are provided, if a date in the range has not been indexed since its latest
+    import, if more than MAX_CANDIDATE_SHIPS ships may be present, or if more than MAX_PRESENCE_ROWS cells and dates
+    of the index are within the bounds and dates. Reading the index stops as soon as it cannot tell.
+
+    Args:
+        dw: The data warehouse session.
+        bounds: The bounds to search within as min x, min y, max x and max y in EPSG:3034, or None to search everywhere.
+        start_date_id: The inclusive first date id to search within.
+        end_date_id: The inclusive last date id to search within.
+        margin: The distance in meters to extend the bounds by, i.e. the size of the cells of the search.
+    """
+    # Without bounds, nearly every ship of the dates is a candidate, so the index cannot narrow the search
+    if bounds is None:
+        return None
+
+    import_ids = get_import_ids_by_date(dw, start_date_id, end_date_id)
+    with _database() as connection:
+        indexed = dict(connection.execute("SELECT date_id, import_id FROM indexed_date WHERE date_id BETWEEN ? AND ?",
+                                          (start_date_id, end_date_id)).fetchall())
+        if any(indexed.get(date_id, -1) < import_id for date_id, import_id in import_ids.items()):
+            return None
+
+        rows = connection.execute(
+            "SELECT ship_ids FROM presence WHERE date_id BETWEEN ? AND ? "
+            "AND cell_x BETWEEN ? AND ? AND cell_y BETWEEN ? AND ? LIMIT ?",
+            [start_date_id, end_date_id, *presence_cell_range(bounds[0], bounds[2], margin),
+             *presence_cell_range(bounds[1], bounds[3], margin), MAX_PRESENCE_ROWS + 1]
+        )
+        candidates = set()
+        for count, (ship_ids,) in enumerate(rows, start=1):
+            candidates.update(decode_ship_ids(ship_ids).tolist())
+            if len(candidates) > MAX_CANDIDATE_SHIPS or count > MAX_PRESENCE_ROWS:
+                return None
+
+    return sorted(candidates)
+
+
+def presence_cell_range(min_value: float, max_value: float, margin: float) -> list[int]:
+    """Get the first and last index of the cells of the index along an axis, covering the range and its margin."""
+    return [math.floor((min_value - margin) / PRESENCE_CELL_SIZE),
+            math.floor((max_value + margin) / PRESENCE_CELL_SIZE)]
+
+
+def refresh_ship_presence(dw: Session, stop: threading.Event | None = None) -> int:
+    """
+    Index every date imported by the ETL since it was last indexed, one date at a time.
+
+    Args:
+        dw: The data warehouse session.
+        stop: An event stopping the refresh once the current date is indexed, if set.
+
+    Returns: the number of dates indexed.
+    """
+    import_ids = get_import_ids_by_date(dw, *ALL_DATE_IDS)
+    with _database() as connection:
+        indexed = dict(connection.execute("SELECT date_id, import_id FROM indexed_date").fetchall())
+
+    outdated = sorted(date_id for date_id, import_id in import_ids.items() if indexed.get(date_id, -1) < import_id)
+    for count, date_id in enumerate(outdated):
+        if stop is not None and stop.is_set():
+            return count
+        index_date(dw, date_id, import_ids[date_id])
+    return len(outdated)
+
+
+def index_date(dw: Session, date_id: int, import_id: int) -> None:
+    """
+    Index the ships present in each cell on a date, replacing the previous index of the date.
+
+    Args:
+        dw: The data warehouse session.
+        date_id: The date id to index.
+        import_id: The id of the latest ETL import of the date.
+    """
+    qb = QueryBuilder(SQL_PATH).add_sql("ship_presence_on_date.sql")
+    qb.format_query({"SOURCE_CELL_SIZE": SOURCE_CELL_SIZE})
+    rows = dw.execute(qb.get_query_text(), {
+        "date_id": date_id,
+        "source_cells_per_cell": PRESENCE_CELL_SIZE // SOURCE_CELL_SIZE,
+    }).fetchall()
+    dw.commit()
+
+    with _database() as connection:
+        connection.execute("DELETE FROM presence WHERE date_id = ?", (date_id,))
+        connection.executemany("INSERT INTO presence (date_id, cell_x, cell_y, ship_ids) VALUES (?, ?, ?, ?)",
+                               [(date_id, cell_x, cell_y, encode_ship_ids(ship_ids))
+                                for cell_x, cell_y, ship_ids in rows])
+        connection.execute("INSERT OR REPLACE INTO indexed_date (date_id, import_id) VALUES (?, ?)",
+                           (date_id, import_id))
+
+
+def encode_ship_ids(ship_ids: list[int]) -> bytes:
+    """Encode ship ids as the bytes of their sorted array."""
+    return np.unique(np.asarray(ship_ids, dtype="<i8")).tobytes()
+
+
+def decode_ship_ids(value: bytes) -> np.ndarray:
+    """Decode ship ids encoded with encode_ship_ids."""
+    return np.frombuffer(value, dtype="<i8")
+
+
+def start_ship_presence_indexer() -> None:
+    """Start the background thread keeping the index up to date with the ETL imports, in this process."""
+    global _stop_event
+    _stop_event = threading.Event()
+    threading.Thread(target=_index, args=(_stop_event,), name="ship-presence-indexer", daemon=True).start()
+
+
+def stop_ship_presence_indexer() -> None:
+    """Stop the background thread of this process, once it has finished indexing its current date."""
+    if _stop_event is not None:
+        _stop_event.set()
+
+
+def _index(stop: threading.Event) -> None:
+    """Refresh the index whenever a new ETL import may have happened, while no other process is refreshing it."""
+    latest_import_id = None
+    while not stop.is_set():
+        try:
+            with _indexer_lock() as locked:
+                if locked:
+                    latest_import_id = _refresh_if_imported(latest_import_id, stop)
+        except Exception:
+            logger.warning("Could not refresh the ship presence index.", exc_info=True)
+        stop.wait(IMPORT_CHECK_INTERVAL_SEC)
+
+
+def _refresh_if_imported(indexed_import_id: int | None, stop: threading.Event) -> int | None:
+    """Refresh the index if the latest ETL import is not the one indexed, returning the latest import id."""
+    with SessionLocal() as dw:
+        latest_import_id = get_latest_import_id(dw)
+        if latest_import_id != indexed_import_id:
+            refresh_ship_presence(dw, stop)
+    return None if stop.is_set() else latest_import_id
+
+
+@contextmanager
+def _indexer_lock() -> Iterator[bool]:
+    """Try to take the exclusive lock of the indexer, yielding whether it was taken."""
+    lock_fd = os.open(os.path.join(get_cache_directory("ship_presence"), "indexer.lock"), os.O_RDWR | os.O_CREAT)
+    try:
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+    finally:
+        os.close(lock_fd)
+
+
+@contextmanager
+def _database() -> Iterator[sqlite3.Connection]:
+    """Connect to the index database within a transaction, creating the database if it does not exist."""
+    connection = sqlite3.connect(os.path.join(get_cache_directory("ship_presence"), "presence.sqlite"), timeout=30)
+    try:
+        _initialise(connection)
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+
+def _initialise(connection: sqlite3.Connection) -> None:
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS presence (
+            date_id INTEGER NOT NULL,
+            cell_x INTEGER NOT NULL,
+            cell_y INTEGER NOT NULL,
+            ship_ids BLOB NOT NULL,
+            PRIMARY KEY (date_id, cell_x, cell_y)
+        ) WITHOUT ROWID
+    """)
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS indexed_date (
+            date_id INTEGER PRIMARY KEY,
+            import_id INTEGER NOT NULL
+        )
+    """)
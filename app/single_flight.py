@@ -0,0 +1,143 @@
+"""
+Coalescing of identical in-flight requests, across all worker processes of the API on the same machine.
+
+The first request for a key becomes the leader, and computes the result while holding an exclusive file lock for
+the key. Identical requests arriving in the meantime block on the lock, and once it is released they read the result
+the leader stored next to the lock, instead of computing it again.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, TypeVar, Any
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+
+from helper_functions import get_cache_directory
+
+# The number of seconds a result is kept, such that requests waiting for the leader can read it.
+RESULT_TTL_SEC = 30
+
+# Type variable for the result of the function passed to single_flight.
+T = TypeVar('T')
+
+
+def request_key(name: str, params: dict[str, Any]) -> str:
+    """
+    Create a key identifying a request from its name and parameters.
+
+    The parameters are normalised, such that requests only differing in e.g. the order of list parameters,
+    or the timezone of timestamps, get the same key.
+
+    Args:
+        name: The name of the request, e.g. the name of the endpoint.
+        params: The parameters of the request.
+    """
+    normalised = json.dumps(jsonable_encoder({key: _normalise(value) for key, value in params.items()}),
+                            sort_keys=True)
+    return hashlib.sha256(f"{name}:{normalised}".encode()).hexdigest()
+
+
+def _normalise(value: Any) -> Any:
+    """Normalise a request parameter, converting timestamps to UTC and sorting lists."""
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc)
+    if isinstance(value, (list, tuple, set)):
+        return sorted(jsonable_encoder(list(value)), key=json.dumps)
+    return value
+
+
+def single_flight(key: str, func: Callable[[], T]) -> T:
+    """
+    Execute a function, unless an identical execution is in flight, in which case its result is returned instead.
+
+    The result must be picklable. HTTPExceptions raised by the function are shared like results, except
+    "429 Too Many Requests", as the server may have capacity again once the waiting requests get the lock. Other
+    exceptions are not shared either, such that the waiting requests retry the execution themselves.
+
+    Args:
+        key: The key identifying the execution, see request_key.
+        func: The zero argument function to execute.
+    """
+    directory = get_cache_directory("single_flight")
+    lock_path = os.path.join(directory, f"{key}.lock")
+    result_path = os.path.join(directory, f"{key}.result")
+
+    lock_fd = _acquire_lock(lock_path)
+    try:
+        outcome = _read_result(result_path)
+        if outcome is None:
+            outcome = _execute(func)
+            _write_result(directory, result_path, outcome)
+            _remove_expired_results(directory)
+    finally:
+        # Remove the lock file while holding the lock, waiting requests then reopen the lock file and find the result
+        os.unlink(lock_path)
+        os.close(lock_fd)
+
+    if isinstance(outcome, HTTPException):
+        raise outcome
+    return outcome
+
+
+def _acquire_lock(lock_path: str) -> int:
+    """Acquire an exclusive lock on the lock file, blocking until it is released by other requests."""
+    while True:
+        lock_fd = os.open(lock_path, os.O_CREAT | os.O_RDWR)
+        fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        # The lock file may have been removed by the previous holder, in which case the lock must be taken again
+        if _is_same_file(lock_fd, lock_path):
+            return lock_fd
+        os.close(lock_fd)
+
+
+def _is_same_file(fd: int, path: str) -> bool:
+    """Check whether the file descriptor still refers to the file at the given path."""
+    try:
+        return os.path.samestat(os.fstat(fd), os.stat(path))
+    except FileNotFoundError:
+        return False
+
+
+def _execute(func: Callable[[], T]) -> T | HTTPException:
+    """Execute the function, returning HTTPExceptions instead of raising them, such that they can be shared."""
+    try:
+        return func()
+    except HTTPException as e:
+        if e.status_code == 429:
+            raise
+        return e
+
+
+def _read_result(result_path: str) -> Any | None:
+    """Read a result stored by a previous leader, if it has not expired."""
+    try:
+        if time.time() - os.path.getmtime(result_path) > RESULT_TTL_SEC:
+            return None
+        with open(result_path, "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_result(directory: str, result_path: str, outcome: Any) -> None:
+    """Store the result atomically, such that waiting requests never read a partially written result."""
+    with tempfile.NamedTemporaryFile(dir=directory, suffix=".tmp", delete=False) as f:
+        pickle.dump(outcome, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(f.name, result_path)
+
+
+def _remove_expired_results(directory: str) -> None:
+    """Remove the results which have expired."""
+    now = time.time()
+    for entry in os.scandir(directory):
+        try:
+            if entry.name.endswith(".result") and now - entry.stat().st_mtime > RESULT_TTL_SEC:
+                os.unlink(entry.path)
+        except FileNotFoundError:
+            continue
@@ -0,0 +1,8 @@
+SELECT
+    name,
+    ST_XMin(geom) AS min_x,
+    ST_YMin(geom) AS min_y,
+    ST_XMax(geom) AS max_x,
+    ST_YMax(geom) AS max_y,
+    ST_AsGeoJSON(ST_SimplifyPreserveTopology(geom, :simplify_tolerance)) AS geometry
+FROM reference_geometries;
\ No newline at end of file
@@ -0,0 +1,2 @@
+SELECT ship_id, name, callsign, mmsi
+FROM dim_ship;
\ No newline at end of file
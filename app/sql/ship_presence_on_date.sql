@@ -0,0 +1,6 @@
+SELECT fc.cell_x / :source_cells_per_cell AS cell_x,
+       fc.cell_y / :source_cells_per_cell AS cell_y,
+       array_agg(DISTINCT fc.ship_id) AS ship_ids
+FROM fact_cell_{SOURCE_CELL_SIZE}m fc
+WHERE fc.entry_date_id = :date_id
+GROUP BY 1, 2
\ No newline at end of file
@@ -0,0 +1,12 @@
+SELECT
+    table_name,
+    column_name,
+    -- Types from extensions such as PostGIS and MobilityDB are reported as USER-DEFINED, use their name instead
+    CASE WHEN data_type = 'USER-DEFINED' THEN udt_name ELSE data_type END AS data_type,
+    character_maximum_length,
+    numeric_precision,
+    is_nullable = 'YES' AS nullable
+FROM information_schema.columns
+WHERE table_schema = current_schema()
+AND table_name = ANY (:relations)
+ORDER BY table_name, ordinal_position;
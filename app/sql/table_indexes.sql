@@ -0,0 +1,8 @@
+SELECT
+    tablename AS table_name,
+    indexname AS index_name,
+    indexdef AS definition
+FROM pg_indexes
+WHERE schemaname = current_schema()
+AND tablename = ANY (:relations)
+ORDER BY tablename, indexname;
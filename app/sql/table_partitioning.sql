@@ -0,0 +1,13 @@
+SELECT
+    c.relname AS table_name,
+    pg_get_partkeydef(c.oid) AS partition_key,
+    (SELECT count(*) FROM pg_inherits i WHERE i.inhparent = c.oid) AS partition_count,
+    (
+        SELECT column_to_column_name(pdp.logicalrelid, pdp.partkey)
+        FROM pg_dist_partition pdp
+        WHERE pdp.logicalrelid = c.oid
+    ) AS distribution_column
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = current_schema()
+AND c.relname = ANY (:relations);
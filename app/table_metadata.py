@@ -0,0 +1,95 @@
+"""
+Cache of the schema metadata of the data warehouse relations.
+
+The schemas only change on migrations, so they are introspected once through information_schema and the system
+catalogs, and served from memory afterwards. The cached metadata is stamped with a version, derived from its
+contents, such that clients can detect when the schema has changed.
+"""
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+from sqlalchemy.orm import Session
+
+from app.querybuilder import QueryBuilder
+from app.schemas.relations import DWRELATION, MISCRELATION
+from app.schemas.table_metadata import TableMetadata, ColumnMetadata, IndexMetadata, PartitioningMetadata
+
+SQL_PATH = os.path.join(os.path.dirname(__file__), "sql")
+
+RELATIONS = [relation.value for relation in DWRELATION] + [relation.value for relation in MISCRELATION]
+
+_table_metadata: dict[str, TableMetadata] | None = None
+_lock = threading.Lock()
+
+
+def load_table_metadata(dw: Session) -> dict[str, TableMetadata]:
+    """
+    Introspect the schema of all data warehouse and miscellaneous relations, and replace the cached metadata.
+
+    Args:
+        dw: The data warehouse session.
+    """
+    global _table_metadata
+
+    params = {"relations": RELATIONS}
+    columns = _fetch_grouped(dw, "table_columns.sql", params)
+    indexes = _fetch_grouped(dw, "table_indexes.sql", params)
+    partitioning = _fetch_grouped(dw, "table_partitioning.sql", params)
+
+    loaded_at = datetime.now(timezone.utc)
+    metadata = {}
+    for relation in RELATIONS:
+        table_columns = [ColumnMetadata(name=row.pop("column_name"), **row) for row in columns.get(relation, [])]
+        table_indexes = [IndexMetadata(name=row["index_name"], definition=row["definition"])
+                         for row in indexes.get(relation, [])]
+        table_partitioning = [PartitioningMetadata(**row) for row in partitioning.get(relation, [])]
+        metadata[relation] = TableMetadata(
+            table=relation,
+            version=_version_of(table_columns, table_indexes, table_partitioning),
+            loaded_at=loaded_at,
+            columns=table_columns,
+            indexes=table_indexes,
+            partitioning=table_partitioning[0] if table_partitioning else None,
+        )
+
+    _table_metadata = metadata
+    return metadata
+
+
+def get_table_metadata(dw: Session, relation: DWRELATION | MISCRELATION) -> TableMetadata:
+    """
+    Get the cached schema metadata of a relation, introspecting the schemas if they have not been loaded yet.
+
+    Args:
+        dw: The data warehouse session, only used if the metadata has not been loaded yet.
+        relation: The relation to get the metadata of.
+    """
+    if _table_metadata is None:
+        with _lock:
+            if _table_metadata is None:
+                load_table_metadata(dw)
+    return _table_metadata[relation.value]
+
+
+def _fetch_grouped(dw: Session, sql_file: str, params: dict) -> dict[str, list[dict]]:
+    """Execute a metadata query and group the resulting rows by their table_name column."""
+    query = QueryBuilder(SQL_PATH).add_sql(sql_file).get_query_text()
+    grouped = {}
+    for row in dw.execute(query, params).mappings():
+        row = dict(row)
+        grouped.setdefault(row.pop("table_name"), []).append(row)
+    return grouped
+
+
+def _version_of(columns: list[ColumnMetadata], indexes: list[IndexMetadata],
+                partitioning: list[PartitioningMetadata]) -> str:
+    """Derive a version stamp from the contents of the metadata of a relation."""
+    contents = json.dumps([
+        [c.dict() for c in columns],
+        [i.dict() for i in indexes],
+        [p.dict() for p in partitioning],
+    ], sort_keys=True)
+    return hashlib.sha256(contents.encode()).hexdigest()[:16]
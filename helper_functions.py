@@ -2,7 +2,7 @@
 import configparser
 import os
 from fastapi.encoders import jsonable_encoder
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Tuple, Callable, TypeVar, Any, List, Type
 from enum import Enum
 from time import perf_counter
@@ -145,3 +145,70 @@ def get_values_from_enum_list(enum_list: List[Enum], enum_type: Type[Enum]) -> L
     Returns: A list of values from an enum list.
     """
     return [enum_type(value).value for value in enum_list]
+
+
+def get_cache_directory(name: str) -> str:
+    """
+    Get the directory on local disk used by the cache with the given name, creating it if it does not exist.
+
+    Args:
+        name: The name of the cache, used as the name of its subdirectory in the configured cache directory.
+    """
+    directory = os.path.join(get_config()['Cache']['directory'], name)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def as_bytes(buffer: bytes | memoryview) -> bytes:
+    """
+    Get the bytes of a binary value returned by the database driver, copying them at most once.
+
+    The driver returns binary values as memoryviews over its own buffers. Views spanning a whole bytes object are
+    unwrapped without copying, other views are copied into bytes once, which can then be shared without further copies,
+    e.g. with GDAL through rasterio's MemoryFile, or as the body of a response.
+
+    Args:
+        buffer: The binary value returned by the driver.
+    """
+    if isinstance(buffer, bytes):
+        return buffer
+    if isinstance(buffer.obj, bytes) and buffer.contiguous and buffer.nbytes == len(buffer.obj):
+        return buffer.obj
+    return buffer.tobytes()
+
+
+def date_time_ids(timestamp: datetime, round_up: bool = False) -> tuple[int, int]:
+    """
+    Get the date id and time id of a timestamp, in UTC if the timestamp is timezone aware.
+
+    Time ids have a resolution of seconds, so fractions of a second are truncated, or rounded up to the next second.
+
+    Args:
+        timestamp: The timestamp to get the ids of.
+        round_up: Whether to round fractions of a second up instead of truncating them.
+    """
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc)
+    if round_up and timestamp.microsecond != 0:
+        timestamp = timestamp.replace(microsecond=0) + timedelta(seconds=1)
+    return int(timestamp.strftime("%Y%m%d")), int(timestamp.strftime("%H%M%S"))
+
+
+def temporal_bound_ids(start_timestamp: datetime, end_timestamp: datetime, end_inclusive: bool = False) \
+        -> dict[str, int]:
+    """
+    Get the query parameters of the date and time ids of a temporal bound.
+
+    The ids are compared with the date and time ids of facts directly, e.g.
+    (date_id, time_id) >= (:start_date_id, :start_time_id), such that indexes and partition pruning can be used
+    instead of converting the ids of every fact to a timestamp.
+
+    Args:
+        start_timestamp: The inclusive start of the temporal bound.
+        end_timestamp: The end of the temporal bound.
+        end_inclusive: Whether the end of the temporal bound is inclusive, or exclusive.
+    """
+    start_date_id, start_time_id = date_time_ids(start_timestamp, round_up=True)
+    end_date_id, end_time_id = date_time_ids(end_timestamp, round_up=not end_inclusive)
+    return {'start_date_id': start_date_id, 'start_time_id': start_time_id,
+            'end_date_id': end_date_id, 'end_time_id': end_time_id}
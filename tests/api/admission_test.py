@@ -0,0 +1,173 @@
+import datetime
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi import HTTPException
+from fastapi.responses import PlainTextResponse
+from fastapi.testclient import TestClient
+
+from app.admission import AdmissionController, estimate_heatmap_cost
+from app.api_main import app
+from app.routers.v1.heatmap import heatmap
+from app.routers.v1.heatmap.periods import get_periods
+from app.schemas.multi_output_format import MultiOutputFormat
+from app.schemas.temporal_resolution import TemporalResolution
+
+utc = datetime.timezone.utc
+
+
+def test_periods_are_clipped_to_the_temporal_bound():
+    periods = get_periods(datetime.datetime(2022, 1, 15, 6, tzinfo=utc), datetime.datetime(2022, 4, 1, tzinfo=utc),
+                          TemporalResolution.monthly)
+    assert periods == [
+        (datetime.datetime(2022, 1, 15, 6, tzinfo=utc), datetime.datetime(2022, 2, 1, tzinfo=utc)),
+        (datetime.datetime(2022, 2, 1, tzinfo=utc), datetime.datetime(2022, 3, 1, tzinfo=utc)),
+        (datetime.datetime(2022, 3, 1, tzinfo=utc), datetime.datetime(2022, 4, 1, tzinfo=utc)),
+    ]
+
+
+def test_weekly_periods_start_on_mondays():
+    periods = get_periods(datetime.datetime(2022, 1, 1, tzinfo=utc), datetime.datetime(2022, 1, 11, tzinfo=utc),
+                          TemporalResolution.weekly)
+    assert [start.day for start, _ in periods] == [1, 3, 10]
+
+
+def test_cost_grows_with_frames_and_resolution():
+    start = datetime.datetime(2022, 1, 1, tzinfo=utc)
+    end = datetime.datetime(2023, 1, 1, tzinfo=utc)
+    single = estimate_heatmap_cost(1000, 1000, 1000, start, end)
+    daily = estimate_heatmap_cost(1000, 1000, 1000, start, end, TemporalResolution.daily)
+    assert single == 2 * (365 + 1)
+    assert daily == 2 * (365 + 365)
+    assert estimate_heatmap_cost(1000, 1000, 50, start, end) > single
+
+
+def test_cheap_requests_bypass_heavy_slots():
+    controller = AdmissionController(heavy_slots=0, queue_timeout_sec=0)
+    with controller.admit("client", 1):
+        pass
+
+
+def test_expensive_requests_are_rejected():
+    controller = AdmissionController()
+    with pytest.raises(HTTPException) as e:
+        with controller.admit("client", 10 ** 9):
+            pass
+    assert e.value.status_code == 400
+
+
+def test_client_budget_is_enforced():
+    controller = AdmissionController(heavy_slots=2, max_client_requests=1)
+    with controller.admit("client", 100):
+        with pytest.raises(HTTPException) as e:
+            with controller.admit("client", 100):
+                pass
+        assert e.value.status_code == 429
+        assert "Retry-After" in e.value.headers
+        with controller.admit("other client", 100):
+            pass
+    with controller.admit("client", 100):
+        pass
+
+
+def test_admitted_requests_do_not_hold_heavy_slots():
+    controller = AdmissionController(heavy_slots=0, queue_timeout_sec=0)
+    with controller.admit("client", 100):
+        pass
+
+
+def test_queued_requests_are_rejected_after_timeout():
+    controller = AdmissionController(heavy_slots=1, queue_timeout_sec=0.1)
+    with controller.heavy_slot(100):
+        with pytest.raises(HTTPException) as e:
+            with controller.heavy_slot(100):
+                pass
+        assert e.value.status_code == 429
+
+
+def test_queued_requests_are_admitted_once_a_slot_is_free():
+    controller = AdmissionController(heavy_slots=1, queue_timeout_sec=5)
+    admitted = threading.Event()
+    release = threading.Event()
+
+    def hold_slot():
+        with controller.heavy_slot(100):
+            admitted.set()
+            release.wait()
+
+    thread = threading.Thread(target=hold_slot)
+    thread.start()
+    admitted.wait()
+    threading.Timer(0.1, release.set).start()
+    with controller.heavy_slot(100):
+        pass
+    thread.join()
+
+
+def test_rejections_of_a_client_are_not_shared_with_other_clients(monkeypatch, tmp_path, mock_dw):
+    controller = AdmissionController(heavy_slots=2, max_client_requests=1)
+    monkeypatch.setattr(heatmap, "admission_controller", controller)
+    monkeypatch.setattr(heatmap, "estimate_heatmap_cost", lambda *args: 100)
+    monkeypatch.setattr(heatmap, "single_raster_response", lambda *args: PlainTextResponse("heatmap"))
+    monkeypatch.setattr("app.single_flight.get_cache_directory", lambda name: str(tmp_path))
+    url = "/api/v1/heatmap/single/count/1000m?start_timestamp=2022-01-01T00:00:00Z&end_timestamp=2022-02-01T00:00:00Z"
+    with controller.admit("busy", 100):
+        rejected = TestClient(app).get(url, headers={"CF-Access-Client-Id": "busy"})
+        admitted = TestClient(app).get(url, headers={"CF-Access-Client-Id": "other"})
+
+    assert rejected.status_code == 429
+    assert admitted.status_code == 200 and admitted.text == "heatmap"
+
+
+def test_identical_heavy_requests_share_the_heavy_slot_of_the_leader(monkeypatch, tmp_path, mock_dw):
+    controller = AdmissionController(heavy_slots=1, queue_timeout_sec=0.1)
+    monkeypatch.setattr(heatmap, "admission_controller", controller)
+    monkeypatch.setattr(heatmap, "estimate_heatmap_cost", lambda *args: 100)
+    monkeypatch.setattr("app.single_flight.get_cache_directory", lambda name: str(tmp_path))
+    rendering = threading.Event()
+    renders = []
+
+    def single_raster_response(*args):
+        renders.append(args)
+        rendering.set()
+        # Render for longer than followers may queue for a heavy slot
+        threading.Event().wait(0.5)
+        return PlainTextResponse("heatmap")
+
+    monkeypatch.setattr(heatmap, "single_raster_response", single_raster_response)
+    url = "/api/v1/heatmap/single/count/1000m?start_timestamp=2022-01-01T00:00:00Z&end_timestamp=2022-02-01T00:00:00Z"
+    responses = {}
+
+    def get(client_id):
+        responses[client_id] = TestClient(app).get(url, headers={"CF-Access-Client-Id": client_id})
+
+    leader = threading.Thread(target=get, args=("leader",))
+    leader.start()
+    rendering.wait()
+    get("follower")
+    leader.join()
+
+    assert len(renders) == 1
+    assert responses["leader"].status_code == 200 and responses["follower"].status_code == 200
+    assert responses["follower"].text == "heatmap"
+
+
+def test_heavy_jobs_render_in_a_heavy_slot(monkeypatch):
+    controller = AdmissionController(heavy_slots=1)
+    monkeypatch.setattr(heatmap, "admission_controller", controller)
+    running = []
+
+    def render_multi_heatmap(dw, heatmap_request, on_fetched, on_rendered):
+        running.append(controller._running)
+        return b"video", 0, 0
+
+    monkeypatch.setattr(heatmap, "render_multi_heatmap", render_multi_heatmap)
+    request = heatmap.MultiHeatmapRequest(
+        query="", params={'start_timestamp': datetime.datetime(2022, 1, 1, tzinfo=utc),
+                          'end_timestamp': datetime.datetime(2022, 1, 3, tzinfo=utc)},
+        heatmap_type=None, temporal_resolution=TemporalResolution.daily, output_format=MultiOutputFormat.mp4, fps=1,
+        max_value=None, encoder=None, cost=100)
+
+    assert heatmap.run_multi_heatmap_job(None, request, MagicMock()) == (b"video", "video/mp4")
+    assert running == [1] and controller._running == 0
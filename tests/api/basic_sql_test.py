@@ -0,0 +1,20 @@
+from unittest.mock import MagicMock
+
+from app.routers.v1 import basic_sql
+from app.schemas.relations import DWRELATION
+
+
+def test_exact_row_count_is_cached_until_next_import(monkeypatch):
+    db = MagicMock()
+    db.execute.return_value.fetchone.return_value = (42,)
+    monkeypatch.setattr(basic_sql, "exact_row_counts", {})
+    monkeypatch.setattr(basic_sql, "get_latest_import_id", lambda _: 1)
+
+    assert basic_sql.get_exact_row_count(db, DWRELATION.fact_trajectory) == 42
+    assert basic_sql.get_exact_row_count(db, DWRELATION.fact_trajectory) == 42
+    assert db.execute.call_count == 1
+
+    monkeypatch.setattr(basic_sql, "get_latest_import_id", lambda _: 2)
+    db.execute.return_value.fetchone.return_value = (43,)
+    assert basic_sql.get_exact_row_count(db, DWRELATION.fact_trajectory) == 43
+    assert db.execute.call_count == 2
@@ -0,0 +1,72 @@
+import json
+from datetime import datetime, timezone
+
+from app.routers.v1.trajectory.binary_trajectories import decode_trajectories, encode_trajectories, unzigzag, \
+    zigzag
+
+row = {
+    "trajectory_sub_id": 42,
+    "start_timestamp": datetime(2022, 1, 1, tzinfo=timezone.utc),
+    "destination": "AARHUS",
+    "ship": {"mmsi": 219000000, "name": "NORDLYS"},
+    "trajectory": {
+        "type": "MovingPoint",
+        "sequences": [
+            {"coordinates": [[10.123456, 56.5], [10.123499, 56.499987]],
+             "datetimes": ["2022-01-01T00:00:00+00", "2022-01-01T00:00:10+00"],
+             "lower_inc": True, "upper_inc": True},
+            {"coordinates": [[10.2, 56.4]],
+             "datetimes": ["2022-01-01T01:00:00+00"],
+             "lower_inc": True, "upper_inc": False},
+        ],
+        "interpolation": "Linear",
+    },
+    "rot": None,
+    "heading": {"type": "MovingFloat", "values": [90.0, 91.0, 92.5], "datetimes": [
+        "2022-01-01T00:00:00+00", "2022-01-01T00:00:05+00", "2022-01-01T00:00:20+00"], "interpolation": "Step"},
+    "draught": [{"type": "MovingFloat", "values": [7.3], "datetimes": ["2022-01-01T00:00:00+00"]}],
+}
+
+
+def test_zigzag_roundtrip():
+    for value in [0, 1, -1, 63, -64, 2 ** 40, -2 ** 40]:
+        assert unzigzag(zigzag(value)) == value
+    assert [zigzag(value) for value in [0, -1, 1, -2]] == [0, 1, 2, 3]
+
+
+def test_trajectories_roundtrip():
+    data = encode_trajectories([row, {**row, "trajectory_sub_id": 43}])
+    first, second = decode_trajectories(data)
+
+    assert first["trajectory_sub_id"] == 42 and second["trajectory_sub_id"] == 43
+    assert first["ship"] == row["ship"]
+    assert first["start_timestamp"] == "2022-01-01T00:00:00+00:00"
+    assert first["sequences"] == [{"lower_inc": True, "upper_inc": True, "count": 2},
+                                  {"lower_inc": True, "upper_inc": False, "count": 1}]
+    start = int(datetime(2022, 1, 1, tzinfo=timezone.utc).timestamp())
+    assert first["timestamps"] == [start, start + 10, start + 3600]
+    assert first["coordinates"] == [[10.123456, 56.5], [10.123499, 56.499987], [10.2, 56.4]]
+    assert first["rot"] == [None, None, None]
+    # The value of the latest instant at or before each point, within the sequence of the series
+    assert first["heading"] == [90.0, 91.0, None]
+    assert first["draught"] == [7.3, None, None]
+    assert second["coordinates"] == first["coordinates"]
+
+
+def test_binary_is_smaller_than_json():
+    assert len(encode_trajectories([row])) < len(json.dumps(row, default=str)) / 2
+
+
+def test_instants_are_encoded_as_single_point_sequences():
+    instant = {
+        **row,
+        "trajectory": {"type": "MovingPoint", "coordinates": [10.5, 56.25], "datetimes": "2022-01-01T00:00:00+00",
+                       "interpolation": "None"},
+        "heading": {"type": "MovingFloat", "values": 90.0, "datetimes": "2022-01-01T00:00:00+00",
+                    "interpolation": "None"},
+    }
+    (decoded,) = decode_trajectories(encode_trajectories([instant]))
+    assert decoded["sequences"] == [{"lower_inc": True, "upper_inc": True, "count": 1}]
+    assert decoded["coordinates"] == [[10.5, 56.25]]
+    assert decoded["heading"] == [90.0]
+    assert decoded["draught"] == [7.3]
@@ -0,0 +1,31 @@
+from app.datawarehouse import BackgroundQueries, PARALLEL_QUERIES
+
+
+def test_background_queries_only_submits_a_few_queries_ahead_of_the_results():
+    submitted = []
+
+    def queries():
+        for index in range(PARALLEL_QUERIES * 3):
+            submitted.append(index)
+            yield lambda index=index: index
+
+    results = []
+    for result in BackgroundQueries(queries()):
+        results.append(result)
+        assert len(submitted) <= len(results) + PARALLEL_QUERIES
+
+    assert results == list(range(PARALLEL_QUERIES * 3))
+
+
+def test_background_queries_does_not_submit_queries_once_closed():
+    submitted = []
+
+    def queries():
+        for index in range(PARALLEL_QUERIES * 3):
+            submitted.append(index)
+            yield lambda index=index: index
+
+    results = BackgroundQueries(queries())
+    assert next(results) == 0
+    results.close()
+    assert len(submitted) == PARALLEL_QUERIES + 1
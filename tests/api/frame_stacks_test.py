@@ -0,0 +1,39 @@
+import io
+
+import numpy as np
+import rasterio
+from affine import Affine
+from rasterio import MemoryFile
+
+from app.routers.v1.heatmap.frame_stacks import frames_to_geotiff, frames_to_npz
+from app.routers.v1.heatmap.heatmap_frames import Frame
+
+
+def frame(title, value):
+    with MemoryFile() as memfile:
+        with memfile.open(driver='GTiff', width=4, height=3, count=1, dtype='uint32', crs='EPSG:3034',
+                          transform=Affine(5000, 0, 3600000, 0, -5000, 3485000), nodata=0) as raster:
+            raster.write(np.full((1, 3, 4), value, dtype=np.uint32))
+        return Frame(title, title, memfile.read(), value)
+
+
+frames = [frame("2022 Week 01", 1), frame("2022 Week 02", 2)]
+
+
+def test_npz_stack():
+    stack = np.load(io.BytesIO(frames_to_npz(frames)))
+    assert stack["rasters"].shape == (2, 3, 4)
+    assert stack["rasters"][1, 0, 0] == 2
+    assert list(stack["titles"]) == ["2022 Week 01", "2022 Week 02"]
+    assert list(stack["transform"]) == [5000, 0, 3600000, 0, -5000, 3485000]
+    assert stack["nodata"] == 0
+
+
+def test_geotiff_stack():
+    with MemoryFile(frames_to_geotiff(frames)) as memfile:
+        with memfile.open() as stack:
+            assert stack.count == 2
+            assert stack.descriptions == ("2022 Week 01", "2022 Week 02")
+            assert stack.tags(2)["title"] == "2022 Week 02"
+            assert stack.read(2)[0, 0] == 2
+            assert stack.crs == rasterio.crs.CRS.from_epsg(3034)
@@ -0,0 +1,47 @@
+from unittest.mock import MagicMock
+
+from app.routers.v1.heatmap import heatmap_catalogue
+from app.routers.v1.heatmap.heatmap_catalogue import HeatmapCatalogue, etag_matches
+
+
+def heatmap_row(spatial_resolution, min_date_id, max_date_id):
+    return {"slug": "count", "name": "Count", "description": "Number of ships",
+            "spatial_resolution": spatial_resolution, "temporal_resolution_sec": 86400,
+            "min_date_id": min_date_id, "max_date_id": max_date_id}
+
+
+def test_catalogue_is_refreshed_incrementally(monkeypatch):
+    import_ids = iter([1, 1, 2])
+    monkeypatch.setattr(heatmap_catalogue, "get_latest_import_id", lambda _: next(import_ids))
+    monkeypatch.setattr(heatmap_catalogue, "get_imported_date_ids", lambda _, after, up_to: [20220201])
+    dw = MagicMock()
+    dw.execute.return_value.mappings.side_effect = [
+        [heatmap_row(5000, 20220101, 20220131), heatmap_row(50, 20220105, 20220110)],
+        [heatmap_row(5000, 20220201, 20220201)],
+    ]
+    catalogue = HeatmapCatalogue()
+
+    catalogue.refresh(dw)
+    heatmaps, etag = catalogue.snapshot
+    domain = heatmaps["count"]["spatial_resolutions"]["5000m"]["temporal_resolutions"]["daily"]["temporal_domain"]
+    assert domain == {"start": "2022-01-01T00:00:00+00:00", "end": "2022-02-01T00:00:00+00:00"}
+    assert list(heatmaps["count"]["spatial_resolutions"]) == ["50m", "5000m"]
+
+    # No new imports, so the snapshot is unchanged
+    catalogue.refresh(dw)
+    assert catalogue.snapshot[1] == etag
+
+    catalogue.refresh(dw)
+    heatmaps, new_etag = catalogue.snapshot
+    domain = heatmaps["count"]["spatial_resolutions"]["5000m"]["temporal_resolutions"]["daily"]["temporal_domain"]
+    assert domain == {"start": "2022-01-01T00:00:00+00:00", "end": "2022-02-02T00:00:00+00:00"}
+    assert new_etag != etag
+    assert dw.execute.call_count == 2
+
+
+def test_etag_matches():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc", "def"', '"abc"')
+    assert etag_matches('*', '"abc"')
+    assert not etag_matches('"def"', '"abc"')
+    assert not etag_matches(None, '"abc"')
@@ -0,0 +1,91 @@
+import datetime
+from contextlib import nullcontext
+from unittest.mock import MagicMock
+
+import pytest
+
+import app.routers.v1.heatmap.heatmap_frames as heatmap_frames
+from app.disk_cache import DiskCache
+from app.routers.v1.heatmap.heatmap_frames import fetch_frames, missing_runs, split_run
+from app.schemas.temporal_resolution import TemporalResolution
+
+utc = datetime.timezone.utc
+
+
+@pytest.fixture(autouse=True)
+def caches(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.disk_cache.get_cache_directory", lambda name: str(tmp_path))
+    monkeypatch.setattr(heatmap_frames, "raster_cache", DiskCache("frames", 1024 ** 2))
+    monkeypatch.setattr(heatmap_frames, "get_import_ids_by_date", lambda dw, start, end: {20220103: 7})
+
+
+@pytest.fixture
+def dw(monkeypatch):
+    dw = daily_dw()
+    # Chunks of periods are queried concurrently in separate sessions
+    monkeypatch.setattr(heatmap_frames, "SessionLocal", lambda: nullcontext(dw))
+    return dw
+
+
+def daily_dw():
+    """Mock a data warehouse with data on every day, except January 2nd."""
+    def execute(query, params):
+        day = params['start_timestamp'].date()
+        rows = []
+        while day < params['end_timestamp'].date():
+            if day != datetime.date(2022, 1, 2):
+                title = day.isoformat()
+                rows.append((title, memoryview(title.encode()), day.day, int(day.strftime("%Y%m%d"))))
+            day += datetime.timedelta(days=1)
+        result = MagicMock()
+        result.fetchall.return_value = rows
+        return result
+
+    dw = MagicMock()
+    dw.execute.side_effect = execute
+    return dw
+
+
+def params(start_day, end_day):
+    start = datetime.datetime(2022, 1, start_day, tzinfo=utc)
+    end = datetime.datetime(2022, 1, end_day, tzinfo=utc)
+    return {'heatmap_type_slug': 'count', 'start_timestamp': start, 'end_timestamp': end,
+            'start_date_id': int(start.strftime("%Y%m%d")), 'end_date_id': int(end.strftime("%Y%m%d"))}
+
+
+def queried_bounds(dw):
+    return sorted((call.args[1]['start_timestamp'].day, call.args[1]['end_timestamp'].day)
+                  for call in dw.execute.mock_calls)
+
+
+def test_overlapping_requests_only_query_missing_periods(dw):
+    frames = fetch_frames(dw, "query", params(1, 5), TemporalResolution.daily)
+    assert [frame.title for frame in frames] == ["2022-01-01", "2022-01-03", "2022-01-04"]
+
+    frames = fetch_frames(dw, "query", params(3, 7), TemporalResolution.daily)
+    assert [frame.title for frame in frames] == ["2022-01-03", "2022-01-04", "2022-01-05", "2022-01-06"]
+    assert [frame.raster for frame in frames][0] == b"2022-01-03"
+    assert queried_bounds(dw) == [(1, 2), (2, 3), (3, 4), (4, 5), (5, 6), (6, 7)]
+
+    # Periods without data are cached too
+    fetch_frames(dw, "query", params(1, 7), TemporalResolution.daily)
+    assert len(dw.execute.mock_calls) == 6
+
+
+def test_frames_are_recomputed_after_import(dw, monkeypatch):
+    fetch_frames(dw, "query", params(1, 5), TemporalResolution.daily)
+    monkeypatch.setattr(heatmap_frames, "get_import_ids_by_date", lambda dw, start, end: {20220103: 8})
+    fetch_frames(dw, "query", params(1, 5), TemporalResolution.daily)
+    assert queried_bounds(dw) == [(1, 2), (2, 3), (3, 4), (3, 4), (4, 5)]
+
+
+def test_missing_runs():
+    assert missing_runs([]) == []
+    assert missing_runs([0, 1, 2, 5, 7, 8]) == [(0, 2), (5, 5), (7, 8)]
+
+
+def test_split_run():
+    assert split_run(0, 1) == [(0, 0), (1, 1)]
+    assert split_run(0, 7) == [(0, 1), (2, 3), (4, 5), (6, 7)]
+    assert split_run(10, 29) == [(10, 14), (15, 19), (20, 24), (25, 29)]
+    assert split_run(0, 99)[0] == (0, 6)
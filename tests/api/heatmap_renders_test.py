@@ -0,0 +1,53 @@
+import io
+from unittest.mock import MagicMock, patch
+
+from app.routers.v1.heatmap import heatmap_renders
+from app.routers.v1.heatmap.heatmap_renders import geo_tiffs_to_pngs
+from helper_functions import as_bytes
+
+
+def fake_geo_tiff_to_png(geo_tiff_bytes, title=None, max_value=None):
+    return io.BytesIO(geo_tiff_bytes + f" {title} {max_value}".encode())
+
+
+def test_geo_tiffs_are_rendered_through_shared_memory():
+    rendered = []
+    with patch.object(heatmap_renders, "geo_tiff_to_png", fake_geo_tiff_to_png):
+        pngs = geo_tiffs_to_pngs(iter([("a", b"first"), ("b", b""), ("c", b"third")]), "count", 5,
+                                 on_rendered=rendered.append)
+    assert pngs == [b"first count - a 5", b" count - b 5", b"third count - c 5"]
+    assert rendered == [1, 2, 3]
+
+
+def test_shared_memory_is_bounded_and_freed_per_frame(monkeypatch):
+    shared = []
+    released = []
+    share = heatmap_renders.share
+    release = heatmap_renders.release
+    monkeypatch.setattr(heatmap_renders, "MAX_FRAMES_IN_FLIGHT", 2)
+    monkeypatch.setattr(heatmap_renders, "share", lambda data: shared.append(data) or share(data))
+    monkeypatch.setattr(heatmap_renders, "release", lambda block: released.append(block) or release(block))
+
+    def rasters():
+        for index in range(5):
+            # Frames are only shared once all but MAX_FRAMES_IN_FLIGHT previous frames are released
+            assert len(shared) - len(released) <= 2
+            yield str(index), str(index).encode()
+
+    with patch.object(heatmap_renders, "geo_tiff_to_png", fake_geo_tiff_to_png):
+        pngs = geo_tiffs_to_pngs(rasters(), "count")
+    assert pngs == [f"{index} count - {index} None".encode() for index in range(5)]
+    assert len(released) == 5
+
+
+def test_rendering_processes_are_only_started_for_uncached_frames(monkeypatch):
+    monkeypatch.setattr(heatmap_renders.multiprocessing, "Pool", MagicMock(side_effect=AssertionError("Pool started")))
+    assert geo_tiffs_to_pngs(iter([]), "count") == []
+
+
+def test_as_bytes_copies_at_most_once():
+    data = b"raster"
+    assert as_bytes(data) is data
+    assert as_bytes(memoryview(data)) is data
+    assert as_bytes(memoryview(data)[1:]) == b"aster"
+    assert as_bytes(memoryview(bytearray(data))) == data
@@ -0,0 +1,66 @@
+import numpy as np
+from fastapi.testclient import TestClient
+from rasterio import MemoryFile
+
+from app.api_main import app
+from app.routers.v1.heatmap import heatmap
+from app.routers.v1.heatmap.heatmap import display_spatial_resolution, multi_display_size, single_display_size
+from app.schemas.multi_output_format import MultiOutputFormat
+from app.schemas.single_output_formats import SingleOutputFormat
+from app.schemas.spatial_resolution import SpatialResolution
+
+
+def test_display_spatial_resolution_keeps_resolution_that_fits():
+    assert display_spatial_resolution(SpatialResolution.kilometer, 3600000, 3030000, 4395000, 3485000, 2000, 2000) \
+        == SpatialResolution.kilometer
+
+
+def test_display_spatial_resolution_coarsens_to_fit():
+    # 795 x 455 km is 15900 x 9100 pixels at 50 m, 3975 x 2275 at 200 m and 795 x 455 at 1 km
+    assert display_spatial_resolution(SpatialResolution.fifty_meters, 3600000, 3030000, 4395000, 3485000, 2000, 2000) \
+        == SpatialResolution.kilometer
+
+
+def test_display_spatial_resolution_falls_back_to_coarsest():
+    assert display_spatial_resolution(SpatialResolution.fifty_meters, 0, 0, 100000000, 1000, 2000, 2000) \
+        == SpatialResolution.five_kilometers
+
+
+def test_display_sizes():
+    assert single_display_size(SingleOutputFormat.tiff) is None
+    assert single_display_size(SingleOutputFormat.png) == (2000, 2000)
+    assert multi_display_size(MultiOutputFormat.npz, 500) is None
+    assert multi_display_size(MultiOutputFormat.mp4, None) == (2000, 2000)
+    assert multi_display_size(MultiOutputFormat.mp4, 500) == (500, 500)
+
+
+def test_raster_algebra_combines_all_operands(monkeypatch, tmp_path, mock_dw, geo_tiff):
+    fetched = []
+    monkeypatch.setattr("app.single_flight.get_cache_directory", lambda name: str(tmp_path))
+
+    def fetch_single_rasters(query, operands):
+        fetched.extend(operands)
+        return [geo_tiff(np.full((2, 2), index + 1)) for index in range(len(operands))]
+
+    monkeypatch.setattr(heatmap, "fetch_single_rasters", fetch_single_rasters)
+    response = TestClient(app).post("/api/v1/heatmap/algebra/5000m?x_min=3600000&y_min=3030000&x_max=3605000"
+                                    "&y_max=3035000", json={
+                                        'expression': "[rast1.val] + [rast2.val] * [rast3.val]",
+                                        'operands': [{'start_timestamp': f"2022-0{month}-01T00:00:00Z",
+                                                      'end_timestamp': f"2022-0{month + 1}-01T00:00:00Z"}
+                                                     for month in range(1, 4)],
+                                    })
+
+    assert response.status_code == 200
+    assert [operand['start_date_id'] for operand in fetched] == [20220101, 20220201, 20220301]
+    with MemoryFile(response.content) as memfile:
+        with memfile.open() as dataset:
+            np.testing.assert_array_equal(dataset.read(1), np.full((2, 2), 7))
+
+
+def test_raster_algebra_rejects_references_to_missing_operands():
+    response = TestClient(app).post("/api/v1/heatmap/algebra/5000m", json={
+        'expression': "[rast2.val]",
+        'operands': [{'start_timestamp': "2022-01-01T00:00:00Z", 'end_timestamp': "2022-02-01T00:00:00Z"}],
+    })
+    assert response.status_code == 400
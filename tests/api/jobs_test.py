@@ -0,0 +1,138 @@
+import time
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+import app.jobs as jobs
+from app.routers.v1.jobs import jobs as jobs_router
+from app.schemas.job import JobStatus
+
+
+@pytest.fixture(autouse=True)
+def job_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "get_cache_directory", lambda name: str(tmp_path))
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(jobs_router.router, prefix="/jobs")
+    return TestClient(app)
+
+
+def render(dw, params, progress):
+    progress.total(len(params))
+    for frame in range(len(params)):
+        progress.rendered(frame + 1)
+    return params.encode(), "text/plain"
+
+
+def fail(dw, params, progress):
+    raise HTTPException(404, "No heatmap data found given the parameters.")
+
+
+def test_job_is_run_and_result_downloaded(client):
+    jobs.register_job_handler("render", render)
+    job_id = jobs.create_job("render", "key", "0123456789", "client")
+    assert jobs.get_job(job_id).status == JobStatus.queued
+
+    assert jobs.run_next_job()
+    assert not jobs.run_next_job()
+
+    response = client.get(f"/jobs/{job_id}")
+    assert response.json()["status"] == JobStatus.succeeded
+    assert response.json()["frames_total"] == 10
+    assert response.json()["frames_rendered"] == 10
+
+    response = client.get(response.json()["result_url"])
+    assert response.status_code == 200
+    assert response.content == b"0123456789"
+
+
+def test_identical_jobs_are_reused():
+    jobs.register_job_handler("render", render)
+    assert jobs.create_job("render", "key", "a", "client") == jobs.create_job("render", "key", "a", "client")
+    assert jobs.create_job("render", "key", "a", "client") != jobs.create_job("render", "other key", "a", "client")
+
+
+def test_failed_job_records_error(client):
+    jobs.register_job_handler("fail", fail)
+    job_id = jobs.create_job("fail", "key", None, "client")
+    jobs.run_next_job()
+
+    job = jobs.get_job(job_id)
+    assert job.status == JobStatus.failed
+    assert job.error == "No heatmap data found given the parameters."
+    assert client.get(f"/jobs/{job_id}/result").status_code == 409
+    assert jobs.create_job("fail", "key", None, "client") != job_id
+
+
+def test_unknown_job(client):
+    assert client.get("/jobs/unknown").status_code == 404
+
+
+@pytest.mark.parametrize("range_header, status_code, content", [
+    ("bytes=2-4", 206, b"234"),
+    ("bytes=7-", 206, b"789"),
+    ("bytes=-2", 206, b"89"),
+    ("bytes=5-100", 206, b"56789"),
+    ("bytes=0-1,4-5", 200, b"0123456789"),
+    ("bytes=10-", 416, None),
+])
+def test_result_range_requests(client, range_header, status_code, content):
+    jobs.register_job_handler("render", render)
+    job_id = jobs.create_job("render", "key", "0123456789", "client")
+    jobs.run_next_job()
+
+    response = client.get(f"/jobs/{job_id}/result", headers={"Range": range_header})
+    assert response.status_code == status_code
+    if content is not None:
+        assert response.content == content
+        assert response.headers["Content-Length"] == str(len(content))
+
+
+def test_jobs_without_recent_heartbeat_are_requeued(monkeypatch):
+    jobs.register_job_handler("render", render)
+    job_id = jobs.create_job("render", "key", "a", "client")
+    jobs._claim_job()
+
+    jobs._requeue_abandoned_jobs()
+    assert jobs.get_job(job_id).status == JobStatus.running
+
+    now = time.time()
+    monkeypatch.setattr(jobs.time, "time", lambda: now + jobs.ABANDONED_AFTER_SEC + 1)
+    jobs._requeue_abandoned_jobs()
+    assert jobs.get_job(job_id).status == JobStatus.queued
+
+
+def test_jobs_abandoned_too_often_fail(monkeypatch):
+    jobs.register_job_handler("render", render)
+    job_id = jobs.create_job("render", "key", "a", "client")
+    now = time.time()
+    for attempt in range(jobs.MAX_JOB_ATTEMPTS):
+        monkeypatch.setattr(jobs.time, "time", lambda: now)
+        assert jobs._claim_job()["id"] == job_id
+        monkeypatch.setattr(jobs.time, "time", lambda: now + jobs.ABANDONED_AFTER_SEC + 1)
+        jobs._requeue_abandoned_jobs()
+
+    job = jobs.get_job(job_id)
+    assert job.status == JobStatus.failed
+    assert job.error == f"The job was abandoned {jobs.MAX_JOB_ATTEMPTS} times by the processes running it."
+    assert jobs._claim_job() is None
+
+
+def test_clients_may_only_queue_a_limited_number_of_jobs(monkeypatch):
+    monkeypatch.setattr(jobs, "MAX_CLIENT_JOBS", 2)
+    jobs.register_job_handler("render", render)
+    jobs.create_job("render", "first key", "a", "client")
+    jobs.create_job("render", "second key", "a", "client")
+
+    with pytest.raises(HTTPException) as e:
+        jobs.create_job("render", "third key", "a", "client")
+    assert e.value.status_code == 429
+    jobs.create_job("render", "second key", "a", "client")
+    jobs.create_job("render", "third key", "a", "other client")
+
+    assert jobs.run_next_job()
+    jobs.create_job("render", "third key", "a", "client")
@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+from fastapi import HTTPException
+from rasterio import MemoryFile
+
+from app.routers.v1.heatmap.map_algebra import apply_map_algebra, apply_raster_algebra, compile_map_algebra, \
+    map_algebra_rasters
+
+first = np.array([[1.0, 2.0], [3.0, 4.0]])
+second = np.array([[4.0, 4.0], [4.0, 0.0]])
+
+
+def evaluate(expression, operand_count=2):
+    return compile_map_algebra(expression, operand_count).evaluate([first, second])
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("[rast2.val]-[rast1.val]", second - first),
+    ("[rast2] - [rast1.VAL] * 2", second - first * 2),
+    ("-[rast1.val]", -first),
+    ("-2^2", 4),
+    ("2^3^2", 64),
+    ("(1 + 2) * 3 - 4 / 2", 7),
+    ("7 % 4", 3),
+    ("greatest([rast1.val], 3, 2)", np.maximum(first, 3)),
+    ("power(abs(-[rast1.val]), 0.5)::float8", np.sqrt(first)),
+    ("2.5::integer + 3.6::int", 7),
+    ("round(2.5)", 3),
+    ("round(-2.5)", -3),
+    ("(-0.5)::int + round(1.49)", 0),
+    ("2.5::float8::int + round(2.5::double precision)", 4),
+    ("ln(exp(1)) + log(100) + pi() - pi()", 3),
+    ("[rast1.x] * 10 + [rast1.y]", np.array([[11.0, 21.0], [12.0, 22.0]])),
+])
+def test_expressions_are_evaluated_like_in_postgresql(expression, expected):
+    np.testing.assert_allclose(evaluate(expression), expected)
+
+
+def test_raster_values_are_rounded_half_to_even_like_double_precision_in_postgresql():
+    halves = np.array([[0.5, 1.5], [2.5, -2.5]])
+
+    def evaluate_halves(expression):
+        return compile_map_algebra(expression, 1).evaluate([halves])
+
+    np.testing.assert_array_equal(evaluate_halves("round([rast1.val])"), [[0, 2], [2, -2]])
+    np.testing.assert_array_equal(evaluate_halves("[rast1.val]::int"), [[0, 2], [2, -2]])
+    np.testing.assert_array_equal(evaluate_halves("(-[rast1.val] + 0.5 * 2 - 1)::int"), [[0, -2], [-2, 2]])
+    np.testing.assert_array_equal(evaluate_halves("round([rast1.val]::numeric)"), [[1, 2], [3, -3]])
+    np.testing.assert_array_equal(evaluate_halves("round([rast1.val] / [rast1.val] * 2.5)"), [[2, 2], [2, 2]])
+
+
+def test_operands_are_recorded():
+    assert compile_map_algebra("[rast2.val] + 1", 2).operands == {2}
+    assert compile_map_algebra("1", 2).operands == set()
+
+
+@pytest.mark.parametrize("expression", [
+    "[rast3.val]",
+    "[rast1.val] +",
+    "__import__('os')",
+    "[rast1.val]; DROP TABLE fact_cell_heatmap",
+    "abs(1, 2)",
+    "greatest()",
+    "(1",
+    "1::text",
+    "-" * 100 + "1",
+    "(" * 100 + "1" + ")" * 100,
+])
+def test_invalid_expressions_are_rejected(expression):
+    with pytest.raises(HTTPException) as e:
+        compile_map_algebra(expression, 2)
+    assert e.value.status_code == 400
+
+
+def test_apply_map_algebra_uses_no_data_expressions():
+    result = apply_map_algebra(
+        np.ma.masked_array(first, mask=[[False, True], [False, True]]),
+        np.ma.masked_array(second, mask=[[False, False], [True, True]]),
+        compile_map_algebra("[rast2.val] / ([rast1.val] - 1)", 2),
+        compile_map_algebra("[rast2.val]", 2),
+        compile_map_algebra("-[rast1.val]", 2),
+    )
+    # Division by zero where both have data, the second raster only, the first raster only, and neither
+    assert result.mask.tolist() == [[True, False], [False, True]]
+    assert result[0, 1] == 4 and result[1, 0] == -3
+
+
+def test_map_algebra_rasters_treats_missing_raster_as_no_data(geo_tiff):
+    raster = map_algebra_rasters(geo_tiff(first), None, compile_map_algebra("[rast1.val]", 2),
+                                 compile_map_algebra("[rast2.val]", 2), compile_map_algebra("-[rast1.val]", 2))
+    with MemoryFile(raster) as memfile:
+        with memfile.open() as dataset:
+            assert dataset.crs.to_epsg() == 3034
+            np.testing.assert_array_equal(dataset.read(1), -first)
+
+
+def test_apply_raster_algebra_over_any_number_of_rasters():
+    third = np.ma.masked_array(first + second, mask=[[False, False], [True, False]])
+    rasters = [np.ma.masked_array(first), np.ma.masked_array(second), third]
+    expression = compile_map_algebra("([rast2.val] + [rast3.val]) / 2 - [rast1.val]", 3)
+
+    result = apply_raster_algebra(rasters, expression)
+    assert result.mask.tolist() == [[False, False], [True, False]]
+    np.testing.assert_allclose(result[0], (second[0] + first[0] + second[0]) / 2 - first[0])
+
+    result = apply_raster_algebra(rasters, expression, no_data_value=0)
+    assert result[1, 0] == (4 + 0) / 2 - 3
@@ -0,0 +1,37 @@
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi import HTTPException
+
+from app import reference_geometries
+from app.schemas.enc_enum import EncCell
+
+rows = [
+    {"name": "Skagen", "min_x": 3900000, "min_y": 3450000, "max_x": 3950000, "max_y": 3480000,
+     "geometry": '{"type": "Polygon", "coordinates": []}'},
+    {"name": "Rønne", "min_x": 4300000, "min_y": 3100000, "max_x": 4320000, "max_y": 3120000,
+     "geometry": '{"type": "Polygon", "coordinates": []}'},
+]
+
+
+@pytest.fixture
+def dw(monkeypatch):
+    monkeypatch.setattr(reference_geometries, "_reference_geometries", None)
+    dw = MagicMock()
+    dw.execute.return_value.mappings.return_value.all.return_value = rows
+    return dw
+
+
+def test_reference_geometries_are_loaded_once(dw):
+    skagen = reference_geometries.get_reference_geometry(dw, EncCell.skagen)
+    roenne = reference_geometries.get_reference_geometry(dw, EncCell.roenne)
+
+    assert (skagen.min_x, skagen.max_y) == (3900000, 3480000)
+    assert roenne.geometry == {"type": "Polygon", "coordinates": []}
+    assert dw.execute.call_count == 1
+
+
+def test_unknown_enc_cell(dw):
+    with pytest.raises(HTTPException) as e:
+        reference_geometries.get_reference_geometry(dw, EncCell.kattegat)
+    assert e.value.status_code == 404
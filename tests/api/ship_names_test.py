@@ -0,0 +1,68 @@
+import threading
+from contextlib import nullcontext
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import ship_names
+from app.api_main import app
+
+rows = [
+    (1, "Nordic  Star", "OXAB2", 219000001),
+    (2, "STAR OF NORTH", "OXST1", 219000002),
+    (3, "Nordic", "NORD", 219000003),
+    (4, None, "OUZ1", 219000004),
+]
+
+
+@pytest.fixture
+def dw(monkeypatch, mock_dw):
+    monkeypatch.setattr(ship_names, "_index", None)
+    monkeypatch.setattr(ship_names, "get_latest_import_id", lambda dw: 1)
+    mock_dw.execute.return_value.fetchall.return_value = rows
+    return mock_dw
+
+
+def test_exact_match_is_suggested_first(dw):
+    suggestions = ship_names.suggest_ships(dw, "nordic", 10)
+    assert [ship.ship_id for ship in suggestions] == [3, 1]
+
+
+def test_suggest_by_callsign_and_word_of_name(dw):
+    assert [ship.ship_id for ship in ship_names.suggest_ships(dw, "ox", 10)] == [1, 2]
+    assert [ship.ship_id for ship in ship_names.suggest_ships(dw, "Star", 10)] == [1, 2]
+    assert [ship.ship_id for ship in ship_names.suggest_ships(dw, "nordic star", 10)] == [1]
+
+
+def test_suggestions_are_limited_and_index_is_loaded_once(dw):
+    assert len(ship_names.suggest_ships(dw, "o", 1)) == 1
+    assert ship_names.suggest_ships(dw, "q", 10) == []
+    assert dw.execute.call_count == 1
+
+
+def test_index_is_reloaded_in_the_background_after_import(dw, monkeypatch):
+    reload_may_start = threading.Event()
+
+    def session():
+        reload_may_start.wait()
+        return nullcontext(dw)
+
+    monkeypatch.setattr(ship_names, "SessionLocal", session)
+    ship_names.suggest_ships(dw, "nordic", 10)
+    monkeypatch.setattr(ship_names, "get_latest_import_id", lambda dw: 2)
+
+    # The previous index is used while the index is being reloaded
+    assert [ship.ship_id for ship in ship_names.suggest_ships(dw, "nordic", 10)] == [3, 1]
+    assert ship_names._index.import_id == 1
+
+    reload_may_start.set()
+    with ship_names._lock:
+        assert ship_names._index.import_id == 2
+    assert dw.execute.call_count == 2
+
+
+def test_suggest_endpoint(dw):
+    response = TestClient(app).get("/api/v1/ships/suggest?prefix=OUZ")
+
+    assert response.status_code == 200
+    assert response.json() == [{"ship_id": 4, "name": None, "callsign": "OUZ1", "mmsi": 219000004}]
@@ -0,0 +1,81 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from app import ship_presence
+from app.ship_presence import candidate_ship_ids, decode_ship_ids, encode_ship_ids, refresh_ship_presence
+
+# The ships entering cells on each date, as rows of the presence query: cell x, cell y and ship ids.
+presence_rows = {
+    20220101: [(720, 610, [3, 1, 2]), (725, 610, [4])],
+    20220102: [(720, 610, [5, 1])],
+}
+
+
+@pytest.fixture
+def import_ids(monkeypatch, tmp_path):
+    imports = {20220101: 1, 20220102: 2}
+    monkeypatch.setattr(ship_presence, "get_cache_directory", lambda name: str(tmp_path))
+    monkeypatch.setattr(ship_presence, "get_import_ids_by_date", lambda dw, start, end: {
+        date_id: import_id for date_id, import_id in imports.items() if start <= date_id <= end})
+    return imports
+
+
+# Bounds covering all cells of the presence rows.
+everywhere = (700 * 5000, 600 * 5000, 730 * 5000, 620 * 5000)
+
+
+def data_warehouse():
+    dw = MagicMock()
+    dw.execute.side_effect = lambda query, params: MagicMock(fetchall=lambda: presence_rows[params["date_id"]])
+    return dw
+
+
+def test_ship_ids_are_encoded_sorted_and_unique():
+    assert decode_ship_ids(encode_ship_ids([3, 1, 3, 2])).tolist() == [1, 2, 3]
+
+
+def test_candidates_are_the_ships_of_the_cells_and_dates_within_the_bounds(import_ids):
+    dw = data_warehouse()
+    assert refresh_ship_presence(dw) == 2
+
+    bounds = (720 * 5000 + 100, 610 * 5000 + 100, 720 * 5000 + 200, 610 * 5000 + 200)
+    assert candidate_ship_ids(dw, bounds, 20220101, 20220101, 50) == [1, 2, 3]
+    assert candidate_ship_ids(dw, bounds, 20220101, 20220102, 50) == [1, 2, 3, 5]
+    assert candidate_ship_ids(dw, everywhere, 20220101, 20220101, 50) == [1, 2, 3, 4]
+    assert candidate_ship_ids(dw, bounds, 20220103, 20220103, 50) == []
+
+
+def test_candidates_include_the_cells_within_the_margin(import_ids):
+    dw = data_warehouse()
+    refresh_ship_presence(dw)
+
+    bounds = (724 * 5000 + 4900, 610 * 5000, 724 * 5000 + 4950, 610 * 5000 + 10)
+    assert candidate_ship_ids(dw, bounds, 20220101, 20220101, 0) == []
+    assert candidate_ship_ids(dw, bounds, 20220101, 20220101, 1000) == [4]
+
+
+def test_dates_imported_again_are_reindexed_before_use(import_ids):
+    dw = data_warehouse()
+    refresh_ship_presence(dw)
+    import_ids[20220102] = 3
+
+    assert candidate_ship_ids(dw, everywhere, 20220101, 20220102, 50) is None
+    assert refresh_ship_presence(dw) == 1
+    assert candidate_ship_ids(dw, everywhere, 20220101, 20220102, 50) == [1, 2, 3, 4, 5]
+
+
+def test_index_is_not_read_without_bounds(import_ids, monkeypatch):
+    refresh_ship_presence(data_warehouse())
+    monkeypatch.setattr(ship_presence, "_database", MagicMock(side_effect=AssertionError("The index was read.")))
+
+    assert candidate_ship_ids(MagicMock(), None, 20220101, 20220102, 50) is None
+
+
+@pytest.mark.parametrize("limit", ["MAX_CANDIDATE_SHIPS", "MAX_PRESENCE_ROWS"])
+def test_index_cannot_tell_above_the_limits(import_ids, monkeypatch, limit):
+    dw = data_warehouse()
+    refresh_ship_presence(dw)
+    monkeypatch.setattr(ship_presence, limit, 2)
+
+    assert candidate_ship_ids(dw, everywhere, 20220101, 20220102, 50) is None
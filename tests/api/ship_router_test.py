@@ -1,4 +1,7 @@
 import pytest
+from fastapi.testclient import TestClient
+from app.api_main import app
+from app.routers.v1.ship import router as ship_router
 from app.routers.v1.ship.router import update_params_datetime
 import datetime
 
@@ -26,3 +29,42 @@ def test_update_params_datetime_empty_dict():
     params = {}
     update_params_datetime(params, None, "from")
     assert params == {}
+
+
+@pytest.fixture
+def ship_queries(monkeypatch, mock_dw):
+    executed = []
+    monkeypatch.setattr(ship_router, "response_dict", lambda query, dw, params: executed.append(query) or [])
+    return executed
+
+
+def test_spatial_trajectory_search_uses_semi_join(ship_queries):
+    response = TestClient(app).get("/api/v1/ships/?search_method=trajectories&x_min=10&y_min=55&x_max=11&y_max=56"
+                                   "&mmsi_in=219000000")
+
+    assert response.status_code == 200
+    query = ship_queries[0]
+    assert not query.lstrip().startswith("SELECT DISTINCT") and "WHERE WHERE" not in query
+    assert "WHERE ds.ship_id IN ( SELECT DISTINCT ft.ship_id FROM fact_trajectory" in " ".join(query.split())
+    assert "AND ds.mmsi IN" in query
+
+
+def test_search_without_bounds_only_queries_ships(ship_queries):
+    response = TestClient(app).get("/api/v1/ships/?search_method=trajectories")
+
+    assert response.status_code == 200
+    assert "fact_" not in ship_queries[0]
+
+
+def test_name_search_filters_and_ranks_ships(ship_queries, monkeypatch):
+    params = {}
+    monkeypatch.setattr(ship_router, "response_dict",
+                        lambda query, dw, query_params: ship_queries.append(query) or params.update(query_params) or [])
+    response = TestClient(app).get("/api/v1/ships/?name_search=ms_50%25")
+
+    assert response.status_code == 200
+    query = " ".join(ship_queries[0].split())
+    assert "WHERE (ds.name % :name_search OR ds.callsign % :name_search" in query
+    assert "ORDER BY (ds.name ILIKE :name_search_prefix" in query
+    assert query.endswith("ds.ship_id LIMIT :limit OFFSET :offset;")
+    assert params["name_search_prefix"] == "ms\\_50\\%%"
@@ -0,0 +1,66 @@
+import datetime
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+
+from app.schemas.mobile_type import MobileType
+from app.single_flight import single_flight, request_key
+
+
+def test_request_key_is_normalised():
+    first = request_key("heatmap", {
+        "mobile_types": [MobileType.class_a, MobileType.class_b],
+        "start_timestamp": datetime.datetime(2022, 1, 1, 1, tzinfo=datetime.timezone(datetime.timedelta(hours=1))),
+    })
+    second = request_key("heatmap", {
+        "start_timestamp": datetime.datetime(2022, 1, 1, tzinfo=datetime.timezone.utc),
+        "mobile_types": [MobileType.class_b, MobileType.class_a],
+    })
+    assert first == second
+    assert first != request_key("heatmap", {"mobile_types": [MobileType.class_a]})
+
+
+def test_concurrent_executions_are_coalesced():
+    key = uuid.uuid4().hex
+    calls = []
+    lock = threading.Lock()
+
+    def compute():
+        with lock:
+            calls.append(1)
+        time.sleep(0.5)
+        return b"heatmap"
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda _: single_flight(key, compute), range(4)))
+
+    assert results == [b"heatmap"] * 4
+    assert len(calls) == 1
+
+
+def test_http_exceptions_are_shared():
+    key = uuid.uuid4().hex
+
+    def compute():
+        raise HTTPException(404, "No heatmap data found given the parameters.")
+
+    with pytest.raises(HTTPException):
+        single_flight(key, compute)
+    with pytest.raises(HTTPException) as e:
+        single_flight(key, lambda: b"not computed")
+    assert e.value.status_code == 404
+
+
+def test_too_many_requests_are_not_shared():
+    key = uuid.uuid4().hex
+
+    def compute():
+        raise HTTPException(429, "The server is busy with other expensive requests.")
+
+    with pytest.raises(HTTPException):
+        single_flight(key, compute)
+    assert single_flight(key, lambda: b"heatmap") == b"heatmap"
@@ -0,0 +1,49 @@
+from unittest.mock import MagicMock
+
+from app import table_metadata
+from app.schemas.relations import DWRELATION
+
+columns = [
+    {"table_name": "dim_ship", "column_name": "ship_id", "data_type": "integer",
+     "character_maximum_length": None, "numeric_precision": 32, "nullable": False},
+    {"table_name": "dim_ship", "column_name": "name", "data_type": "character varying",
+     "character_maximum_length": 255, "numeric_precision": None, "nullable": True},
+]
+indexes = [{"table_name": "dim_ship", "index_name": "dim_ship_pkey",
+            "definition": "CREATE UNIQUE INDEX dim_ship_pkey ON dim_ship USING btree (ship_id)"}]
+partitioning = [{"table_name": "dim_ship", "partition_key": None, "partition_count": 0,
+                 "distribution_column": None}]
+
+
+def mock_dw():
+    dw = MagicMock()
+    dw.execute.return_value.mappings.side_effect = [columns, indexes, partitioning]
+    return dw
+
+
+def test_load_table_metadata(monkeypatch):
+    monkeypatch.setattr(table_metadata, "_table_metadata", None)
+    dw = mock_dw()
+
+    metadata = table_metadata.get_table_metadata(dw, DWRELATION.dim_ship)
+
+    assert [column.name for column in metadata.columns] == ["ship_id", "name"]
+    assert metadata.columns[1].character_maximum_length == 255
+    assert metadata.indexes[0].name == "dim_ship_pkey"
+    assert metadata.partitioning.partition_count == 0
+    assert table_metadata.get_table_metadata(dw, DWRELATION.fact_trajectory).columns == []
+    # The metadata is only introspected once
+    assert dw.execute.call_count == 3
+
+
+def test_version_changes_with_schema(monkeypatch):
+    monkeypatch.setattr(table_metadata, "_table_metadata", None)
+    version = table_metadata.load_table_metadata(mock_dw())["dim_ship"].version
+    assert table_metadata.load_table_metadata(mock_dw())["dim_ship"].version == version
+
+    columns.append({"table_name": "dim_ship", "column_name": "imo", "data_type": "integer",
+                    "character_maximum_length": None, "numeric_precision": 32, "nullable": True})
+    try:
+        assert table_metadata.load_table_metadata(mock_dw())["dim_ship"].version != version
+    finally:
+        columns.pop()
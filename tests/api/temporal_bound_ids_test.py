@@ -0,0 +1,24 @@
+from datetime import datetime, timedelta, timezone
+
+from helper_functions import date_time_ids, temporal_bound_ids
+
+
+def test_date_time_ids_are_in_utc():
+    timestamp = datetime(2022, 1, 1, 1, 30, tzinfo=timezone(timedelta(hours=2)))
+    assert date_time_ids(timestamp) == (20211231, 233000)
+
+
+def test_date_time_ids_round_fractions_of_seconds():
+    timestamp = datetime(2022, 1, 1, 23, 59, 59, 500000)
+    assert date_time_ids(timestamp) == (20220101, 235959)
+    assert date_time_ids(timestamp, round_up=True) == (20220102, 0)
+
+
+def test_temporal_bound_ids_match_the_timestamps_of_facts_inside_the_bound():
+    start, end = datetime(2022, 1, 1, 12, 0, 0, 250000), datetime(2022, 1, 3, 8, 15, 30, 250000)
+    ids = temporal_bound_ids(start, end)
+    assert ids == {'start_date_id': 20220101, 'start_time_id': 120001,
+                   'end_date_id': 20220103, 'end_time_id': 81531}
+    # A fact at 08:15:30 is before the exclusive end, so it must be strictly before the end ids.
+    assert (20220103, 81530) < (ids['end_date_id'], ids['end_time_id'])
+    assert temporal_bound_ids(start, end, end_inclusive=True)['end_time_id'] == 81530
@@ -0,0 +1,36 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from app.api_main import app
+from app.routers.v1.trajectory import trajectory_batches
+from app.routers.v1.trajectory.trajectory_batches import group_by_date
+from app.schemas.trajectory_batch import TrajectoryId
+
+
+def test_group_by_date_removes_duplicates():
+    ids = [TrajectoryId(date_id=20220101, sub_id=1), TrajectoryId(date_id=20220102, sub_id=2),
+           TrajectoryId(date_id=20220101, sub_id=3), TrajectoryId(date_id=20220101, sub_id=1)]
+    assert group_by_date(ids) == {20220101: [1, 3], 20220102: [2]}
+
+
+def test_batch_queries_each_date_once_and_streams_all_trajectories(monkeypatch):
+    queried = []
+
+    def fetch_group(query, params):
+        queried.append(params)
+        return [{"trajectory_sub_id": sub_id} for sub_id in params["sub_ids"]]
+
+    monkeypatch.setattr(trajectory_batches, "fetch_group", fetch_group)
+    response = TestClient(app).post("/api/v1/trajectory/trajectories/batch", json={"ids": [
+        {"date_id": 20220101, "sub_id": 1}, {"date_id": 20220102, "sub_id": 2}, {"date_id": 20220101, "sub_id": 3},
+    ]})
+
+    assert response.status_code == 200
+    assert sorted(row["trajectory_sub_id"] for row in json.loads(response.content)) == [1, 2, 3]
+    groups = sorted((params["date_id"], params["sub_ids"]) for params in queried)
+    assert groups == [(20220101, [1, 3]), (20220102, [2])]
+
+
+def test_batch_rejects_empty_batches():
+    assert TestClient(app).post("/api/v1/trajectory/trajectories/batch", json={"ids": []}).status_code == 422
@@ -0,0 +1,35 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api_main import app
+from app.routers.v1.trajectory import router
+
+
+@pytest.fixture
+def queries(monkeypatch, mock_dw):
+    executed = []
+    monkeypatch.setattr(router, "response_json", lambda query, dw, params: executed.append((query, params)) or [])
+    return executed
+
+
+def test_bounds_and_clipped_trajectory_are_computed_once(queries):
+    response = TestClient(app).get("/api/v1/trajectory/trajectories/?x_min=10&y_min=55&x_max=11&y_max=56"
+                                   "&start_timestamp=2022-01-01T00:00:00Z&end_timestamp=2022-01-02T00:00:00Z")
+
+    assert response.status_code == 200
+    query, params = queries[0]
+    assert query.lstrip().startswith("WITH bounds AS MATERIALIZED")
+    assert query.count("STBOX(") == 1
+    assert query.count("atstbox(") == 1
+    assert "LATERAL" not in query and "OFFSET 0" not in query
+    assert "unnest(ARRAY[atstbox(" in query
+    assert "dt.clipped_trajectory IS NOT NULL" in query
+    assert params["start_date"] == "20220101" and params["srid"] == 4326
+
+
+def test_trajectories_without_bounds_are_not_cropped(queries):
+    response = TestClient(app).get("/api/v1/trajectory/trajectories/?crop=true")
+
+    assert response.status_code == 200
+    query, _ = queries[0]
+    assert "bounds" not in query and "clipped" not in query
@@ -0,0 +1,31 @@
+import pytest
+from fastapi import HTTPException
+
+from app.routers.v1.trajectory.simplification import Simplification, simplified_trajectory, \
+    trajectory_simplification, zoom_tolerance
+
+
+def test_no_simplification_keeps_trajectory():
+    params = {}
+    assert simplified_trajectory("dt.trajectory", Simplification(), params) == "dt.trajectory"
+    assert params == {}
+
+
+def test_simplifications_are_applied_in_metric_srid():
+    params = {}
+    trajectory = simplified_trajectory("dt.trajectory", Simplification(100, 10, 30), params)
+    assert trajectory == "transform(douglasPeuckerSimplify(minDistSimplify(transform(" \
+                         "minTimeDeltaSimplify(dt.trajectory, make_interval(secs => :min_time_delta)), 3034), " \
+                         ":min_distance), :simplify_tolerance), 4326)"
+    assert params == {"simplify_tolerance": 100, "min_distance": 10, "min_time_delta": 30}
+
+
+def test_zoom_tolerance_halves_per_zoom_level():
+    assert zoom_tolerance(7) == pytest.approx(zoom_tolerance(6) / 2)
+    assert 650 < zoom_tolerance(7) < 700
+
+
+def test_zoom_and_tolerance_are_exclusive():
+    assert trajectory_simplification(None, 7, None, None).tolerance == zoom_tolerance(7)
+    with pytest.raises(HTTPException):
+        trajectory_simplification(100, 7, None, None)
@@ -0,0 +1,59 @@
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.api_main import app
+from app.routers.v1.trajectory import vector_tiles
+from app.routers.v1.trajectory.vector_tiles import MAX_FEATURES, WEB_MERCATOR_HALF_WIDTH_M, tile_bounds
+
+tile_url = "/api/v1/trajectory/tiles/7/67/40.mvt?start_timestamp=2022-01-01T00:00:00Z" \
+           "&end_timestamp=2022-01-02T00:00:00Z"
+
+
+def test_tile_bounds_of_the_world_tile_include_buffer():
+    bounds = tile_bounds(0, 0, 0)
+    buffer = 2 * WEB_MERCATOR_HALF_WIDTH_M / 64
+    assert bounds["xmin"] == pytest.approx(-WEB_MERCATOR_HALF_WIDTH_M - buffer)
+    assert bounds["ymax"] == pytest.approx(WEB_MERCATOR_HALF_WIDTH_M + buffer)
+    assert bounds["srid"] == 3857
+
+
+def test_tile_bounds_rows_are_counted_from_the_north():
+    north, south = tile_bounds(1, 0, 0), tile_bounds(1, 0, 1)
+    assert north["ymin"] > south["ymin"]
+    assert north["xmin"] == south["xmin"]
+
+
+def test_tile_bounds_reject_tiles_outside_zoom_level():
+    with pytest.raises(HTTPException):
+        tile_bounds(2, 4, 0)
+
+
+def test_tiles_are_cached_per_import(monkeypatch, tmp_path, mock_dw):
+    monkeypatch.setattr("app.disk_cache.get_cache_directory", lambda name: str(tmp_path))
+    monkeypatch.setattr(vector_tiles, "get_latest_import_id", lambda dw: 1)
+    mock_dw.execute.return_value.fetchone.return_value = (memoryview(b"tile"),)
+    client = TestClient(app)
+    first = client.get(tile_url + "&mobile_type=Class A&stopped=false")
+    second = client.get(tile_url + "&mobile_type=Class A&stopped=false")
+
+    assert first.status_code == second.status_code == 200
+    assert first.content == second.content == b"tile"
+    assert first.headers["content-type"] == "application/vnd.mapbox-vector-tile"
+    assert mock_dw.execute.call_count == 1
+    query, params = mock_dw.execute.call_args.args
+    assert "douglasPeuckerSimplify" in str(query) and "{BOUNDS}" not in str(query)
+    assert params["z"] == 7 and params["srid"] == 3857
+    assert "LIMIT :max_features" in str(query) and params["max_features"] == MAX_FEATURES
+
+
+@pytest.mark.parametrize("url", [
+    "/api/v1/trajectory/tiles/0/0/0.mvt?start_timestamp=2022-01-01T00:00:00Z&end_timestamp=2022-01-02T00:00:00Z",
+    "/api/v1/trajectory/tiles/7/67/40.mvt",
+    "/api/v1/trajectory/tiles/7/67/40.mvt?start_timestamp=2022-01-01T00:00:00Z&end_timestamp=2022-03-01T00:00:00Z",
+    "/api/v1/trajectory/tiles/7/67/40.mvt?start_timestamp=2022-01-02T00:00:00Z&end_timestamp=2022-01-01T00:00:00Z",
+])
+def test_tiles_of_low_zoom_levels_or_long_temporal_bounds_are_rejected(url, mock_dw):
+    response = TestClient(app).get(url)
+    assert response.status_code in (400, 422)
+    mock_dw.execute.assert_not_called()
@@ -0,0 +1,45 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.routers.v1.heatmap.video_encoders import EncoderSettings, encode_video, gif_palette
+from app.schemas.encoder_preset import EncoderPreset
+from app.schemas.multi_output_format import MultiOutputFormat
+
+
+def pngs(count=3, width=150, height=101):
+    frames = []
+    for _ in range(count):
+        buffer = io.BytesIO()
+        Image.fromarray((np.random.rand(height, width, 3) * 255).astype(np.uint8)).save(buffer, format='png')
+        frames.append(buffer.getvalue())
+    return frames
+
+
+@pytest.mark.parametrize("output_format, signature", [
+    (MultiOutputFormat.mp4, b"ftyp"),
+    (MultiOutputFormat.webm, b"\x1aE\xdf\xa3"),
+    (MultiOutputFormat.gif, b"GIF89a"),
+    (MultiOutputFormat.webp, b"RIFF"),
+])
+def test_output_formats(output_format, signature):
+    video = encode_video(pngs(), 10, output_format, EncoderSettings(preset=EncoderPreset.ultrafast)).read()
+    assert signature in video[:12]
+
+
+def test_gif_uses_fixed_palette():
+    video = Image.open(encode_video(pngs(), 10, MultiOutputFormat.gif))
+    assert video.n_frames == 3
+    palette = set(zip(*[iter(gif_palette().getpalette())] * 3))
+    for frame in range(video.n_frames):
+        video.seek(frame)
+        colours = video.convert('RGB').getcolors(maxcolors=256)
+        assert all(colour in palette for _, colour in colours)
+
+
+def test_frames_are_downscaled():
+    video = Image.open(encode_video(pngs(width=400, height=200), 10, MultiOutputFormat.webp,
+                                    EncoderSettings(max_dimension=100)))
+    assert video.size == (100, 50)
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from affine import Affine
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.api_main import app
+from app.routers.v1.heatmap import heatmap
+from app.routers.v1.heatmap.zonal_statistics import Zone, bbox_zone, raster_zonal_statistics, zones_bounds
+
+# A 4 x 4 raster of 1 km pixels, from (0, 0) to (4000, 4000), where the pixel at the top left has no data
+values = np.arange(16, dtype=np.int32).reshape(4, 4)
+transform = Affine(1000, 0, 0, 0, -1000, 4000)
+
+
+def test_statistics_of_bounding_boxes(geo_tiff):
+    zones = [bbox_zone("0,2000,2000,4000"), bbox_zone("2000,0,4000,2000")]
+    statistics = raster_zonal_statistics([(None, geo_tiff(values, transform))], zones, [50])
+
+    assert statistics[0] == {'zone': "0,2000,2000,4000", 'period': None, 'count': 3, 'sum': 10.0, 'mean': 10 / 3,
+                             'min': 1.0, 'max': 5.0, 'percentiles': {'50': 4.0}}
+    assert statistics[1]['count'] == 4
+    assert statistics[1]['sum'] == 10 + 11 + 14 + 15
+
+
+def test_statistics_of_polygons_per_period(geo_tiff):
+    triangle = Zone("triangle", 0, 0, 4000, 4000,
+                    {'type': 'Polygon', 'coordinates': [[(0, 0), (3900, 0), (0, 3900), (0, 0)]]})
+    rasters = [("first", geo_tiff(values, transform)), ("second", geo_tiff(values * 0, transform))]
+    statistics = raster_zonal_statistics(rasters, [triangle], [])
+
+    # The pixel centers below the diagonal of the raster
+    assert statistics[0]['sum'] == 4 + 8 + 9 + 12 + 13 + 14
+    assert statistics[1] == {'zone': "triangle", 'period': "second", 'count': 0, 'sum': 0, 'mean': None,
+                             'min': None, 'max': None, 'percentiles': {}}
+
+
+def test_zones_bounds():
+    assert zones_bounds([bbox_zone("0,2000,2000,4000"), bbox_zone("1000,0,4000,1000")]) == (0, 0, 4000, 4000)
+
+
+@pytest.mark.parametrize("bbox", ["0,0,1", "a,b,c,d", "0,0,0,1"])
+def test_invalid_bounding_boxes_are_rejected(bbox):
+    with pytest.raises(HTTPException):
+        bbox_zone(bbox)
+
+
+def test_requests_for_zones_in_another_order_are_not_coalesced(monkeypatch, mock_dw):
+    keys = []
+    monkeypatch.setattr(heatmap, "admitted_single_flight", lambda client_id, cost, key, func: keys.append(key) or [])
+    for bboxes in [["0,0,5000,5000", "5000,0,10000,5000"], ["5000,0,10000,5000", "0,0,5000,5000"]]:
+        response = TestClient(app).get("/api/v1/heatmap/stats/count/5000m", params={
+            'bboxes': bboxes, 'start_timestamp': "2022-01-01T00:00:00Z", 'end_timestamp': "2022-02-01T00:00:00Z"})
+        assert response.status_code == 200
+
+    assert keys[0] != keys[1]
@@ -0,0 +1,34 @@
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+from affine import Affine
+from rasterio import MemoryFile
+
+from app.api_main import app
+from app.dependencies import get_dw
+
+# 5 km pixels from the top left corner of the default heatmap bounds.
+heatmap_transform = Affine(5000, 0, 3600000, 0, -5000, 3040000)
+
+
+@pytest.fixture
+def mock_dw():
+    """Replace the data warehouse session of the API with a mock, which can be configured by the test."""
+    dw = MagicMock()
+    app.dependency_overrides[get_dw] = lambda: dw
+    yield dw
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def geo_tiff():
+    """Create single band int32 GeoTIFFs in EPSG:3034 of an array, where 0 is no data."""
+    def create(values, transform=heatmap_transform):
+        height, width = values.shape
+        with MemoryFile() as memfile:
+            with memfile.open(driver='GTiff', width=width, height=height, count=1, dtype='int32', nodata=0,
+                              crs='EPSG:3034', transform=transform) as dataset:
+                dataset.write(values.astype(np.int32), 1)
+            return memfile.read()
+    return create